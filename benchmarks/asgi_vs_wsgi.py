@@ -0,0 +1,173 @@
+"""
+Сравнение пропускной способности страниц чтения через WSGI и ASGI
+при медленной базе данных.
+
+Каждый запрос к базе искусственно задерживается на --delay мс.
+WSGI-режим выполняет запросы страницы по очереди, ASGI-режим
+(yatube/asgi.py) запускает независимые запросы параллельно
+(CONCURRENT_QUERIES).
+
+    python benchmarks/asgi_vs_wsgi.py --requests 200 --concurrency 20
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from wsgiref.util import setup_testing_defaults
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+
+
+def setup(db_path, delay):
+    import django
+    from django.conf import settings
+
+    settings.DATABASES['default']['NAME'] = db_path
+    settings.DEBUG = False
+    django.setup()
+
+    from django.core.management import call_command
+    from django.db.backends import utils
+
+    call_command('migrate', verbosity=0)
+    seed()
+
+    execute = utils.CursorWrapper.execute
+
+    def slow_execute(self, sql, params=None):
+        time.sleep(delay)
+        return execute(self, sql, params)
+
+    utils.CursorWrapper.execute = slow_execute
+
+
+def seed():
+    from django.contrib.auth import get_user_model
+    from posts.models import Comment, Follow, Post
+
+    User = get_user_model()
+    authors = [User.objects.create_user(username='author{}'.format(i))
+               for i in range(10)]
+    Post.objects.bulk_create(
+        Post(text='Пост {}'.format(i), author=authors[i % len(authors)])
+        for i in range(500)
+    )
+    for author in authors[1:]:
+        Follow.objects.create(user=author, author=authors[0])
+    post = Post.objects.filter(author=authors[0]).first()
+    Comment.objects.bulk_create(
+        Comment(post=post, author=authors[1], text='Комментарий {}'.format(i))
+        for i in range(20)
+    )
+    return post
+
+
+def paths():
+    from posts.models import Post
+
+    post = Post.objects.filter(author__username='author0').first()
+    return ['/author0/', '/author0/{}/'.format(post.pk), '/', '/author3/']
+
+
+def make_environ(path):
+    environ = {'PATH_INFO': path, 'REMOTE_ADDR': '10.0.0.1',
+               'SERVER_NAME': 'localhost', 'HTTP_HOST': 'localhost'}
+    setup_testing_defaults(environ)
+    return environ
+
+
+def bench_wsgi(urls, requests, concurrency):
+    from django.conf import settings
+    from django.core.wsgi import get_wsgi_application
+
+    settings.CONCURRENT_QUERIES = False
+    application = get_wsgi_application()
+
+    def call(path):
+        statuses = []
+        started = time.perf_counter()
+        body = application(make_environ(path),
+                           lambda status, headers: statuses.append(status))
+        b''.join(body)
+        return statuses[0], time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(
+            call, (urls[i % len(urls)] for i in range(requests))))
+    return time.perf_counter() - started, results
+
+
+def bench_asgi(urls, requests, concurrency):
+    from django.conf import settings
+    from django.core.wsgi import get_wsgi_application
+    from yatube.asgi import WsgiBridge
+
+    settings.CONCURRENT_QUERIES = True
+    settings.CONCURRENT_QUERY_WORKERS = concurrency * 4
+    application = WsgiBridge(get_wsgi_application(), max_workers=concurrency)
+
+    async def call(path):
+        started = time.perf_counter()
+        received = [{'type': 'http.request', 'body': b''}]
+        statuses = []
+
+        async def receive():
+            return received.pop()
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                statuses.append(message['status'])
+
+        scope = {'type': 'http', 'method': 'GET', 'path': path,
+                 'headers': [(b'host', b'localhost')],
+                 'client': ('10.0.0.1', 0)}
+        await application(scope, receive, send)
+        return statuses[0], time.perf_counter() - started
+
+    async def run():
+        # Как и в WSGI-режиме, одновременно выполняется не больше
+        # concurrency запросов
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def limited(path):
+            async with semaphore:
+                return await call(path)
+
+        return await asyncio.gather(
+            *(limited(urls[i % len(urls)]) for i in range(requests)))
+
+    started = time.perf_counter()
+    results = asyncio.run(run())
+    return time.perf_counter() - started, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--delay', type=float, default=5,
+                        help='задержка каждого запроса к базе, мс')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        setup(os.path.join(tmp, 'bench.sqlite3'), args.delay / 1000)
+        urls = paths()
+        for name, bench in (('wsgi', bench_wsgi), ('asgi', bench_asgi)):
+            elapsed, results = bench(urls, args.requests, args.concurrency)
+            errors = sum(1 for status, _ in results
+                         if not str(status).startswith('200'))
+            latency = statistics.median(took for _, took in results)
+            print('{:5} {:8.2f} запросов/с  медиана {:6.1f} мс  '
+                  'ошибок: {}'.format(name, args.requests / elapsed,
+                                      latency * 1000, errors))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""
+Число запросов к базе на страницу вошедшего пользователя при разных
+способах хранения сессии и загрузки пользователя.
+
+    python benchmarks/session_queries.py --requests 50
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+
+MODES = (
+    ('db + ModelBackend', 'django.contrib.sessions.backends.db',
+     'django.contrib.auth.backends.ModelBackend'),
+    ('cached_db + CachedModelBackend',
+     'django.contrib.sessions.backends.cached_db',
+     'users.backends.CachedModelBackend'),
+    ('signed_cookies + CachedModelBackend',
+     'django.contrib.sessions.backends.signed_cookies',
+     'users.backends.CachedModelBackend'),
+)
+
+
+def setup(db_path):
+    import django
+    from django.conf import settings
+
+    settings.DATABASES['default']['NAME'] = db_path
+    settings.DEBUG = False
+    settings.ALLOWED_HOSTS = ['*']
+    django.setup()
+
+    from django.core.management import call_command
+
+    call_command('migrate', verbosity=0)
+
+
+def bench(path, requests, engine, backend):
+    from django.contrib.auth import get_user_model
+    from django.core.cache import cache
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import CaptureQueriesContext, override_settings
+
+    cache.clear()
+    with override_settings(SESSION_ENGINE=engine,
+                           AUTHENTICATION_BACKENDS=[backend]):
+        client = Client()
+        client.force_login(get_user_model().objects.get(username='reader'))
+        client.get(path)
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            for _ in range(requests):
+                client.get(path)
+            elapsed = time.perf_counter() - started
+    auth = sum(1 for query in queries
+               if query['sql'].startswith(('SELECT "django_session"',
+                                           'SELECT "auth_user"')))
+    return len(queries) / requests, auth / requests, elapsed / requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--requests', type=int, default=50)
+    parser.add_argument('--path', default='/')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        setup(os.path.join(tmp, 'bench.sqlite3'))
+        from django.contrib.auth import get_user_model
+        get_user_model().objects.create_user(username='reader')
+        for name, engine, backend in MODES:
+            total, auth, took = bench(args.path, args.requests,
+                                      engine, backend)
+            print('{:36} запросов на страницу {:4.1f}, из них сессия и '
+                  'пользователь {:3.1f}  {:6.2f} мс'.format(
+                      name, total, auth, took * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+"""
+Время страниц ленты в одной базе и при шардировании по автору: общая
+лента (слияние шардов) и лента подписок на --follows авторов.
+
+    python benchmarks/shard_feed.py --posts 2000000 --shards 4
+
+Посты загружаются напрямую через sqlite3 и в default, и в шарды, те же
+id в обоих вариантах.
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+
+BATCH = 50000
+PAGES = (1, 10, 100)
+
+
+def setup(tmp, shard_count):
+    import django
+    from django.conf import settings
+
+    default = os.path.join(tmp, 'default.sqlite3')
+    settings.DATABASES['default']['NAME'] = default
+    settings.SHARD_DATABASES = []
+    for number in range(shard_count):
+        name = os.path.join(tmp, 'shard{}.sqlite3'.format(number))
+        settings.SHARD_DATABASES.append(name)
+        settings.DATABASES['shard{}'.format(number)] = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': name,
+        }
+    settings.DEBUG = False
+    django.setup()
+
+    from django.core.management import call_command
+
+    call_command('migrate', verbosity=0)
+    call_command('init_shards', verbosity=0)
+
+
+def load(path, sql, rows):
+    db = sqlite3.connect(path)
+    db.execute('PRAGMA synchronous = OFF')
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= BATCH:
+            db.executemany(sql, batch)
+            batch = []
+    db.executemany(sql, batch)
+    db.commit()
+    db.close()
+
+
+def posts(count, authors):
+    start = datetime(2020, 1, 1)
+    for pk in range(1, count + 1):
+        pub_date = start + timedelta(seconds=pk)
+        yield (pk, 'Пост {}'.format(pk), str(pub_date),
+               random.randint(1, authors), 0, 1, '')
+
+
+def fill(count, authors):
+    from django.conf import settings
+
+    from posts import shards
+
+    users = [(pk, 'pbkdf2_sha256$', 0, 'author{}'.format(pk), '', '', '',
+              0, 1, '2020-01-01 00:00:00') for pk in range(1, authors + 1)]
+    user_sql = ('INSERT INTO auth_user (id, password, is_superuser, '
+                'username, first_name, last_name, email, is_staff, '
+                'is_active, date_joined) VALUES (?, ?, ?, ?, ?, ?, ?, ?, '
+                '?, ?)')
+    post_sql = ('INSERT INTO posts_post (id, text, pub_date, author_id, '
+                'comment_count, version, text_html) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)')
+    paths = dict(zip(shards.aliases(), settings.SHARD_DATABASES))
+    paths['default'] = settings.DATABASES['default']['NAME']
+    for path in paths.values():
+        load(path, user_sql, users)
+    random.seed(1)
+    load(paths['default'], post_sql, posts(count, authors))
+    for alias in shards.aliases():
+        random.seed(1)
+        load(paths[alias], post_sql, (
+            row for row in posts(count, authors)
+            if shards.shard_for(row[3]) == alias))
+
+
+def page_time(feed, page, repeats):
+    from django.conf import settings
+
+    per_page = settings.POSTS_PER_PAGE
+    bottom = (page - 1) * per_page
+    started = time.perf_counter()
+    for _ in range(repeats):
+        feed.count()
+        list(feed[bottom:bottom + per_page])
+    return (time.perf_counter() - started) / repeats
+
+
+def bench(follows, authors, repeats):
+    from django.test.utils import override_settings
+
+    from posts import shards
+    from posts.models import Post
+
+    followed = random.sample(range(1, authors + 1), follows)
+    results = {}
+    for mode, overrides in (('одна база', {'SHARD_DATABASES': []}),
+                            ('шарды', {})):
+        with override_settings(**overrides):
+            queryset = Post.objects.select_related('author', 'group')
+            for page in PAGES:
+                results.setdefault(('лента', page), {})[mode] = page_time(
+                    shards.feed(queryset), page, repeats)
+                results.setdefault(('подписки', page), {})[mode] = page_time(
+                    shards.feed(queryset, followed), page, repeats)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--posts', type=int, default=2000000)
+    parser.add_argument('--authors', type=int, default=10000)
+    parser.add_argument('--shards', type=int, default=4)
+    parser.add_argument('--follows', type=int, default=50)
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        setup(tmp, args.shards)
+        started = time.perf_counter()
+        fill(args.posts, args.authors)
+        print('Загружено {} постов за {:.0f} с'.format(
+            args.posts, time.perf_counter() - started))
+        for (feed, page), times in bench(args.follows, args.authors,
+                                         args.repeats).items():
+            print('{:9} страница {:4}  {}'.format(feed, page, '  '.join(
+                '{} {:8.2f} мс'.format(mode, took * 1000)
+                for mode, took in times.items())))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,25 +1,71 @@
 from django.contrib import admin
+from django.db import router
 
+from . import shards
 from .models import Post, Group, Comment, Follow
+from .paginators import EstimatedCountPaginator
+from .search import fts_available, search_posts
 
 
-class PostAdmin(admin.ModelAdmin):
-    list_display = ("pk", "text", "pub_date", "author", "group", 'image')
+class ShardedModelAdmin(admin.ModelAdmin):
+    """При шардировании модель скрыта: списки, поиск и удаление в админке
+    выбирают базу без экземпляра и не знают шарда (posts/shards.py)"""
+
+    def has_view_permission(self, request, obj=None):
+        return (not shards.enabled()
+                and super().has_view_permission(request, obj))
+
+    def has_add_permission(self, request):
+        return not shards.enabled() and super().has_add_permission(request)
+
+    def has_change_permission(self, request, obj=None):
+        return (not shards.enabled()
+                and super().has_change_permission(request, obj))
+
+    def has_delete_permission(self, request, obj=None):
+        return (not shards.enabled()
+                and super().has_delete_permission(request, obj))
+
+
+class PostAdmin(ShardedModelAdmin):
+    list_display = ("pk", "text", "pub_date", "author", "group", 'image',
+                    "comment_count", "last_comment_at")
+    list_select_related = ("author", "group")
+    autocomplete_fields = ("author", "group")
     search_fields = ("text",)
     list_filter = ("pub_date",)
     empty_value_display = "-пусто-"
+    # text_html собирается из текста при сохранении (posts/signals.py)
+    exclude = ("text_html",)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_search_results(self, request, queryset, search_term):
+        if search_term and fts_available(router.db_for_read(Post)):
+            return search_posts(queryset, search_term), False
+        return super().get_search_results(request, queryset, search_term)
 
 
 class GroupAdmin(admin.ModelAdmin):
     list_display = ("pk", "title", "description",)
+    search_fields = ("title", "slug")
 
 
-class CommentAdmin(admin.ModelAdmin):
+class CommentAdmin(ShardedModelAdmin):
     list_display = ("post", "author", "text",)
+    list_select_related = ("post", "author")
+    raw_id_fields = ("post",)
+    autocomplete_fields = ("author",)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 class FollowAdmin(admin.ModelAdmin):
     list_display = ("user", "author",)
+    list_select_related = ("user", "author")
+    autocomplete_fields = ("user", "author")
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 admin.site.register(Post, PostAdmin)
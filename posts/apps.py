@@ -1,5 +1,26 @@
 from django.apps import AppConfig
+from django.db.models.signals import (m2m_changed, post_delete,
+                                      post_migrate, post_save)
+
+
+def create_search_index(using='default', **kwargs):
+    from .search import ensure_fts
+    ensure_fts(using)
+
+
+def connect_flatpages():
+    # Не через urls.py: страницы меняют и там, где URLconf не загружен
+    from django.contrib.flatpages.models import FlatPage
+    from yatube.flatpages import invalidate_flatpages
+    post_save.connect(invalidate_flatpages, sender=FlatPage)
+    post_delete.connect(invalidate_flatpages, sender=FlatPage)
+    m2m_changed.connect(invalidate_flatpages, sender=FlatPage.sites.through)
 
 
 class PostsConfig(AppConfig):
     name = 'posts'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        post_migrate.connect(create_search_index, sender=self)
+        connect_flatpages()
@@ -0,0 +1,169 @@
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, router, transaction
+from django.db.models import Count, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.http import Http404
+
+from . import groupstats, shards
+from .cache import posts as post_cache, refresh_group_first_page
+from .models import (ArchivedComment, ArchivedPost, Comment, Follow, Group,
+                     Mention, Notification, Post, PostTag, User)
+from .rows import delete_rows
+from .tasks import enqueue
+
+
+def delete_post_rows(ids, using=DEFAULT_DB_ALIAS):
+    """Посты вместе со всеми строками, которые на них ссылаются"""
+
+    for model in (Comment, PostTag, Mention):
+        delete_rows(model, 'post_id', ids, using)
+    # Уведомления всегда в default
+    delete_rows(Notification, 'post_id', ids)
+    delete_rows(Post, 'id', ids, using)
+    post_cache.forget('pk', *ids)
+
+
+def recount_comments(posts):
+    """Пересчёт comment_count и last_comment_at у постов queryset"""
+
+    comments = (Comment.objects.filter(post=OuterRef('pk'))
+                .order_by().values('post'))
+    post_cache.forget('pk', *posts.values_list('pk', flat=True))
+    return posts.update(
+        comment_count=Coalesce(Subquery(
+            comments.annotate(count=Count('pk')).values('count')
+        ), 0),
+        last_comment_at=Subquery(
+            comments.annotate(last=Max('created')).values('last')
+        ),
+    )
+
+
+def refresh_groups(group_ids):
+    group_ids = {group_id for group_id in group_ids if group_id}
+    for group_id in group_ids:
+        refresh_group_first_page(group_id)
+    groupstats.recount(group_ids)
+
+
+def archive_posts(before, batch_size=None):
+    """Перенос постов, опубликованных до before, в архив порциями.
+
+    Каждая порция сначала записывается в архив, потом удаляется из
+    основных таблиц, поэтому прерванный перенос можно просто повторить.
+    Возвращает число перенесённых постов.
+    """
+
+    batch_size = batch_size or settings.ARCHIVE_BATCH_SIZE
+    archive_db = router.db_for_write(ArchivedPost)
+    total = 0
+    while True:
+        posts = list(Post.objects.filter(pub_date__lt=before)
+                     .order_by('pk')[:batch_size])
+        if not posts:
+            return total
+        ids = [post.pk for post in posts]
+        comments = Comment.objects.filter(post_id__in=ids).order_by()
+        with transaction.atomic(using=archive_db):
+            ArchivedPost.objects.bulk_create([
+                ArchivedPost(
+                    id=post.pk, text=post.text, pub_date=post.pub_date,
+                    author_id=post.author_id, group_id=post.group_id,
+                    image=post.image, image_width=post.image_width,
+                    image_height=post.image_height,
+                    comment_count=post.comment_count,
+                ) for post in posts
+            ], ignore_conflicts=True)
+            ArchivedComment.objects.bulk_create((
+                ArchivedComment(
+                    id=comment.pk, post_id=comment.post_id,
+                    author_id=comment.author_id, text=comment.text,
+                    created=comment.created,
+                ) for comment in comments.iterator()
+            ), batch_size=batch_size, ignore_conflicts=True)
+        with transaction.atomic():
+            delete_post_rows(ids)
+        refresh_groups(post.group_id for post in posts)
+        total += len(ids)
+
+
+def get_archived_post_or_404(author, post_id):
+    """Архивный пост автора в виде, пригодном для шаблонов постов"""
+
+    post = ArchivedPost.objects.filter(pk=post_id, author_id=author.pk).first()
+    if post is None:
+        raise Http404('Пост не найден')
+    post.author = author
+    post.group = (Group.objects.filter(pk=post.group_id).first()
+                  if post.group_id else None)
+    return post
+
+
+def get_archived_comments(post):
+    """Комментарии архивного поста с авторами из основной базы"""
+
+    comments = list(post.comments.all())
+    authors = User.objects.in_bulk({comment.author_id
+                                    for comment in comments})
+    for comment in comments:
+        comment.author = authors.get(comment.author_id)
+    return [comment for comment in comments if comment.author is not None]
+
+
+def purge_user(user_id, batch_size=None):
+    """Удаление пользователя и его данных порциями.
+
+    Каждая порция удаляется в своей короткой транзакции, поэтому
+    удаление автора с тысячами постов не блокирует базу надолго.
+    """
+
+    batch_size = batch_size or settings.ARCHIVE_BATCH_SIZE
+    for using in shards.post_databases():
+        purge_user_posts(user_id, batch_size, using)
+    for model, column in ((ArchivedComment, 'author_id'),
+                          (ArchivedPost, 'author_id')):
+        while True:
+            ids = list(model.objects.filter(**{column: user_id}).order_by()
+                       .values_list('pk', flat=True)[:batch_size])
+            if not ids:
+                break
+            model.objects.filter(pk__in=ids).delete()
+    Mention.objects.filter(user_id=user_id).delete()
+    Follow.objects.filter(user_id=user_id).delete()
+    Follow.objects.filter(author_id=user_id).delete()
+    User.objects.filter(pk=user_id).delete()
+
+
+def purge_user_posts(user_id, batch_size, using):
+    """Посты и комментарии пользователя в одной базе постов"""
+
+    posts = Post.objects.using(using)
+    while True:
+        rows = list(posts.filter(author_id=user_id).order_by()
+                    .values_list('pk', 'group_id')[:batch_size])
+        if not rows:
+            break
+        ids = [pk for pk, _ in rows]
+        with transaction.atomic(using=using):
+            delete_post_rows(ids, using)
+        refresh_groups(group_id for _, group_id in rows)
+    while True:
+        comments = list(Comment.objects.using(using)
+                        .filter(author_id=user_id).order_by()
+                        .values_list('pk', 'post_id')[:batch_size])
+        if not comments:
+            break
+        post_ids = {post_id for _, post_id in comments}
+        with transaction.atomic(using=using):
+            delete_rows(Comment, 'id', [pk for pk, _ in comments], using)
+            recount_comments(posts.filter(pk__in=post_ids))
+        groupstats.recount(posts.filter(pk__in=post_ids)
+                           .values_list('group_id', flat=True))
+
+
+def schedule_user_purge(user):
+    """Пользователь сразу теряет доступ, данные удаляются в фоне"""
+
+    user.is_active = False
+    user.save(update_fields=['is_active'])
+    enqueue(purge_user, user.pk)
@@ -0,0 +1,68 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Paginator
+
+from yatube.objectcache import ObjectCache
+
+from . import shards
+from .models import Group, Post, User
+from .tasks import enqueue
+
+GROUP_PAGE_KEY = 'group:page1:{}'
+
+users = ObjectCache(User, 'username', 'pk', exclude=('password',))
+groups = ObjectCache(Group, 'slug', 'pk')
+# Посты меняются чаще (счётчик комментариев), поэтому без кеша процесса:
+# сброс сразу виден всем, кто читает тот же общий кеш
+posts = ObjectCache(Post, 'pk', local=False)
+
+
+def build_group_first_page(group_id):
+    # Авторы не кешируются вместе с постами: в общий кеш попал бы хеш
+    # пароля. Они подставляются из users при чтении страницы
+    posts = shards.feed(Post.objects.filter(group_id=group_id)
+                        .select_related('group'))
+    first_page = (
+        list(posts[:settings.POSTS_PER_PAGE]),
+        posts.count(),
+    )
+    cache.set(GROUP_PAGE_KEY.format(group_id), first_page,
+              settings.GROUP_PAGE_CACHE_TIMEOUT)
+    return first_page
+
+
+def group_first_page_paginator(group):
+    """Пагинатор первой страницы группы из заранее собранного кеша"""
+
+    first_page = cache.get(GROUP_PAGE_KEY.format(group.pk))
+    if first_page is None:
+        first_page = build_group_first_page(group.pk)
+    posts, count = first_page
+    authors = {}
+    for post in posts:
+        if post.author_id not in authors:
+            authors[post.author_id] = users.get(pk=post.author_id)
+        Post.author.field.set_cached_value(post, authors[post.author_id])
+    paginator = Paginator(posts, settings.POSTS_PER_PAGE)
+    paginator.count = count
+    return paginator
+
+
+def refresh_group_first_page(group_id, post_id=None):
+    """Пересборка первой страницы, если группа популярна, иначе сброс.
+
+    Ключ есть в кеше только у групп, которые недавно открывали, поэтому
+    холодные группы соберутся заново при следующем просмотре. Если
+    передан post_id, страница пересобирается, только когда этот пост
+    на ней показан.
+    """
+
+    key = GROUP_PAGE_KEY.format(group_id)
+    first_page = cache.get(key)
+    if first_page is None:
+        return
+    if post_id is not None and all(post.pk != post_id
+                                   for post in first_page[0]):
+        return
+    cache.delete(key)
+    enqueue(build_group_first_page, group_id)
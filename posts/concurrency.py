@@ -0,0 +1,47 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.CONCURRENT_QUERY_WORKERS,
+            thread_name_prefix='yatube-query',
+        )
+    return _executor
+
+
+def _call(func):
+    # Соединения потоков пула живут по тем же правилам, что и соединения
+    # запросов: CONN_MAX_AGE и закрытие после ошибки
+    close_old_connections()
+    try:
+        return func()
+    finally:
+        close_old_connections()
+
+
+def run_concurrently(*funcs):
+    """Выполнение независимых запросов к базе параллельно.
+
+    Первая функция выполняется в текущем потоке, остальные в пуле, у
+    каждого потока пула своё соединение с базой. Если CONCURRENT_QUERIES
+    выключен, функции выполняются по очереди.
+    """
+
+    if not settings.CONCURRENT_QUERIES or len(funcs) < 2:
+        return [func() for func in funcs]
+    futures = [_get_executor().submit(_call, func) for func in funcs[1:]]
+    return [funcs[0]()] + [future.result() for future in futures]
+
+
+def evaluated(queryset):
+    """Выполненный queryset, чтобы запрос шёл в потоке run_concurrently"""
+
+    len(queryset)
+    return queryset
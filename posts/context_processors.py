@@ -0,0 +1,13 @@
+from django.utils.functional import SimpleLazyObject
+
+from .notifications import unread_count
+
+
+def notifications(request):
+    """Число непрочитанных уведомлений для шапки сайта"""
+
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        return {}
+    return {'unread_notifications': SimpleLazyObject(
+        lambda: unread_count(user.pk))}
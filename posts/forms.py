@@ -1,21 +1,76 @@
-from django.forms import ModelForm
+from django.forms import ModelForm, Select
 from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import UploadedFile
+from django.urls import reverse_lazy
 
+from .cache import groups
+from .images import process_upload
 from .models import Post, Comment
 
 User = get_user_model()
 
 
+class GroupPicker(Select):
+    """Выбор группы без загрузки всех групп.
+
+    В списке только пустой вариант и выбранная группа, остальные
+    подгружает поиск (js/group_picker.js). Поле остаётся
+    ModelChoiceField и принимает pk любой группы.
+    """
+
+    class Media:
+        js = ('js/group_picker.js',)
+
+    def __init__(self, attrs=None):
+        super().__init__(dict(attrs or {},
+                              **{'data-search-url': reverse_lazy(
+                                  'group_search')}))
+
+    def optgroups(self, name, value, attrs=None):
+        choices = [('', '---------')]
+        for pk in value:
+            group = groups.get(pk=pk) if str(pk).isdigit() else None
+            if group is not None:
+                choices.append((group.pk, group.title))
+        self.choices = choices
+        return super().optgroups(name, value, attrs)
+
+
 class PostForm(ModelForm):
     class Meta:
         model = Post
         fields = ('text', 'group', 'image',)
+        widgets = {'group': GroupPicker}
         labels = {
             'text': ('Текст'),
             'group': ('Группа'),
             'image': ('Изображение')
         }
 
+    image_size = None
+
+    def clean_image(self):
+        image = self.cleaned_data.get('image')
+        if image is False:
+            self.image_size = (None, None)
+        if not isinstance(image, UploadedFile):
+            return image
+        image, self.image_size = process_upload(image)
+        return image
+
+    def clean(self):
+        upload = self.files.get('image')
+        if getattr(upload, 'too_large', False):
+            self.errors.pop('image', None)
+            self.add_error('image', 'Файл изображения слишком большой.')
+        return super().clean()
+
+    def save(self, commit=True):
+        if self.image_size is not None:
+            (self.instance.image_width,
+             self.instance.image_height) = self.image_size
+        return super().save(commit)
+
 
 class CommentForm(ModelForm):
     class Meta:
@@ -0,0 +1,61 @@
+"""
+Счётчики групп для каталога и выбора группы в форме поста.
+
+Новый пост и комментарий меняют счётчики одним UPDATE. Удаление поста
+и перенос в другую группу случаются редко, после них счётчики группы
+пересчитываются целиком.
+"""
+
+from django.db.models import Count, F, Max, Sum
+from django.db.models.functions import Greatest
+
+from . import shards
+from .models import GroupStats, Post
+
+
+def recount(group_ids):
+    """Полный пересчёт счётчиков групп group_ids"""
+
+    for group_id in set(group_ids):
+        if not group_id:
+            continue
+        # Все посты автора в одном шарде, поэтому авторы шардов не
+        # пересекаются и счётчики можно сложить
+        stats = {'post_count': 0, 'author_count': 0, 'comment_count': 0,
+                 'last_post_at': None}
+        for alias in shards.post_databases():
+            part = (Post.objects.using(alias).filter(group_id=group_id)
+                    .aggregate(
+                        post_count=Count('pk'),
+                        author_count=Count('author', distinct=True),
+                        comment_count=Sum('comment_count'),
+                        last_post_at=Max('pub_date'),
+                    ))
+            for name in ('post_count', 'author_count', 'comment_count'):
+                stats[name] += part[name] or 0
+            if part['last_post_at'] and (
+                    stats['last_post_at'] is None
+                    or part['last_post_at'] > stats['last_post_at']):
+                stats['last_post_at'] = part['last_post_at']
+        GroupStats.objects.update_or_create(group_id=group_id,
+                                            defaults=stats)
+
+
+def post_added(post):
+    new_author = not (Post.objects.using(post._state.db)
+                      .filter(group_id=post.group_id,
+                              author_id=post.author_id)
+                      .exclude(pk=post.pk).exists())
+    updated = GroupStats.objects.filter(group_id=post.group_id).update(
+        post_count=F('post_count') + 1,
+        author_count=F('author_count') + int(new_author),
+        last_post_at=post.pub_date,
+    )
+    if not updated:
+        recount([post.group_id])
+
+
+def comments_changed(group_id, delta):
+    # Счётчик не уходит ниже нуля, даже если разошёлся с постами
+    GroupStats.objects.filter(group_id=group_id).update(
+        comment_count=Greatest(F('comment_count') + delta, 0))
@@ -0,0 +1,82 @@
+import os
+from io import BytesIO
+
+from PIL import Image, ImageOps
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from sorl.thumbnail import get_thumbnail
+
+# Геометрия миниатюры в posts/includes/post_item.html
+THUMBNAIL_GEOMETRY = '960x339'
+THUMBNAIL_OPTIONS = {'crop': 'center', 'upscale': True}
+THUMBNAIL_VARIANT_FORMATS = ('JPEG', 'WEBP')
+VARIANTS_KEY = 'image-variants:{}'
+
+
+def process_upload(upload):
+    """Проверка размеров и перекодирование загруженного изображения.
+
+    Возвращает новый файл без метаданных и его ширину и высоту.
+    """
+
+    upload.seek(0)
+    with Image.open(upload) as image:
+        # Image.open читает только заголовок, пиксели ещё не декодированы
+        width, height = image.size
+        if width * height > settings.POST_IMAGE_MAX_PIXELS:
+            raise ValidationError(
+                'Изображение слишком большое: %(width)s×%(height)s.',
+                code='image_too_large',
+                params={'width': width, 'height': height},
+            )
+        max_size = settings.POST_IMAGE_MAX_SIZE
+        # Для JPEG декодер сразу уменьшает изображение кратно 1/2..1/8
+        image.draft('RGB', max_size)
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail(max_size, Image.LANCZOS)
+        if image.mode in ('RGBA', 'LA', 'P'):
+            image = image.convert('RGBA')
+            background = Image.new('RGB', image.size, (255, 255, 255))
+            background.paste(image, mask=image.split()[-1])
+            image = background
+        elif image.mode != 'RGB':
+            image = image.convert('RGB')
+        buffer = BytesIO()
+        # exif и прочие метаданные не передаются, поэтому отбрасываются
+        image.save(buffer, 'JPEG', quality=settings.POST_IMAGE_QUALITY,
+                   optimize=True, progressive=True)
+    name = os.path.splitext(os.path.basename(upload.name))[0] + '.jpg'
+    processed = SimpleUploadedFile(name, buffer.getvalue(), 'image/jpeg')
+    return processed, image.size
+
+
+def generate_image_variants(post_id, using=None):
+    """Фоновая генерация миниатюр поста во всех форматах.
+
+    Адреса и размеры готовых миниатюр записываются в кеш, откуда их
+    берёт шаблон (image_variant), не вычисляя имена файлов sorl.
+    """
+
+    from .models import Post
+
+    post = (Post.objects.using(using).filter(pk=post_id)
+            .only('image').first())
+    if post is None or not post.image:
+        return
+    variants = {}
+    for fmt in THUMBNAIL_VARIANT_FORMATS:
+        thumbnail = get_thumbnail(post.image, THUMBNAIL_GEOMETRY, format=fmt,
+                                  **THUMBNAIL_OPTIONS)
+        variants[fmt] = {'url': thumbnail.url, 'width': thumbnail.width,
+                         'height': thumbnail.height}
+    cache.set(VARIANTS_KEY.format(post.image.name), variants, None)
+
+
+def image_variant(image, fmt):
+    """Готовая миниатюра в формате fmt или None, если её ещё нет"""
+
+    if not image:
+        return None
+    return (cache.get(VARIANTS_KEY.format(image.name)) or {}).get(fmt)
@@ -0,0 +1,204 @@
+import asyncio
+import json
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.http import Http404
+from django.urls import Resolver404, resolve
+
+from .cache import groups
+
+
+class Hub:
+    """Рассылка событий подписчикам каналов внутри процесса.
+
+    Последние события хранятся в кольцевом буфере, чтобы переподключившийся
+    клиент получил пропущенное по Last-Event-ID. Асинхронные подписчики
+    получают события через свои asyncio.Queue, синхронные ждут на условии.
+    Данные события могут быть функцией: она вызывается при первой отправке,
+    поэтому без подписчиков ничего не рендерится.
+    """
+
+    def __init__(self, history):
+        self._condition = threading.Condition()
+        self._seq = 0
+        self._events = deque(maxlen=history)
+        self._subscribers = {}
+
+    @property
+    def last_id(self):
+        return self._seq
+
+    def publish(self, channel, event, data):
+        with self._condition:
+            self._seq += 1
+            item = (self._seq, channel, event, data)
+            self._events.append(item)
+            self._condition.notify_all()
+            # Под блокировкой, чтобы очереди получали события по порядку id
+            for loop, queue in self._subscribers.get(channel, ()):
+                loop.call_soon_threadsafe(queue.put_nowait, item)
+
+    def since(self, channel, last_id):
+        return [item for item in list(self._events)
+                if item[0] > last_id and item[1] == channel]
+
+    def wait(self, channel, last_id, timeout):
+        with self._condition:
+            self._condition.wait_for(
+                lambda: self._seq > last_id and self.since(channel, last_id),
+                timeout,
+            )
+            return self.since(channel, last_id)
+
+    def subscribe(self, channel):
+        subscriber = (asyncio.get_running_loop(), asyncio.Queue())
+        with self._condition:
+            self._subscribers.setdefault(channel, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, channel, subscriber):
+        with self._condition:
+            subscribers = self._subscribers.get(channel, set())
+            subscribers.discard(subscriber)
+            if not subscribers:
+                self._subscribers.pop(channel, None)
+
+
+hub = Hub(settings.LIVE_HISTORY)
+
+
+def format_event(item):
+    seq, channel, event, data = item
+    if callable(data):
+        data = data()
+    return 'id: {}\nevent: {}\ndata: {}\n\n'.format(
+        seq, event, json.dumps(data, ensure_ascii=False)
+    ).encode()
+
+
+def format_events(items):
+    """События для ASGI: вызывается в пуле потоков, не в цикле событий.
+
+    Данные события могут рендерить шаблон с запросами к базе, а цикл
+    событий обслуживает всех клиентов SSE сразу.
+    """
+
+    close_old_connections()
+    try:
+        return b''.join(format_event(item) for item in items)
+    finally:
+        close_old_connections()
+
+
+def parse_last_id(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return hub.last_id
+
+
+def channel_for(url_name, kwargs):
+    if url_name == 'live_index':
+        return 'index'
+    if url_name == 'live_group':
+        return 'group:{}'.format(groups.get_or_404(slug=kwargs['slug']).pk)
+    if url_name == 'live_post':
+        return 'post:{}'.format(kwargs['post_id'])
+    return None
+
+
+def channel_from_path(path):
+    """Канал для пути или None; неизвестную группу отдаст 404 WSGI-часть"""
+
+    try:
+        match = resolve(path)
+        return channel_for(match.url_name, match.kwargs)
+    except (Resolver404, Http404):
+        return None
+
+
+def stream_events(channel, last_id, timeout):
+    """Поток событий SSE для WSGI, закрывается через timeout секунд"""
+
+    yield 'retry: {}\n\n'.format(settings.LIVE_RETRY_MS).encode()
+    deadline = time.monotonic() + timeout
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return
+        items = hub.wait(channel, last_id,
+                         min(remaining, settings.LIVE_HEARTBEAT))
+        if not items:
+            yield b': ping\n\n'
+        for item in items:
+            last_id = item[0]
+            yield format_event(item)
+
+
+async def sse_application(scope, receive, send, channel):
+    """Бессрочный поток SSE для ASGI без отдельного потока на клиента"""
+
+    headers = dict(scope.get('headers', []))
+    query = dict(
+        part.split('=', 1) for part in
+        scope.get('query_string', b'').decode('latin-1').split('&')
+        if '=' in part
+    )
+    last_id = parse_last_id(
+        headers.get(b'last-event-id', b'').decode('latin-1')
+        or query.get('last')
+    )
+    subscriber = hub.subscribe(channel)
+    queue = subscriber[1]
+
+    async def wait_disconnect():
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+
+    loop = asyncio.get_running_loop()
+    disconnect = asyncio.ensure_future(wait_disconnect())
+    try:
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [
+                (b'content-type', b'text/event-stream'),
+                (b'cache-control', b'no-cache'),
+                (b'x-accel-buffering', b'no'),
+            ],
+        })
+        # События, опубликованные после подписки, приходят и в очередь, и
+        # в историю; last_id отсекает уже отправленные
+        items = hub.since(channel, last_id)
+        body = b'retry: %d\n\n' % settings.LIVE_RETRY_MS
+        body += await loop.run_in_executor(None, format_events, items)
+        if items:
+            last_id = items[-1][0]
+        await send({'type': 'http.response.body', 'body': body,
+                    'more_body': True})
+        while not disconnect.done():
+            getter = asyncio.ensure_future(queue.get())
+            done, _ = await asyncio.wait(
+                {getter, disconnect}, timeout=settings.LIVE_HEARTBEAT,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            if getter in done:
+                item = getter.result()
+                if item[0] > last_id:
+                    last_id = item[0]
+                    body = await loop.run_in_executor(None, format_events,
+                                                      [item])
+                    await send({'type': 'http.response.body', 'body': body,
+                                'more_body': True})
+            else:
+                getter.cancel()
+                if not disconnect.done():
+                    await send({'type': 'http.response.body',
+                                'body': b': ping\n\n', 'more_body': True})
+    finally:
+        disconnect.cancel()
+        hub.unsubscribe(channel, subscriber)
@@ -0,0 +1,27 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from posts import shards
+from posts.archive import archive_posts
+
+
+class Command(BaseCommand):
+    help = 'Переносит старые посты с комментариями в архив'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int,
+                            default=settings.ARCHIVE_AFTER_DAYS,
+                            help='архивировать посты старше стольких дней')
+        parser.add_argument('--batch-size', type=int,
+                            default=settings.ARCHIVE_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        if shards.enabled():
+            raise CommandError('Команда работает только с одной базой, '
+                               'а задан SHARD_DATABASES')
+        before = timezone.now() - timedelta(days=options['days'])
+        archived = archive_posts(before, options['batch_size'])
+        self.stdout.write('Перенесено в архив постов: {}'.format(archived))
@@ -0,0 +1,23 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+STATIC_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'static'
+)
+SOURCE = os.path.join(STATIC_DIR, 'css', 'yatube.scss')
+TARGET = os.path.join(STATIC_DIR, 'css', 'yatube.min.css')
+
+
+class Command(BaseCommand):
+    help = 'Собирает урезанный bootstrap из css/yatube.scss'
+
+    def handle(self, *args, **options):
+        try:
+            import sass
+        except ImportError:
+            raise CommandError('Для сборки стилей установите libsass')
+        css = sass.compile(filename=SOURCE, output_style='compressed')
+        with open(TARGET, 'w') as target:
+            target.write(css)
+        self.stdout.write('{}: {} байт'.format(TARGET, len(css)))
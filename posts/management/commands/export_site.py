@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import shards
+from posts.transfer import export_site
+
+
+class Command(BaseCommand):
+    help = 'Выгружает пользователей, посты и картинки в каталог'
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory')
+        parser.add_argument('--batch-size', type=int)
+
+    def handle(self, *args, **options):
+        if shards.enabled():
+            raise CommandError('Команда работает только с одной базой, '
+                               'а задан SHARD_DATABASES')
+        manifest = export_site(options['directory'], options['batch_size'])
+        for label, entry in manifest['models'].items():
+            self.stdout.write('{}: {}'.format(label, entry['rows']))
+        self.stdout.write('картинок: {}'.format(manifest['media']['count']))
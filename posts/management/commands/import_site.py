@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import shards
+from posts.transfer import TransferError, import_site
+
+
+class Command(BaseCommand):
+    help = 'Загружает выгрузку export_site, сдвигая первичные ключи'
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory')
+        parser.add_argument('--batch-size', type=int)
+
+    def handle(self, *args, **options):
+        if shards.enabled():
+            raise CommandError('Команда работает только с одной базой, '
+                               'а задан SHARD_DATABASES')
+        try:
+            counts = import_site(options['directory'], options['batch_size'])
+        except TransferError as error:
+            raise CommandError(error)
+        for label, count in counts.items():
+            self.stdout.write('{}: {}'.format(label, count))
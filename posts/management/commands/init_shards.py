@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import shards
+
+
+class Command(BaseCommand):
+    help = ('Создаёт таблицы в базах SHARD_DATABASES, отводит им диапазоны '
+            'id и копирует пользователей и группы')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int,
+                            default=settings.SHARD_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        if not shards.enabled():
+            raise CommandError('SHARD_DATABASES не задан')
+        for alias in shards.aliases():
+            call_command('migrate', database=alias,
+                         verbosity=max(options['verbosity'] - 1, 0))
+            shards.reserve_ids(alias)
+            shards.copy_replicated(alias, options['batch_size'])
+            if options['verbosity']:
+                self.stdout.write('{}: готов'.format(alias))
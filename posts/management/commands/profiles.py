@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+
+from yatube import profiling
+
+
+class Command(BaseCommand):
+    help = 'Показывает профили запросов и собирает из них свёрнутые стеки'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--view', help='только профили представления')
+        parser.add_argument('--collapsed', metavar='FILE',
+                            help='записать свёрнутые стеки для flamegraph '
+                                 '(- для вывода в консоль)')
+        parser.add_argument('--token', action='store_true',
+                            help='напечатать значение заголовка X-Profile')
+        parser.add_argument('--clear', action='store_true',
+                            help='удалить профили после вывода')
+
+    def handle(self, *args, **options):
+        if options['token']:
+            self.stdout.write(profiling.make_token())
+            return
+        metas = profiling.entries(options['view'])
+        if options['collapsed']:
+            stacks = profiling.aggregate_stacks(metas)
+            if options['collapsed'] == '-':
+                self.stdout.write(stacks, ending='')
+            else:
+                with open(options['collapsed'], 'w') as f:
+                    f.write(stacks)
+                self.stdout.write('Профилей: {}, записано в {}'.format(
+                    len(metas), options['collapsed']))
+        else:
+            for meta in metas:
+                peak = meta['memory_peak']
+                self.stdout.write('{}  {} {} {} {:.1f} мс{}'.format(
+                    meta['id'], meta['method'], meta['path'],
+                    meta['status'], meta['duration'],
+                    ', память до {:.1f} КБ'.format(peak / 1024)
+                    if peak is not None else ''))
+            if not metas:
+                self.stdout.write('Профилей нет')
+        if options['clear']:
+            profiling.clear()
@@ -0,0 +1,32 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from posts import shards
+
+
+class Command(BaseCommand):
+    help = ('Переносит посты авторов в шарды, которые им назначает хеш: '
+            'после включения шардирования или добавления шарда')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int,
+                            default=settings.SHARD_BATCH_SIZE)
+        parser.add_argument('--dry-run', action='store_true',
+                            help='только показать, кого нужно перенести')
+
+    def handle(self, *args, **options):
+        if not shards.enabled():
+            raise CommandError('SHARD_DATABASES не задан')
+        authors = posts = 0
+        for source in [DEFAULT_DB_ALIAS] + shards.aliases():
+            for author_id, target in shards.misplaced_authors(source):
+                authors += 1
+                if options['dry_run']:
+                    self.stdout.write('автор {}: {} -> {}'.format(
+                        author_id, source, target))
+                    continue
+                posts += shards.move_author(author_id, source, target,
+                                            options['batch_size'])
+        self.stdout.write('Авторов: {}, перенесено постов: {}'.format(
+            authors, posts))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from posts import shards
+from posts.cache import posts as post_cache
+from posts.models import Post
+from posts.parse import index_post, render_post
+
+
+class Command(BaseCommand):
+    help = 'Заново разбирает теги и упоминания и обновляет HTML постов'
+
+    def handle(self, *args, **options):
+        count = 0
+        for using in shards.post_databases():
+            posts = Post.objects.using(using)
+            for post in posts.order_by('pk').iterator():
+                render_post(post)
+                posts.filter(pk=post.pk).update(text_html=post.text_html)
+                post_cache.forget('pk', post.pk)
+                index_post(post)
+                count += 1
+        self.stdout.write('Обработано постов: {}'.format(count))
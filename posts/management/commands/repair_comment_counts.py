@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from posts import shards
+from posts.archive import recount_comments
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает comment_count и last_comment_at у постов'
+
+    def handle(self, *args, **options):
+        updated = sum(recount_comments(Post.objects.using(using).all())
+                      for using in shards.post_databases())
+        self.stdout.write('Пересчитано постов: {}'.format(updated))
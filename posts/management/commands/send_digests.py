@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from posts.notifications import send_digests
+
+
+class Command(BaseCommand):
+    help = 'Отправляет письма с непрочитанными уведомлениями'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int,
+                            help='писем за одну отправку')
+
+    def handle(self, *args, **options):
+        sent = send_digests(options['batch_size'])
+        self.stdout.write('Отправлено писем: {}'.format(sent))
@@ -0,0 +1,43 @@
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+
+from yatube.slowqueries import clear, entries
+
+
+class Command(BaseCommand):
+    help = 'Показывает самые медленные запросы из журнала slowqueries'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=10,
+                            help='сколько запросов показать')
+        parser.add_argument('--clear', action='store_true',
+                            help='очистить журнал после вывода')
+
+    def handle(self, *args, **options):
+        groups = defaultdict(list)
+        for entry in entries():
+            groups[entry['sql']].append(entry)
+        top = sorted(groups.values(),
+                     key=lambda items: -sum(item['duration']
+                                            for item in items))
+        for items in top[:options['top']]:
+            slowest = max(items, key=lambda item: item['duration'])
+            self.stdout.write(
+                '{:.1f} мс всего, {} раз, до {:.1f} мс'.format(
+                    sum(item['duration'] for item in items), len(items),
+                    slowest['duration']))
+            self.stdout.write('  ' + slowest['sql'])
+            self.stdout.write('  параметры: {}'.format(slowest['params']))
+            for place in sorted({(item['view'], item['code'],
+                                  item['template']) for item in items},
+                                key=str):
+                self.stdout.write('  {}: {}, шаблон {}'.format(*place))
+            if slowest['plan']:
+                for line in slowest['plan'].splitlines():
+                    self.stdout.write('    ' + line)
+            self.stdout.write('')
+        if not groups:
+            self.stdout.write('Медленных запросов не записано')
+        if options['clear']:
+            clear()
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from posts.warmup import warm_caches
+
+
+class Command(BaseCommand):
+    help = ('Прогревает кеши ленты, популярных групп, профилей и постов '
+            'и создаёт миниатюры')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int,
+                            help='сколько групп, профилей и постов прогреть')
+        parser.add_argument('--workers', type=int,
+                            help='число одновременных запросов')
+        parser.add_argument('--no-thumbnails', action='store_false',
+                            dest='thumbnails', help='не создавать миниатюры')
+
+    def handle(self, *args, **options):
+        report, took = warm_caches(options['top'], options['workers'],
+                                   options['thumbnails'])
+        for target, result, seconds in report:
+            self.stdout.write('{:>8.1f} мс  {}  {}'.format(
+                seconds * 1000, result, target))
+        errors = sum(1 for _, result, _ in report
+                     if isinstance(result, Exception)
+                     or isinstance(result, int) and result >= 400)
+        self.stdout.write('Прогрето {} за {:.2f} с, ошибок: {}'.format(
+            len(report), took, errors))
@@ -0,0 +1,42 @@
+# Generated by Django 2.2.6 on 2026-10-19 07:40
+
+from django.db import migrations, models
+from django.db.models import Count, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_comment_stats(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    using = schema_editor.connection.alias
+    comments = (Comment.objects.using(using).filter(post=OuterRef('pk'))
+                .order_by().values('post'))
+    Post.objects.using(using).update(
+        comment_count=Coalesce(Subquery(
+            comments.annotate(count=Count('pk')).values('count')
+        ), 0),
+        last_comment_at=Subquery(
+            comments.annotate(last=Max('created')).values('last')
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0015_auto_20261019_0738'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='last_comment_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.RunPython(fill_comment_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 2.2.6 on 2026-10-19 07:55
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0018_post_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedPost',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False)),
+                ('text', models.TextField()),
+                ('pub_date', models.DateTimeField(verbose_name='date published')),
+                ('author_id', models.IntegerField(db_index=True)),
+                ('group_id', models.IntegerField(blank=True, null=True)),
+                ('image', models.ImageField(blank=True, null=True, upload_to='posts/')),
+                ('image_width', models.PositiveIntegerField(blank=True, null=True)),
+                ('image_height', models.PositiveIntegerField(blank=True, null=True)),
+                ('comment_count', models.PositiveIntegerField(default=0)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ('-pub_date',),
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedComment',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False)),
+                ('author_id', models.IntegerField(db_index=True)),
+                ('text', models.TextField()),
+                ('created', models.DateTimeField(verbose_name='date published')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='comments', to='posts.ArchivedPost')),
+            ],
+            options={
+                'ordering': ('-created',),
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 2.2.6 on 2026-10-19 07:57
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0020_auto_20261019_0756'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Notification',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('comment', 'Комментарий'), ('follow', 'Подписка'), ('mention', 'Упоминание')], max_length=10)),
+                ('count', models.PositiveIntegerField(default=1)),
+                ('updated', models.DateTimeField(auto_now=True)),
+                ('read', models.BooleanField(default=False)),
+                ('emailed', models.BooleanField(default=False)),
+                ('actor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('post', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to='posts.Post')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ('-updated',),
+                'index_together': {('user', 'read', 'updated')},
+            },
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 2.2.6 on 2026-10-19 08:11
+
+from django.db import migrations, models
+from django.db.models import Count, Max, Sum
+import django.db.models.deletion
+
+
+def fill_group_stats(apps, schema_editor):
+    Group = apps.get_model('posts', 'Group')
+    GroupStats = apps.get_model('posts', 'GroupStats')
+    using = schema_editor.connection.alias
+    rows = Group.objects.using(using).annotate(
+        post_count=Count('posts'),
+        author_count=Count('posts__author', distinct=True),
+        comment_count=Sum('posts__comment_count'),
+        last_post_at=Max('posts__pub_date'),
+    ).values_list('pk', 'post_count', 'author_count', 'comment_count',
+                  'last_post_at')
+    GroupStats.objects.using(using).bulk_create([
+        GroupStats(group_id=pk, post_count=posts, author_count=authors,
+                   comment_count=comments or 0, last_post_at=last)
+        for pk, posts, authors, comments, last in rows.iterator()
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0021_notification'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GroupStats',
+            fields=[
+                ('group', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='posts.Group')),
+                ('post_count', models.PositiveIntegerField(db_index=True, default=0)),
+                ('author_count', models.PositiveIntegerField(default=0)),
+                ('comment_count', models.PositiveIntegerField(default=0)),
+                ('last_post_at', models.DateTimeField(blank=True, db_index=True, null=True)),
+            ],
+        ),
+        migrations.RunPython(fill_group_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 2.2.6 on 2026-10-19 08:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0022_groupstats'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='notification',
+            name='post',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to='posts.Post'),
+        ),
+    ]
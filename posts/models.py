@@ -8,7 +8,8 @@ User = get_user_model()
 
 class Post(models.Model):
     text = models.TextField()
-    pub_date = models.DateTimeField('date published', auto_now_add=True)
+    pub_date = models.DateTimeField('date published', auto_now_add=True,
+                                    db_index=True)
     author = models.ForeignKey(User, on_delete=models.CASCADE,
                                related_name='posts')
     group = models.ForeignKey('Group', on_delete=models.SET_NULL,
@@ -17,6 +18,15 @@ class Post(models.Model):
                               blank=True,
                               null=True,
                               )
+    image_width = models.PositiveIntegerField(blank=True, null=True)
+    image_height = models.PositiveIntegerField(blank=True, null=True)
+    comment_count = models.PositiveIntegerField(default=0)
+    last_comment_at = models.DateTimeField(blank=True, null=True,
+                                           db_index=True)
+    # Номер правки для защиты от потерянных обновлений при редактировании
+    version = models.PositiveIntegerField(default=1)
+    # Текст с готовыми ссылками на теги и упоминания (posts/parse.py)
+    text_html = models.TextField(blank=True, default='')
 
     class Meta:
         ordering = ('-pub_date',)
@@ -34,6 +44,17 @@ class Group(models.Model):
         return self.title
 
 
+class GroupStats(models.Model):
+    """Счётчики группы для каталога групп (posts/groupstats.py)"""
+
+    group = models.OneToOneField(Group, on_delete=models.CASCADE,
+                                 primary_key=True, related_name='stats')
+    post_count = models.PositiveIntegerField(default=0, db_index=True)
+    author_count = models.PositiveIntegerField(default=0)
+    comment_count = models.PositiveIntegerField(default=0)
+    last_post_at = models.DateTimeField(blank=True, null=True, db_index=True)
+
+
 class Comment(models.Model):
     post = models.ForeignKey(Post, on_delete=models.CASCADE,
                              related_name='comments')
@@ -54,3 +75,101 @@ class Follow(models.Model):
 
     class Meta:
         unique_together = ('user', 'author')
+
+
+class Tag(models.Model):
+    name = models.CharField(max_length=50, unique=True)
+
+    def __str__(self):
+        return '#' + self.name
+
+
+class PostTag(models.Model):
+    """Пост с тегом. pub_date повторяет дату поста для ленты тега"""
+
+    post = models.ForeignKey(Post, on_delete=models.CASCADE,
+                             related_name='post_tags')
+    tag = models.ForeignKey(Tag, on_delete=models.CASCADE,
+                            related_name='post_tags')
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('post', 'tag')
+        index_together = ('tag', 'pub_date', 'post')
+
+
+class Mention(models.Model):
+    post = models.ForeignKey(Post, on_delete=models.CASCADE,
+                             related_name='mentions')
+    user = models.ForeignKey(User, on_delete=models.CASCADE,
+                             related_name='mentions')
+
+    class Meta:
+        unique_together = ('post', 'user')
+
+
+class Notification(models.Model):
+    """Уведомление; однотипные события по одному посту копятся в count"""
+
+    COMMENT = 'comment'
+    FOLLOW = 'follow'
+    MENTION = 'mention'
+    KINDS = (
+        (COMMENT, 'Комментарий'),
+        (FOLLOW, 'Подписка'),
+        (MENTION, 'Упоминание'),
+    )
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE,
+                             related_name='notifications')
+    kind = models.CharField(max_length=10, choices=KINDS)
+    # При шардировании пост лежит в другой базе, чем уведомление
+    post = models.ForeignKey(Post, on_delete=models.CASCADE,
+                             related_name='notifications',
+                             blank=True, null=True, db_constraint=False)
+    actor = models.ForeignKey(User, on_delete=models.SET_NULL,
+                              related_name='+', blank=True, null=True)
+    count = models.PositiveIntegerField(default=1)
+    updated = models.DateTimeField(auto_now=True)
+    read = models.BooleanField(default=False)
+    emailed = models.BooleanField(default=False)
+
+    class Meta:
+        ordering = ('-updated',)
+        index_together = ('user', 'read', 'updated')
+
+
+class ArchivedPost(models.Model):
+    """Пост, перенесённый в архив (posts/archive.py).
+
+    Связи хранятся числами, чтобы архив мог жить в отдельной базе.
+    """
+
+    id = models.IntegerField(primary_key=True)
+    text = models.TextField()
+    pub_date = models.DateTimeField('date published')
+    author_id = models.IntegerField(db_index=True)
+    group_id = models.IntegerField(blank=True, null=True)
+    image = models.ImageField(upload_to='posts/', blank=True, null=True)
+    image_width = models.PositiveIntegerField(blank=True, null=True)
+    image_height = models.PositiveIntegerField(blank=True, null=True)
+    comment_count = models.PositiveIntegerField(default=0)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ('-pub_date',)
+
+    def __str__(self):
+        return textwrap.shorten(self.text, width=80)
+
+
+class ArchivedComment(models.Model):
+    id = models.IntegerField(primary_key=True)
+    post = models.ForeignKey(ArchivedPost, on_delete=models.CASCADE,
+                             related_name='comments')
+    author_id = models.IntegerField(db_index=True)
+    text = models.TextField()
+    created = models.DateTimeField('date published')
+
+    class Meta:
+        ordering = ('-created',)
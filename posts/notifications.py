@@ -0,0 +1,154 @@
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Notification
+from .tasks import enqueue
+
+UNREAD_KEY = 'notifications:unread:{}'
+
+# События, ждущие записи: (получатель, вид, пост) -> (число, автор)
+_pending = {}
+_lock = threading.Lock()
+# Один flush за раз: select_for_update на SQLite ничего не блокирует, и
+# два потока задач могли бы оба не найти запись и создать по дубликату
+_flush_lock = threading.Lock()
+
+
+def notify(user_id, kind, actor_id, post_id=None):
+    """Событие копится в памяти и записывается фоновой задачей пачкой"""
+
+    if user_id == actor_id:
+        return
+
+    def add():
+        with _lock:
+            key = (user_id, kind, post_id)
+            count, _ = _pending.get(key, (0, None))
+            _pending[key] = (count + 1, actor_id)
+
+    # Как и задачи, событие попадает в буфер только после фиксации
+    if settings.TASKS_ALWAYS_EAGER:
+        add()
+    else:
+        transaction.on_commit(add)
+    # Первая задача заберёт всё накопленное, остальные ничего не найдут
+    enqueue(flush)
+
+
+def flush():
+    """Запись накопленных событий: однотипные непрочитанные объединяются"""
+
+    with _flush_lock:
+        _flush()
+
+
+def _flush():
+    global _pending
+    with _lock:
+        pending, _pending = _pending, {}
+    if not pending:
+        return
+    now = timezone.now()
+    lookup = Q()
+    for user_id, kind, post_id in pending:
+        lookup |= Q(user_id=user_id, kind=kind, post_id=post_id)
+    with transaction.atomic():
+        existing = {
+            (item.user_id, item.kind, item.post_id): item
+            for item in Notification.objects.select_for_update()
+            .filter(lookup, read=False)
+        }
+        updated, created = [], []
+        for key, (count, actor_id) in pending.items():
+            item = existing.get(key)
+            if item is None:
+                user_id, kind, post_id = key
+                created.append(Notification(
+                    user_id=user_id, kind=kind, post_id=post_id,
+                    actor_id=actor_id, count=count,
+                ))
+            else:
+                item.count += count
+                item.actor_id = actor_id
+                item.updated = now
+                item.emailed = False
+                updated.append(item)
+        Notification.objects.bulk_update(
+            updated, ['count', 'actor', 'updated', 'emailed'])
+        Notification.objects.bulk_create(created)
+    cache.delete_many([UNREAD_KEY.format(user_id)
+                       for user_id, _, _ in pending])
+
+
+def unread_count(user_id):
+    """Число непрочитанных уведомлений; запрос к базе только при промахе"""
+
+    key = UNREAD_KEY.format(user_id)
+    count = cache.get(key)
+    if count is None:
+        count = Notification.objects.filter(user_id=user_id,
+                                            read=False).count()
+        cache.set(key, count, None)
+    return count
+
+
+def mark_read(user_id, ids):
+    """Прочитанными становятся только показанные уведомления"""
+
+    if Notification.objects.filter(user_id=user_id, pk__in=ids,
+                                   read=False).update(read=True):
+        cache.delete(UNREAD_KEY.format(user_id))
+
+
+def describe(item):
+    if item.kind == Notification.FOLLOW:
+        if item.count > 1:
+            return 'Новых подписчиков: {}'.format(item.count)
+        return '{} подписался на вас'.format(item.actor)
+    if item.kind == Notification.COMMENT:
+        if item.count > 1:
+            return 'Новых комментариев к вашему посту: {}'.format(item.count)
+        return '{} прокомментировал ваш пост'.format(item.actor)
+    if item.count > 1:
+        return 'Вас упомянули в посте {} раз'.format(item.count)
+    return '{} упомянул вас в посте'.format(item.actor)
+
+
+def send_digests(batch_size=None):
+    """Письма с непрочитанными уведомлениями через одно соединение.
+
+    Возвращает число отправленных писем.
+    """
+
+    batch_size = batch_size or settings.NOTIFICATION_DIGEST_BATCH_SIZE
+    items = (Notification.objects
+             .filter(read=False, emailed=False)
+             .exclude(user__email='')
+             .select_related('user', 'actor')
+             .order_by('user_id', '-updated'))
+    digests = {}
+    for item in items.iterator():
+        digests.setdefault(item.user, []).append(item)
+    sent = 0
+    connection = get_connection(settings.NOTIFICATION_EMAIL_BACKEND)
+    with connection:
+        users = list(digests)
+        for start in range(0, len(users), batch_size):
+            batch = users[start:start + batch_size]
+            messages = [EmailMessage(
+                'Новое на Yatube',
+                '\n'.join(describe(item) for item in digests[user]),
+                to=[user.email],
+                connection=connection,
+            ) for user in batch]
+            sent += connection.send_messages(messages) or 0
+            Notification.objects.filter(
+                pk__in=[item.pk for user in batch for item in digests[user]]
+            ).update(emailed=True)
+    return sent
@@ -0,0 +1,87 @@
+from datetime import datetime, timedelta, timezone
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+from .concurrency import run_concurrently
+
+
+def estimate_table_rows(model, using='default'):
+    """Приблизительное число строк в таблице без полного подсчёта"""
+
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(
+                'SELECT reltuples::bigint FROM pg_class WHERE relname = %s',
+                [table],
+            )
+        elif connection.vendor == 'sqlite':
+            # Максимальный rowid ограничивает число строк сверху
+            cursor.execute('SELECT max(rowid) FROM {}'.format(
+                connection.ops.quote_name(table)))
+        else:
+            return None
+        row = cursor.fetchone()
+    return row[0] if row and row[0] is not None else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """Пагинатор, который не считает строки в больших таблицах без фильтров"""
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        query = getattr(queryset, 'query', None)
+        if query is not None and not query.where:
+            estimate = estimate_table_rows(queryset.model, queryset.db)
+            if estimate and estimate > settings.ADMIN_EXACT_COUNT_LIMIT:
+                return estimate
+        return super().count
+
+
+def paginate(request, queryset, *queries):
+    """Страница ленты и результаты дополнительных запросов.
+
+    Подсчёт, выборка запрошенной страницы и queries выполняются
+    независимо друг от друга, поэтому могут идти параллельно.
+    """
+
+    per_page = settings.POSTS_PER_PAGE
+    page_number = request.GET.get('page')
+    try:
+        number = max(int(page_number), 1)
+    except (TypeError, ValueError):
+        number = 1
+    bottom = (number - 1) * per_page
+    count, posts, *results = run_concurrently(
+        queryset.count,
+        lambda: list(queryset[bottom:bottom + per_page]),
+        *queries
+    )
+    paginator = Paginator(queryset, per_page)
+    paginator.count = count
+    page = paginator.get_page(page_number)
+    if page.number == number:
+        page.object_list = posts
+    return paginator, page, results
+
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def format_cursor(pub_date, pk):
+    """Ключ страницы для пагинации по (дата, id) без OFFSET"""
+
+    return '{}_{}'.format((pub_date - EPOCH) // timedelta(microseconds=1), pk)
+
+
+def parse_cursor(value):
+    try:
+        microseconds, pk = (int(part) for part in value.split('_'))
+    except (AttributeError, ValueError):
+        return None
+    return EPOCH + timedelta(microseconds=microseconds), pk
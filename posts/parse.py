@@ -0,0 +1,97 @@
+import re
+
+from django.db import transaction
+from django.template.defaultfilters import linebreaksbr
+from django.urls import reverse
+from django.utils.html import escape
+
+from . import shards
+from .models import Mention, PostTag, Tag, User
+
+# Перед # и @ не должно быть буквы, а перед # ещё и & из &#x27;
+HASHTAG_RE = re.compile(r'(?<![\w&])#(\w{1,50})')
+MENTION_RE = re.compile(r'(?<![\w@])@(\w(?:[\w.+-]*\w)?)')
+
+
+def extract(text):
+    """Теги в нижнем регистре и упомянутые имена в порядке появления"""
+
+    tags = [name.lower() for name in HASHTAG_RE.findall(text)]
+    usernames = MENTION_RE.findall(text)
+    return list(dict.fromkeys(tags)), list(dict.fromkeys(usernames))
+
+
+def render_text(text, usernames=()):
+    """HTML текста поста со ссылками на теги и существующих авторов"""
+
+    usernames = set(usernames)
+
+    def tag_link(match):
+        return '<a href="{}">{}</a>'.format(
+            reverse('tag', kwargs={'name': match.group(1).lower()}),
+            match.group(0))
+
+    def mention_link(match):
+        if match.group(1) not in usernames:
+            return match.group(0)
+        return '<a href="{}">{}</a>'.format(
+            reverse('profile', kwargs={'username': match.group(1)}),
+            match.group(0))
+
+    html = HASHTAG_RE.sub(tag_link, escape(text))
+    html = MENTION_RE.sub(mention_link, html)
+    return linebreaksbr(html, autoescape=False)
+
+
+def mentioned_users(text):
+    _, usernames = extract(text)
+    if not usernames:
+        return {}
+    return dict(User.objects.filter(username__in=usernames)
+                .values_list('username', 'pk'))
+
+
+def post_mentions(post):
+    """Упомянутые в посте авторы; для одного текста запрос выполняется раз"""
+
+    cached = post.__dict__.get('_mentions')
+    if cached is None or cached[0] != post.text:
+        cached = post._mentions = (post.text, mentioned_users(post.text))
+    return cached[1]
+
+
+def render_post(post):
+    """Заполнение text_html перед сохранением поста"""
+
+    post.text_html = render_text(post.text, post_mentions(post))
+
+
+def index_post(post):
+    """Теги и упоминания сохранённого поста в одной транзакции.
+
+    Возвращает id пользователей, упомянутых впервые. При шардировании
+    теги и упоминания не индексируются: их таблицы ссылаются на посты.
+    """
+
+    if shards.enabled():
+        return []
+    tags, _ = extract(post.text)
+    user_ids = list(post_mentions(post).values())
+    with transaction.atomic():
+        Tag.objects.bulk_create([Tag(name=name) for name in tags],
+                                ignore_conflicts=True)
+        tag_ids = list(Tag.objects.filter(name__in=tags)
+                       .values_list('pk', flat=True))
+        PostTag.objects.filter(post=post).exclude(tag_id__in=tag_ids).delete()
+        PostTag.objects.bulk_create([
+            PostTag(post=post, tag_id=tag_id, pub_date=post.pub_date)
+            for tag_id in tag_ids
+        ], ignore_conflicts=True)
+        Mention.objects.filter(post=post).exclude(user_id__in=user_ids).delete()
+        known = set(Mention.objects.filter(post=post)
+                    .values_list('user_id', flat=True))
+        Mention.objects.bulk_create([
+            Mention(post=post, user_id=user_id) for user_id in user_ids
+            if user_id not in known
+        ])
+    return [user_id for user_id in user_ids if user_id not in known]
@@ -0,0 +1,68 @@
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+ARCHIVE_DB = 'archive'
+ARCHIVE_MODELS = {'archivedpost', 'archivedcomment'}
+
+
+def is_archive_model(app_label, model_name):
+    return app_label == 'posts' and model_name in ARCHIVE_MODELS
+
+
+class ArchiveRouter:
+    """Архивные модели в базе 'archive', если она описана в DATABASES"""
+
+    def db_for_model(self, model, **hints):
+        if (ARCHIVE_DB in settings.DATABASES
+                and is_archive_model(model._meta.app_label,
+                                     model._meta.model_name)):
+            return ARCHIVE_DB
+        return None
+
+    db_for_read = db_for_model
+    db_for_write = db_for_model
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if ARCHIVE_DB not in settings.DATABASES:
+            return None
+        if db == ARCHIVE_DB:
+            return is_archive_model(app_label, model_name)
+        if is_archive_model(app_label, model_name):
+            return False
+        return None
+
+
+class ShardRouter:
+    """Посты и комментарии в шарде автора, остальное в default.
+
+    Без SHARD_DATABASES ничего не решает. Таблицы создаются во всех
+    базах: в шардах нужны копии пользователей и групп для внешних
+    ключей постов. Запрос к постам или комментариям, для которого шард
+    не выводится из instance, требует явного using(): иначе он молча
+    ушёл бы в default.
+    """
+
+    def db_for_model(self, model, instance=None, **hints):
+        from . import shards
+
+        if not shards.enabled():
+            return None
+        if model._meta.label_lower not in shards.SHARDED_MODELS:
+            return DEFAULT_DB_ALIAS
+        alias = shards.db_for(instance) if instance is not None else None
+        if alias is None:
+            raise shards.ShardError(
+                'Шард для {} не известен, укажите using()'.format(
+                    model._meta.label))
+        return alias
+
+    db_for_read = db_for_model
+    db_for_write = db_for_model
+
+    def allow_relation(self, obj1, obj2, **hints):
+        from . import shards
+
+        # Автор и группа поста из default, их копии лежат в шарде
+        if shards.enabled():
+            return True
+        return None
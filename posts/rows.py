@@ -0,0 +1,46 @@
+"""
+Запись и удаление строк без загрузки объектов, сигналов и save().
+"""
+
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+def delete_rows(model, column, values, using=DEFAULT_DB_ALIAS):
+    """DELETE по списку значений без загрузки объектов и сигналов.
+
+    Счётчики комментариев и кеши групп обновляет вызывающий код.
+    """
+
+    if not values:
+        return
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        cursor.execute('DELETE FROM {} WHERE {} IN ({})'.format(
+            connection.ops.quote_name(model._meta.db_table),
+            connection.ops.quote_name(column),
+            ', '.join(['%s'] * len(values)),
+        ), list(values))
+
+
+def insert_rows(model, objs, using=DEFAULT_DB_ALIAS):
+    """INSERT объектов как есть.
+
+    В отличие от bulk_create значения полей с auto_now_add и первичные
+    ключи не заменяются, поэтому так переносятся готовые строки.
+    """
+
+    if not objs:
+        return
+    connection = connections[using]
+    fields = model._meta.concrete_fields
+    with connection.cursor() as cursor:
+        cursor.executemany('INSERT INTO {} ({}) VALUES ({})'.format(
+            connection.ops.quote_name(model._meta.db_table),
+            ', '.join(connection.ops.quote_name(field.column)
+                      for field in fields),
+            ', '.join(['%s'] * len(fields)),
+        ), [
+            [field.get_db_prep_save(getattr(obj, field.attname), connection)
+             for field in fields]
+            for obj in objs
+        ])
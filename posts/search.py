@@ -0,0 +1,67 @@
+from django.db import connections
+
+FTS_SCHEMA = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS posts_post_fts USING fts5("
+    "text, content='posts_post', content_rowid='id')",
+    "CREATE TRIGGER IF NOT EXISTS posts_post_fts_ai "
+    "AFTER INSERT ON posts_post BEGIN "
+    "INSERT INTO posts_post_fts(rowid, text) VALUES (new.id, new.text); "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS posts_post_fts_ad "
+    "AFTER DELETE ON posts_post BEGIN "
+    "INSERT INTO posts_post_fts(posts_post_fts, rowid, text) "
+    "VALUES ('delete', old.id, old.text); "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS posts_post_fts_au "
+    "AFTER UPDATE OF text ON posts_post BEGIN "
+    "INSERT INTO posts_post_fts(posts_post_fts, rowid, text) "
+    "VALUES ('delete', old.id, old.text); "
+    "INSERT INTO posts_post_fts(rowid, text) VALUES (new.id, new.text); "
+    "END",
+)
+
+
+def fts_available(using='default'):
+    return connections[using].vendor == 'sqlite'
+
+
+def ensure_fts(using='default'):
+    """Создание полнотекстового индекса по Post.text для SQLite.
+
+    Пересборка таблиц при миграциях SQLite удаляет триггеры, поэтому
+    после каждой миграции они создаются заново, а индекс перестраивается.
+    """
+
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        if 'posts_post' not in connection.introspection.table_names(cursor):
+            return
+        cursor.execute(
+            "SELECT count(*) FROM sqlite_master "
+            "WHERE type = 'trigger' AND name LIKE 'posts_post_fts_%%'"
+        )
+        triggers = cursor.fetchone()[0]
+        for statement in FTS_SCHEMA:
+            cursor.execute(statement)
+        if triggers < 3:
+            cursor.execute(
+                "INSERT INTO posts_post_fts(posts_post_fts) VALUES ('rebuild')"
+            )
+
+
+def fts_query(term):
+    tokens = term.split()
+    return ' '.join('"{}"*'.format(token.replace('"', '""'))
+                    for token in tokens)
+
+
+def search_posts(queryset, term):
+    """Поиск постов по тексту через индекс FTS5"""
+
+    return queryset.extra(
+        where=['posts_post.id IN (SELECT rowid FROM posts_post_fts '
+               'WHERE posts_post_fts MATCH %s)'],
+        params=[fts_query(term)],
+    )
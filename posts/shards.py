@@ -0,0 +1,274 @@
+"""
+Шардирование постов по автору.
+
+Если задан SHARD_DATABASES, посты и комментарии к ним хранятся в базах
+'shard0', 'shard1', ...: все посты автора и все комментарии к ним в
+одной базе. Базу автора выбирает rendezvous-хеширование, поэтому при
+добавлении шарда переезжает примерно 1/N авторов. Пользователи и группы
+остаются в default и копируются во все шарды, чтобы внешние ключи
+постов были локальными. Каждому шарду отведён свой диапазон id
+(init_shards), поэтому при переносе между шардами id постов сохраняются.
+
+Ленты из нескольких шардов (MergedFeed) собираются слиянием отсортированных
+по (pub_date, id) потоков, которые каждый шард отдаёт порциями по ключу
+последней строки, без OFFSET.
+
+Теги, упоминания, поиск, архив и перенос сайта работают только с одной
+базой: при шардировании теги и упоминания не индексируются. Посты и
+комментарии при шардировании не видны в админке: её списки и удаление
+выбирают базу без экземпляра модели.
+
+Запросы к постам и комментариям без экземпляра (Post.objects.filter,
+Post.objects.create) при шардировании требуют using(), иначе ShardRouter
+выбрасывает ShardError.
+
+    python manage.py init_shards
+    python manage.py rebalance_shards
+"""
+
+import hashlib
+import heapq
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import Q
+
+from .models import (Comment, Group, Mention, Notification, Post, PostTag,
+                     User)
+from .rows import delete_rows, insert_rows
+
+SHARDED_MODELS = {'posts.post', 'posts.comment'}
+REPLICATED_MODELS = (User, Group)
+# Первый id шарда с номером n — (n + 1) << ID_BITS; id из default меньше
+ID_BITS = 40
+
+
+class ShardError(Exception):
+    pass
+
+
+def aliases():
+    return ['shard{}'.format(number)
+            for number in range(len(settings.SHARD_DATABASES))]
+
+
+def enabled():
+    return bool(settings.SHARD_DATABASES)
+
+
+def post_databases():
+    """Базы, в которых лежат посты"""
+
+    return aliases() or [DEFAULT_DB_ALIAS]
+
+
+@lru_cache(maxsize=100000)
+def _shard_for(author_id, names):
+    return max(names, key=lambda alias: hashlib.md5(
+        '{}:{}'.format(alias, author_id).encode()).digest())
+
+
+def shard_for(author_id):
+    """База постов автора или None без шардирования"""
+
+    if not enabled():
+        return None
+    return _shard_for(author_id, tuple(aliases()))
+
+
+def db_for(instance):
+    """База шарда для поста, комментария или автора"""
+
+    if isinstance(instance, User):
+        return shard_for(instance.pk)
+    if isinstance(instance, Post):
+        return shard_for(instance.author_id)
+    if isinstance(instance, Comment):
+        if Comment.post.is_cached(instance):
+            return shard_for(instance.post.author_id)
+        if instance._state.db in aliases():
+            return instance._state.db
+    return None
+
+
+class MergedFeed:
+    """Посты нескольких шардов от новых к старым для Paginator.
+
+    Каждый шард читается порциями по ключу (pub_date, id) последней
+    строки, порции сливаются heapq.merge. Для страницы с номером n
+    читается n страниц, как и при OFFSET в одной базе, но первая порция
+    шарда — только его доля от них.
+    """
+
+    def __init__(self, querysets):
+        self.querysets = [queryset.order_by('-pub_date', '-pk')
+                          for queryset in querysets]
+
+    def count(self):
+        return sum(queryset.count() for queryset in self.querysets)
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice) or key.step:
+            raise TypeError('MergedFeed поддерживает только срезы')
+        if not self.querysets:
+            return []
+        start, stop = key.start or 0, key.stop
+        # В среднем шард даёт stop / N первых строк, остальное дочитается
+        batch_size = max(stop - start, -(-stop // len(self.querysets)), 1)
+        # paginate() уже вызывает count и срез в разных потоках пула,
+        # поэтому шарды здесь читаются по очереди
+        streams = [self.stream(queryset, list(queryset[:batch_size]),
+                               batch_size)
+                   for queryset in self.querysets]
+        merged = heapq.merge(*streams, reverse=True,
+                             key=lambda post: (post.pub_date, post.pk))
+        items = []
+        for number, post in enumerate(merged):
+            if number >= stop:
+                break
+            if number >= start:
+                items.append(post)
+        return items
+
+    @staticmethod
+    def stream(queryset, rows, batch_size):
+        while True:
+            yield from rows
+            if len(rows) < batch_size:
+                return
+            last = rows[-1]
+            rows = list(queryset.filter(
+                Q(pub_date__lt=last.pub_date)
+                | Q(pub_date=last.pub_date, pk__lt=last.pk)
+            )[:batch_size])
+
+
+def feed(queryset, author_ids=None):
+    """Лента по queryset постов: как есть или слиянием шардов.
+
+    author_ids ограничивает ленту авторами, тогда читаются только их
+    шарды.
+    """
+
+    if author_ids is not None:
+        author_ids = list(author_ids)
+        queryset = queryset.filter(author_id__in=author_ids)
+    if not enabled():
+        return queryset
+    if author_ids is None:
+        return MergedFeed([queryset.using(alias) for alias in aliases()])
+    by_shard = {}
+    for author_id in author_ids:
+        by_shard.setdefault(shard_for(author_id), []).append(author_id)
+    return MergedFeed([
+        queryset.using(alias).filter(author_id__in=ids)
+        for alias, ids in sorted(by_shard.items())
+    ])
+
+
+def attach_posts(notifications):
+    """Посты уведомлений из шардов: по запросу на шард вместо JOIN"""
+
+    ids = {item.post_id for item in notifications if item.post_id}
+    found = {}
+    for alias in aliases():
+        found.update((post.pk, post) for post in (
+            Post.objects.using(alias).filter(pk__in=ids)
+            .select_related('author')))
+    for item in notifications:
+        if item.post_id:
+            Notification.post.field.set_cached_value(
+                item, found.get(item.post_id))
+
+
+def replicate(instance, delete=False):
+    """Копия пользователя или группы во всех шардах"""
+
+    model = type(instance)
+    for alias in aliases():
+        rows = model._base_manager.using(alias).filter(pk=instance.pk)
+        if delete:
+            rows.delete()
+            continue
+        values = {field.attname: getattr(instance, field.attname)
+                  for field in model._meta.concrete_fields
+                  if not field.primary_key}
+        if not rows.update(**values):
+            insert_rows(model, [instance], alias)
+
+
+def reserve_ids(alias):
+    """Начало диапазона id шарда в sqlite_sequence"""
+
+    number = aliases().index(alias)
+    start = (number + 1) << ID_BITS
+    connection = connections[alias]
+    if connection.vendor != 'sqlite':
+        raise NotImplementedError('Диапазоны id настроены только для SQLite')
+    with connection.cursor() as cursor:
+        for model in (Post, Comment):
+            table = model._meta.db_table
+            cursor.execute('SELECT seq FROM sqlite_sequence WHERE name = %s',
+                           [table])
+            row = cursor.fetchone()
+            if row is None:
+                cursor.execute('INSERT INTO sqlite_sequence (name, seq) '
+                               'VALUES (%s, %s)', [table, start])
+            elif row[0] < start:
+                cursor.execute('UPDATE sqlite_sequence SET seq = %s '
+                               'WHERE name = %s', [start, table])
+
+
+def copy_replicated(alias, batch_size):
+    for model in REPLICATED_MODELS:
+        existing = set(model._base_manager.using(alias)
+                       .values_list('pk', flat=True))
+        rows = model._base_manager.using(DEFAULT_DB_ALIAS).order_by('pk')
+        batch = []
+        for instance in rows.iterator(chunk_size=batch_size):
+            if instance.pk not in existing:
+                batch.append(instance)
+            if len(batch) >= batch_size:
+                insert_rows(model, batch, alias)
+                batch = []
+        insert_rows(model, batch, alias)
+
+
+def misplaced_authors(source):
+    """Авторы, чьи посты лежат в source, но по хешу живут в другом шарде"""
+
+    author_ids = (Post._base_manager.using(source).order_by()
+                  .values_list('author_id', flat=True).distinct())
+    return [(author_id, shard_for(author_id)) for author_id in author_ids
+            if shard_for(author_id) != source]
+
+
+def move_author(author_id, source, target, batch_size):
+    """Перенос постов автора и комментариев к ним; возвращает число постов"""
+
+    moved = 0
+    posts = Post._base_manager.using(source).filter(author_id=author_id)
+    while True:
+        batch = list(posts.order_by('pk')[:batch_size])
+        if not batch:
+            return moved
+        ids = [post.pk for post in batch]
+        comments = list(Comment._base_manager.using(source)
+                        .filter(post_id__in=ids))
+        # Целевая база фиксируется первой: если упасть между фиксациями,
+        # порция останется в обеих базах и при повторе перепишется
+        with transaction.atomic(using=source):
+            with transaction.atomic(using=target):
+                delete_rows(Comment, 'post_id', ids, target)
+                delete_rows(Post, 'id', ids, target)
+                insert_rows(Post, batch, target)
+                insert_rows(Comment, comments, target)
+            # Теги и упоминания есть только в default, до шардирования
+            for model in (Comment, PostTag, Mention):
+                delete_rows(model, 'post_id', ids, source)
+            delete_rows(Post, 'id', ids, source)
+        moved += len(batch)
@@ -0,0 +1,156 @@
+from functools import lru_cache
+
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import F, Max
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.template.loader import render_to_string
+
+from . import groupstats, shards
+from .cache import posts, refresh_group_first_page
+from .live import hub
+from .models import Post, Group, GroupStats, Comment, Notification, User
+from .parse import render_post
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, using, **kwargs):
+    last_comment_at = (Comment.objects.using(using)
+                       .filter(post_id=instance.post_id)
+                       .aggregate(last=Max('created'))['last'])
+    post = Post.objects.using(using).filter(pk=instance.post_id)
+    post.filter(comment_count__gt=0).update(
+        comment_count=F('comment_count') - 1,
+        last_comment_at=last_comment_at,
+    )
+    posts.forget('pk', instance.post_id)
+    group_id = post.values_list('group_id', flat=True).first()
+    if group_id:
+        refresh_group_first_page(group_id)
+        groupstats.comments_changed(group_id, -1)
+
+
+def comment_event_data(comment):
+    """Данные события о комментарии; HTML рендерится при первой отправке"""
+
+    @lru_cache(maxsize=None)
+    def data():
+        return {
+            'id': comment.pk,
+            'html': render_to_string('posts/includes/comment_item.html',
+                                     {'item': comment}),
+        }
+
+    return data
+
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, using, **kwargs):
+    if not created:
+        return
+    # Счётчики поста и группы меняются здесь же, где и уменьшаются в
+    # comment_deleted, чтобы комментарии из админки их не обходили
+    Post.objects.using(using).filter(pk=instance.post_id).update(
+        comment_count=F('comment_count') + 1,
+        last_comment_at=instance.created,
+    )
+    posts.forget('pk', instance.post_id)
+    group_id = instance.post.group_id
+    if group_id:
+        refresh_group_first_page(group_id)
+        groupstats.comments_changed(group_id, 1)
+    data = comment_event_data(instance)
+    transaction.on_commit(lambda: hub.publish(
+        'post:{}'.format(instance.post_id), 'comment', data
+    ), using=using)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def post_changed(sender, instance, created=False, update_fields=None,
+                 **kwargs):
+    if not instance.group_id:
+        return
+    if update_fields and 'group' not in update_fields and not created:
+        # Правка без смены группы затрагивает страницу, только если пост
+        # на ней виден
+        refresh_group_first_page(instance.group_id, instance.pk)
+    else:
+        refresh_group_first_page(instance.group_id)
+
+
+@receiver(pre_save, sender=Post)
+def post_saving(sender, instance, using, update_fields=None, **kwargs):
+    if instance.pk is not None and (update_fields is None
+                                    or 'group' in update_fields):
+        instance._stored_group_id = (
+            Post.objects.using(using).filter(pk=instance.pk)
+            .values_list('group_id', flat=True).first())
+
+
+@receiver(pre_save, sender=Post)
+def post_rendering(sender, instance, update_fields=None, **kwargs):
+    # text_html пересобирается при любом сохранении текста: в формах,
+    # админке и оболочке
+    if update_fields is None or 'text' in update_fields:
+        render_post(instance)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def post_group_stats(sender, instance, signal, created=False, **kwargs):
+    if signal is post_delete:
+        groupstats.recount([instance.group_id])
+    elif created:
+        if instance.group_id:
+            groupstats.post_added(instance)
+    elif hasattr(instance, '_stored_group_id'):
+        stored = instance.__dict__.pop('_stored_group_id')
+        if stored != instance.group_id:
+            groupstats.recount([stored, instance.group_id])
+
+
+@receiver(post_save, sender=Post)
+def post_created(sender, instance, created, using, **kwargs):
+    if not created:
+        return
+    channels = ['index']
+    if instance.group_id:
+        channels.append('group:{}'.format(instance.group_id))
+    data = {'id': instance.pk}
+
+    def publish():
+        for channel in channels:
+            hub.publish(channel, 'post', data)
+
+    transaction.on_commit(publish, using=using)
+
+
+@receiver(post_delete, sender=Post)
+def post_notifications_deleted(sender, instance, using, **kwargs):
+    # Уведомления лежат в default и без внешнего ключа на пост в шарде,
+    # каскад их не удалит
+    if using != DEFAULT_DB_ALIAS:
+        Notification.objects.filter(post_id=instance.pk).delete()
+
+
+@receiver(post_save, sender=Group)
+def group_created(sender, instance, created, **kwargs):
+    if created:
+        GroupStats.objects.get_or_create(group=instance)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, instance, **kwargs):
+    refresh_group_first_page(instance.pk)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=User)
+@receiver(post_delete, sender=Group)
+def replicate_to_shards(sender, instance, signal, using, **kwargs):
+    # Копии в шардах меняются только вслед за default
+    if using == DEFAULT_DB_ALIAS and shards.enabled():
+        shards.replicate(instance, delete=signal is post_delete)
@@ -0,0 +1,40 @@
+// Выбор группы: варианты подгружаются поиском, а не всей таблицей групп
+(function () {
+    document.querySelectorAll('select[data-search-url]').forEach(function (select) {
+        var input = document.createElement('input');
+        input.type = 'search';
+        input.className = 'form-control mb-1';
+        input.placeholder = 'Поиск сообщества';
+        select.parentNode.insertBefore(input, select);
+        var timer = null;
+
+        function load() {
+            var url = select.dataset.searchUrl + '?q=' + encodeURIComponent(input.value);
+            fetch(url).then(function (response) {
+                return response.json();
+            }).then(function (data) {
+                var selected = select.value;
+                Array.from(select.options).forEach(function (option) {
+                    if (option.value && option.value !== selected) {
+                        option.remove();
+                    }
+                });
+                data.results.forEach(function (group) {
+                    if (String(group.id) !== selected) {
+                        select.add(new Option(group.title, group.id));
+                    }
+                });
+            });
+        }
+
+        input.addEventListener('input', function () {
+            clearTimeout(timer);
+            timer = setTimeout(load, 250);
+        });
+        select.addEventListener('focus', function () {
+            if (select.options.length <= 2) {
+                load();
+            }
+        }, {once: true});
+    });
+})();
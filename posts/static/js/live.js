@@ -0,0 +1,23 @@
+// Живые обновления: новые комментарии вставляются в список,
+// о новых постах показывается уведомление
+(function () {
+    if (!window.EventSource) {
+        return;
+    }
+    document.querySelectorAll('[data-live-url]').forEach(function (element) {
+        var source = new EventSource(element.dataset.liveUrl);
+        source.addEventListener('comment', function (event) {
+            var data = JSON.parse(event.data);
+            if (!element.querySelector('[name="comment_' + data.id + '"]')) {
+                element.insertAdjacentHTML('afterbegin', data.html);
+            }
+        });
+        source.addEventListener('post', function () {
+            var notice = element.querySelector('[data-live-notice]');
+            var count = Number(notice.dataset.count || 0) + 1;
+            notice.dataset.count = count;
+            notice.querySelector('span').textContent = count;
+            notice.hidden = false;
+        });
+    });
+})();
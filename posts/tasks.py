@@ -0,0 +1,40 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.TASK_WORKERS,
+            thread_name_prefix='yatube-task',
+        )
+    return _executor
+
+
+def _run(func, args, kwargs):
+    close_old_connections()
+    try:
+        func(*args, **kwargs)
+    except Exception:
+        logger.exception('Фоновая задача %s завершилась ошибкой',
+                         func.__name__)
+    finally:
+        close_old_connections()
+
+
+def enqueue(func, *args, **kwargs):
+    """Запуск задачи вне цикла запроса после фиксации транзакции"""
+
+    if settings.TASKS_ALWAYS_EAGER:
+        return func(*args, **kwargs)
+    transaction.on_commit(
+        lambda: _get_executor().submit(_run, func, args, kwargs)
+    )
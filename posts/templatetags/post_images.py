@@ -0,0 +1,8 @@
+from django import template
+
+from ..images import image_variant
+
+register = template.Library()
+
+# Миниатюра из generate_image_variants без её генерации в запросе
+register.simple_tag(image_variant)
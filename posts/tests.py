@@ -1,15 +1,49 @@
+import asyncio
+import gzip
 import io
+import os
+import pickle
+import pstats
 import tempfile
+import threading
+import time
+import zlib
+from datetime import timedelta
 
 from PIL import Image
 from unittest import mock
-from django.test import TestCase, Client, override_settings
+from django.test import (TestCase, TransactionTestCase, Client,
+                         RequestFactory, override_settings)
+from django.test.utils import CaptureQueriesContext
+from django.db import IntegrityError, connection, transaction
 from django.urls import reverse
+from django.utils import timezone
+from django.core import mail
 from django.core.cache import cache
+from django.http import HttpResponse, StreamingHttpResponse
+from django.template import Context as TemplateContext, Template
 from django.core.files import File
+from django.core.files.storage import default_storage
+from django.conf import settings
+from django.core.management import CommandError, call_command
 from django.contrib.auth.models import User
+from django.contrib.flatpages.models import FlatPage
+from django.contrib.sites.models import Site
 
-from .models import Post, Group, Follow, Comment
+from tests.fixtures.factories import make_group, make_post, make_user
+from yatube.asgi import WsgiBridge
+from yatube.wsgi import application as wsgi_application
+from yatube import profiling, slowqueries
+from yatube.assets import StaticAssetsApp
+from yatube.compression import CompressionMiddleware, brotli, choose_encoding
+from . import groupstats
+from .archive import archive_posts, purge_user
+from .cache import GROUP_PAGE_KEY, posts as post_cache, users
+from .live import format_event, hub
+from .models import (Post, Group, Follow, Comment, ArchivedPost,
+                     ArchivedComment, GroupStats, Notification, Tag)
+from .notifications import describe, notify
+from .paginators import EstimatedCountPaginator, paginate
 
 
 class PostProjectTests(TestCase):
@@ -17,11 +51,11 @@ class PostProjectTests(TestCase):
         cache.clear()
         self.client_auth = Client()
         self.client_unauth = Client()
-        self.user = User.objects.create_user(username='sarah')
+        self.user = make_user(username='sarah')
         self.client_auth.force_login(self.user)
-        self.group = Group.objects.create(title='sarahconnor',
-                                          slug='sarahconnor',
-                                          description=None)
+        self.group = make_group(title='sarahconnor',
+                                slug='sarahconnor',
+                                description=None)
 
     def _post_group(self, response, post, text):
         if 'paginator' in response.context:
@@ -161,6 +195,48 @@ class PostProjectTests(TestCase):
                                     ' поврежден или не является изображением.'
                              )
 
+    @override_settings(MEDIA_ROOT=tempfile.mkdtemp(),
+                       POST_IMAGE_MAX_SIZE=(50, 50),
+                       TASKS_ALWAYS_EAGER=True)
+    def test_uploaded_image_is_reencoded(self):
+        img = self._create_test_image_file()
+        self.client_auth.post(reverse('new_post'), data={
+            'text': 'post with image',
+            'image': img
+        })
+        post = self.user.posts.first()
+        self.assertTrue(post.image.name.endswith('.jpg'))
+        self.assertEqual((post.image_width, post.image_height), (50, 50))
+        with post.image.open(), Image.open(post.image) as image:
+            self.assertEqual(image.format, 'JPEG')
+            self.assertEqual(image.size, (50, 50))
+            self.assertNotIn('exif', image.info)
+        response = self.client_auth.get(reverse('post', kwargs={
+            'username': self.user, 'post_id': post.pk
+        }))
+        self.assertContains(response, 'image/webp')
+
+    @override_settings(MEDIA_ROOT=tempfile.mkdtemp(),
+                       POST_IMAGE_MAX_UPLOAD_SIZE=16)
+    def test_too_large_image_is_rejected(self):
+        response = self.client_auth.post(reverse('new_post'), data={
+            'text': 'post with image',
+            'image': self._create_test_image_file()
+        })
+        self.assertFormError(response, form='form', field='image',
+                             errors='Файл изображения слишком большой.')
+        self.assertFalse(Post.objects.exists())
+
+    @override_settings(MEDIA_ROOT=tempfile.mkdtemp(),
+                       POST_IMAGE_MAX_PIXELS=100)
+    def test_image_dimensions_are_limited(self):
+        response = self.client_auth.post(reverse('new_post'), data={
+            'text': 'post with image',
+            'image': self._create_test_image_file()
+        })
+        self.assertFormError(response, form='form', field='image',
+                             errors='Изображение слишком большое: 100×100.')
+
     def test_cache_works(self):
         text = 'new text'
         self.client_auth.post(reverse('new_post'), data={
@@ -176,13 +252,13 @@ class PostProjectTests(TestCase):
         self.assertContains(response, 'new text')
 
     def test_auth_user_can_follow(self):
-        new_user = User.objects.create_user(username='wildorf')
+        new_user = make_user(username='wildorf')
         self.client_auth.get(reverse('profile_follow',
                                      kwargs={'username': new_user.username}))
         self.assertEqual(len(new_user.following.all()), 1)
 
     def test_auth_user_can_unfollow(self):
-        new_user = User.objects.create_user(username='wildorf')
+        new_user = make_user(username='wildorf')
         self.client_auth.get(reverse('profile_follow',
                                      kwargs={'username': new_user.username}))
         self.assertEqual(len(new_user.following.all()), 1)
@@ -192,8 +268,8 @@ class PostProjectTests(TestCase):
 
     def test_new_post_followers_can_see(self):
         text = 'new post'
-        new_user1 = User.objects.create_user(username='wildorf')
-        new_user2 = User.objects.create_user(username='ford')
+        new_user1 = make_user(username='wildorf')
+        new_user2 = make_user(username='ford')
         new_client1 = Client()
         new_client2 = Client()
         new_client1.force_login(new_user1)
@@ -239,3 +315,1073 @@ class PostProjectTests(TestCase):
                                         })
         comment = Comment.objects.all()
         self.assertEqual(len(comment), 1)
+
+
+class CommentCountTests(TestCase):
+    def setUp(self):
+        self.user = make_user(username='kyle')
+        self.client.force_login(self.user)
+        self.post = make_post(text='text', author=self.user)
+
+    def _comment(self, text):
+        self.client.post(reverse('add_comment', kwargs={
+            'username': self.user.username, 'post_id': self.post.pk
+        }), data={'text': text})
+
+    def test_counters_follow_comments(self):
+        self._comment('first')
+        self._comment('second')
+        self.post.refresh_from_db()
+        first, second = Comment.objects.order_by('created')
+        self.assertEqual(self.post.comment_count, 2)
+        self.assertEqual(self.post.last_comment_at, second.created)
+        second.delete()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 1)
+        self.assertEqual(self.post.last_comment_at, first.created)
+
+    def test_repair_command(self):
+        self._comment('first')
+        Post.objects.update(comment_count=10, last_comment_at=None)
+        call_command('repair_comment_counts', stdout=io.StringIO())
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 1)
+        self.assertIsNotNone(self.post.last_comment_at)
+
+
+@override_settings(RATE_LIMITS=dict(settings.RATE_LIMITS,
+                                    comment=(2, 10 ** 9), follow=(1, 10 ** 9)))
+class RateLimitedWritesTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = make_user(username='dyson')
+        self.post = make_post(text='text', author=self.author)
+        self.client.force_login(make_user(username='miles'))
+
+    def test_comments_limited_per_user(self):
+        url = reverse('add_comment', kwargs={'username': 'dyson',
+                                             'post_id': self.post.pk})
+        for _ in range(2):
+            self.assertEqual(
+                self.client.post(url, {'text': 'hi'}).status_code, 302)
+        self.assertEqual(self.client.post(url, {'text': 'hi'}).status_code,
+                         429)
+        self.assertEqual(Comment.objects.count(), 2)
+        other = Client()
+        other.force_login(self.author)
+        self.assertEqual(other.post(url, {'text': 'hi'}).status_code, 302)
+
+    def test_follow_limited(self):
+        url = reverse('profile_follow', kwargs={'username': 'dyson'})
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.assertEqual(self.client.get(url).status_code, 429)
+
+
+class StaticAssetsTests(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        with open(os.path.join(self.root, 'app.0123456789ab.css'), 'w') as f:
+            f.write('body {}' * 100)
+        with open(os.path.join(self.root, 'app.0123456789ab.css.gz'),
+                  'wb') as f:
+            f.write(gzip.compress(b'body {}' * 100))
+        self.app = StaticAssetsApp(lambda environ, start_response: ['app'],
+                                   root=self.root, prefix='/static/')
+
+    def _get(self, path, **environ):
+        result = {}
+
+        def start_response(status, headers):
+            result['status'] = status
+            result['headers'] = dict(headers)
+
+        environ.update({'PATH_INFO': path, 'REQUEST_METHOD': 'GET'})
+        result['body'] = self.app(environ, start_response)
+        return result
+
+    def test_hashed_asset_is_immutable_and_precompressed(self):
+        response = self._get('/static/app.0123456789ab.css',
+                             HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['status'], '200 OK')
+        self.assertIn('immutable', response['headers']['Cache-Control'])
+        self.assertEqual(response['headers']['Content-Encoding'], 'gzip')
+        response = self._get('/static/app.0123456789ab.css')
+        self.assertNotIn('Content-Encoding', response['headers'])
+
+    def test_unknown_and_outside_paths_fall_through(self):
+        self.assertEqual(self._get('/static/missing.css')['body'], ['app'])
+        self.assertEqual(self._get('/static/../tests.py')['body'], ['app'])
+
+
+class CompressionTests(TestCase):
+    def setUp(self):
+        author = make_user(username='miles')
+        for i in range(5):
+            make_post(text='compressed post {}'.format(i), author=author)
+
+    def test_feed_compressed_with_gzip(self):
+        response = self.client.get(reverse('index'),
+                                   HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(int(response['Content-Length']),
+                         len(response.content))
+        self.assertIn('compressed post 4',
+                      gzip.decompress(response.content).decode())
+
+    def test_encoding_negotiation(self):
+        self.assertEqual(choose_encoding('gzip;q=0.5, br;q=0'), 'gzip')
+        self.assertIsNone(choose_encoding('gzip;q=0, identity'))
+        self.assertIsNone(choose_encoding(''))
+        self.assertEqual(choose_encoding('*'),
+                         'br' if brotli is not None else 'gzip')
+        response = self.client.get(reverse('index'))
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertIn('Accept-Encoding', response['Vary'])
+
+    def test_small_and_excluded_responses_untouched(self):
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING='gzip')
+        cases = [
+            HttpResponse('short'),
+            HttpResponse(b'0' * 4096, content_type='image/png'),
+            StreamingHttpResponse(iter([b'data: 1\n\n']),
+                                  content_type='text/event-stream'),
+        ]
+        for case in cases:
+            response = CompressionMiddleware(lambda request: case)(request)
+            self.assertFalse(response.has_header('Content-Encoding'))
+
+    @override_settings(STREAMING_FEEDS=True)
+    def test_streaming_feed(self):
+        response = self.client.get(reverse('index'),
+                                   HTTP_ACCEPT_ENCODING='gzip')
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        chunks = list(response.streaming_content)
+        decompressor = zlib.decompressobj(31)
+        head = decompressor.decompress(chunks[0]).decode()
+        self.assertIn('<head>', head)
+        self.assertNotIn('compressed post', head)
+        html = head + decompressor.decompress(b''.join(chunks[1:])).decode()
+        self.assertIn('compressed post 4', html)
+        self.assertTrue(html.rstrip().endswith('</html>'))
+
+    @override_settings(STREAMING_FEEDS=True)
+    def test_streaming_feed_varies_on_cookie(self):
+        self.client.force_login(User.objects.get(username='miles'))
+        response = self.client.get(reverse('index'))
+        self.assertTrue(response.streaming)
+        self.assertIn('Cookie', response['Vary'])
+        self.assertIn(settings.CSRF_COOKIE_NAME, response.cookies)
+
+    @override_settings(STREAMING_FEEDS=True)
+    def test_streaming_feed_queries_run_after_head(self):
+        for url in (reverse('index'),
+                    reverse('profile', kwargs={'username': 'miles'})):
+            response = self.client.get(url)
+            chunks = iter(response.streaming_content)
+            with CaptureQueriesContext(connection) as queries:
+                head = next(chunks).decode()
+                self.assertIn('<head>', head)
+                self.assertFalse([query for query in queries
+                                  if 'posts_post' in query['sql']])
+                html = head + b''.join(chunks).decode()
+            self.assertIn('compressed post 4', html)
+            self.assertTrue([query for query in queries
+                             if 'posts_post' in query['sql']])
+
+
+class AdminTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='admin')
+        self.client.force_login(self.admin)
+        group = make_group(title='group', slug='group')
+        for i in range(5):
+            author = make_user(username='author{}'.format(i))
+            post = make_post(text='пост номер {}'.format(i),
+                             author=author, group=group)
+            Comment.objects.create(post=post, author=author, text='text')
+
+    def test_changelists_do_not_query_per_row(self):
+        # Сессия и пользователь берутся из кеша после первого запроса
+        self.client.get(reverse('admin:index'))
+        for name in ('post', 'comment', 'follow'):
+            with self.assertNumQueries(3):
+                response = self.client.get(
+                    reverse('admin:posts_{}_changelist'.format(name)))
+            self.assertEqual(response.status_code, 200)
+
+    def test_post_search_uses_full_text_index(self):
+        post = Post.objects.get(text='пост номер 3')
+        post.text = 'изменённый текст'
+        post.save()
+        response = self.client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'измен'})
+        self.assertEqual(list(response.context['cl'].result_list), [post])
+        response = self.client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'номер'})
+        self.assertEqual(response.context['cl'].result_count, 4)
+
+    @override_settings(ADMIN_EXACT_COUNT_LIMIT=1)
+    def test_unfiltered_changelist_uses_estimate(self):
+        Post.objects.order_by('pk').first().delete()
+        paginator = EstimatedCountPaginator(Post.objects.all(), 10)
+        self.assertEqual(paginator.count, Post.objects.order_by().last().pk)
+
+
+class GroupCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = make_user(username='miles', password='secret')
+        self.group = make_group(title='skynet', slug='skynet')
+        self.url = reverse('group', kwargs={'slug': self.group.slug})
+        make_post(text='first', author=self.user, group=self.group)
+
+    def test_first_page_is_served_from_cache(self):
+        self.client.get(self.url)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+        self.assertEqual(response.context['paginator'].count, 1)
+        self.assertEqual(response.context['group'], self.group)
+
+    def test_password_hash_not_cached(self):
+        response = self.client.get(self.url)
+        self.assertContains(response, 'miles')
+        cached = cache.get(GROUP_PAGE_KEY.format(self.group.pk))
+        self.assertIsNotNone(cached)
+        self.assertNotIn(self.user.password.encode(), pickle.dumps(cached))
+
+    @override_settings(TASKS_ALWAYS_EAGER=True)
+    def test_new_post_refreshes_first_page(self):
+        self.client.get(self.url)
+        make_post(text='second', author=self.user, group=self.group)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+        self.assertEqual(response.context['paginator'].count, 2)
+        self.assertEqual(response.context['page'][0].text, 'second')
+
+    def test_group_change_invalidates_lookup(self):
+        self.client.get(self.url)
+        self.group.slug = 'cyberdyne'
+        self.group.save()
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+        response = self.client.get(
+            reverse('group', kwargs={'slug': 'cyberdyne'}))
+        self.assertEqual(response.status_code, 200)
+
+
+class GroupStatsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = make_user(username='miles')
+        self.other = make_user(username='dyson')
+        self.group = make_group(title='Скайнет', slug='skynet')
+        self.empty = make_group(title='Киберлайф', slug='cyber')
+
+    def stats(self, group):
+        stats = GroupStats.objects.get(group=group)
+        return (stats.post_count, stats.author_count, stats.comment_count)
+
+    def test_counters_follow_posts_and_comments(self):
+        post = make_post(text='first', author=self.user, group=self.group)
+        make_post(text='second', author=self.user, group=self.group)
+        make_post(text='third', author=self.other, group=self.group)
+        self.client.force_login(self.other)
+        self.client.post(reverse('add_comment', kwargs={
+            'username': 'miles', 'post_id': post.pk}), {'text': 'hi'})
+        post.refresh_from_db()
+        self.assertEqual(self.stats(self.group), (3, 2, 1))
+        self.assertEqual(self.stats(self.empty), (0, 0, 0))
+        post.group = self.empty
+        post.save()
+        self.assertEqual(self.stats(self.group), (2, 2, 0))
+        self.assertEqual(self.stats(self.empty), (1, 1, 1))
+        post.delete()
+        self.assertEqual(self.stats(self.empty), (0, 0, 0))
+        self.assertIsNone(GroupStats.objects.get(
+            group=self.empty).last_post_at)
+
+    def test_comment_outside_views_counted_once(self):
+        post = make_post(text='first', author=self.user, group=self.group)
+        comment = Comment.objects.create(post=post, author=self.other,
+                                         text='hi')
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 1)
+        self.assertEqual(self.stats(self.group), (1, 1, 1))
+        groupstats.recount([self.group.pk])
+        self.assertEqual(self.stats(self.group), (1, 1, 1))
+        comment.delete()
+        self.assertEqual(self.stats(self.group), (1, 1, 0))
+        GroupStats.objects.filter(group=self.group).update(comment_count=0)
+        Comment.objects.create(post=post, author=self.other, text='hi')
+        Comment.objects.get().delete()
+        self.assertEqual(self.stats(self.group), (1, 1, 0))
+
+    def test_directory_and_search(self):
+        make_post(text='text', author=self.user, group=self.group)
+        response = self.client.get(reverse('group_list'))
+        self.assertEqual([item.group for item in response.context['page']],
+                         [self.group, self.empty])
+        response = self.client.get(reverse('group_list'), {'q': 'Кибер'})
+        self.assertEqual([item.group for item in response.context['page']],
+                         [self.empty])
+        response = self.client.get(reverse('group_search'), {'q': 'Скай'})
+        self.assertEqual(response.json()['results'], [{
+            'id': self.group.pk, 'title': 'Скайнет', 'slug': 'skynet',
+            'post_count': 1}])
+
+    def test_post_form_does_not_load_all_groups(self):
+        self.client.force_login(self.user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('new_post'))
+        self.assertFalse(any('posts_group' in query['sql']
+                             for query in queries))
+        self.assertNotContains(response, 'Скайнет')
+        self.assertContains(response, 'js/group_picker.js')
+        response = self.client.post(reverse('new_post'), {
+            'text': 'text', 'group': self.empty.pk})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Post.objects.get().group, self.empty)
+        post = Post.objects.get()
+        response = self.client.get(reverse('post_edit', kwargs={
+            'username': 'miles', 'post_id': post.pk}))
+        self.assertContains(response, 'Киберлайф')
+        self.assertNotContains(response, 'Скайнет')
+
+
+class ObjectCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = make_user(username='miles')
+        self.post = make_post(text='first', author=self.user)
+
+    def test_lookup_hits_cache(self):
+        stats = users.stats
+        misses, local_hits = stats['misses'], stats['local_hits']
+        self.assertEqual(users.get(username='miles'), self.user)
+        with self.assertNumQueries(0):
+            self.assertEqual(users.get(username='miles'), self.user)
+        self.assertEqual(stats['misses'], misses + 1)
+        self.assertEqual(stats['local_hits'], local_hits + 1)
+        self.assertIsNone(users.get(username='nobody'))
+
+    def test_entries_are_independent_copies(self):
+        users.get(username='miles').first_name = 'changed'
+        self.assertEqual(users.get(username='miles').first_name, '')
+
+    def test_save_invalidates_old_and_new_keys(self):
+        users.get(username='miles')
+        self.user.username = 'dyson'
+        self.user.save()
+        self.assertIsNone(users.get(username='miles'))
+        self.assertEqual(users.get(username='dyson').pk, self.user.pk)
+
+    def test_post_page_uses_cached_objects(self):
+        url = reverse('post', kwargs={'username': 'miles',
+                                      'post_id': self.post.pk})
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        self.assertFalse(any('"posts_post"."text"' in query['sql']
+                             for query in queries))
+        self.client.force_login(self.user)
+        self.client.post(reverse('add_comment', kwargs={
+            'username': 'miles', 'post_id': self.post.pk}), {'text': 'hi'})
+        self.assertEqual(post_cache.get(pk=self.post.pk).comment_count, 1)
+
+    def test_profile_of_unknown_user_is_404(self):
+        response = self.client.get(
+            reverse('profile', kwargs={'username': 'nobody'}))
+        self.assertEqual(response.status_code, 404)
+
+    def test_stats_view_requires_staff(self):
+        url = reverse('cache_stats')
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.user.is_staff = True
+        self.user.save()
+        self.client.force_login(self.user)
+        response = self.client.get(url)
+        self.assertIn('auth.user(username, pk)', response.json())
+
+
+class ObjectCacheCommitTests(TransactionTestCase):
+    def test_stale_entry_dropped_after_commit(self):
+        cache.clear()
+        user = make_user(username='miles')
+        with transaction.atomic():
+            user.first_name = 'Майлз'
+            user.save()
+            # Промах в другом процессе до фиксации кладёт старую строку
+            cache.set(users.key('username', 'miles'), ('stale',))
+        self.assertEqual(users.get(username='miles').first_name, 'Майлз')
+
+
+@override_settings(SLOW_QUERY_LOG=True, SLOW_QUERY_THRESHOLD_MS=0,
+                   SLOW_QUERY_SAMPLE_RATE=1, SLOW_QUERY_BUFFER_SIZE=50)
+class SlowQueryLogTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        override = self.settings(SLOW_QUERY_PATH=os.path.join(
+            directory.name, 'slowqueries.sqlite3'))
+        override.enable()
+        self.addCleanup(override.disable)
+        author = make_user(username='dyson')
+        make_post(text='text', author=author)
+
+    def test_queries_recorded_with_origin_and_plan(self):
+        self.client.get(reverse('profile', kwargs={'username': 'dyson'}))
+        recorded = slowqueries.entries()
+        self.assertTrue(recorded)
+        self.assertTrue(all(entry['view'] == 'profile'
+                            for entry in recorded))
+        select = next(entry for entry in recorded
+                      if '"posts_post"."text"' in entry['sql'])
+        self.assertIn('posts/views.py:', select['code'])
+        self.assertIn('posts_post', select['plan'])
+        self.assertRegex(select['params'], r'^\(int')
+        out = io.StringIO()
+        call_command('slow_queries', '--top', '1', '--clear', stdout=out)
+        self.assertIn('мс всего', out.getvalue())
+        self.assertEqual(slowqueries.entries(), [])
+
+    def test_template_line_recorded(self):
+        recorder = slowqueries.QueryRecorder(RequestFactory().get('/'))
+        template = Template('{% for user in users %}\n{{ user }}'
+                            '{% endfor %}')
+        with connection.execute_wrapper(recorder):
+            template.render(TemplateContext({'users': User.objects.all()}))
+        entry, = slowqueries.entries()
+        self.assertEqual(entry['template'], '<unknown source>:1')
+        self.assertIsNone(entry['view'])
+
+    def test_ring_buffer_keeps_latest(self):
+        for _ in range(30):
+            self.client.get(reverse('index'))
+        self.assertEqual(len(slowqueries.entries()), 50)
+
+    def test_ring_buffer_shared_by_threads(self):
+        def write(thread):
+            for number in range(40):
+                slowqueries.record({'thread': thread, 'number': number})
+
+        threads = [threading.Thread(target=write, args=(thread,))
+                   for thread in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        recorded = slowqueries.entries()
+        self.assertEqual(len(recorded), 50)
+        last = {}
+        for entry in recorded:
+            self.assertGreater(entry['number'],
+                               last.get(entry['thread'], -1))
+            last[entry['thread']] = entry['number']
+        self.assertIn(39, last.values())
+
+    @override_settings(SLOW_QUERY_SAMPLE_RATE=0)
+    def test_unsampled_queries_not_recorded(self):
+        self.client.get(reverse('index'))
+        self.assertEqual(slowqueries.entries(), [])
+
+
+@override_settings(PROFILING=True, PROFILING_SAMPLE_RATE=0)
+class ProfilingTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        override = self.settings(PROFILING_DIR=directory.name)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.author = make_user(username='dyson')
+        make_post(text='text', author=self.author)
+        self.url = reverse('profile', kwargs={'username': 'dyson'})
+
+    def test_signed_header_profiles_request(self):
+        response = self.client.get(self.url,
+                                   HTTP_X_PROFILE=profiling.make_token())
+        meta, = profiling.entries()
+        self.assertEqual(response['X-Profile-Id'], meta['id'])
+        self.assertEqual((meta['view'], meta['status']), ('profile', 200))
+        self.assertTrue(meta['memory_top'])
+        stats = pstats.Stats(profiling.path_for(meta['id'], '.prof'))
+        self.assertIn('profile', {name for _, _, name in stats.stats})
+        self.assertTrue(os.path.exists(
+            profiling.path_for(meta['id'], '.memory')))
+
+    def test_unsigned_and_unsampled_requests_skipped(self):
+        response = self.client.get(self.url, HTTP_X_PROFILE='profile:forged')
+        self.client.get(self.url)
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertEqual(profiling.entries(), [])
+
+    @override_settings(PROFILING_SAMPLE_RATE=1, PROFILING_MAX_PROFILES=2)
+    def test_sampled_requests_keep_latest(self):
+        for _ in range(3):
+            self.client.get(self.url)
+        self.assertEqual(len(profiling.entries('profile')), 2)
+
+    @override_settings(PROFILING=False)
+    def test_disabled(self):
+        response = self.client.get(self.url,
+                                   HTTP_X_PROFILE=profiling.make_token())
+        self.assertNotIn('X-Profile-Id', response)
+
+    def test_collapsed_stacks(self):
+        def slow_paginate(*args):
+            time.sleep(0.02)
+            return paginate(*args)
+
+        with mock.patch('posts.views.paginate', side_effect=slow_paginate):
+            for _ in range(2):
+                self.client.get(self.url,
+                                HTTP_X_PROFILE=profiling.make_token())
+        out = io.StringIO()
+        call_command('profiles', '--view', 'profile', '--collapsed', '-',
+                     stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertTrue(lines)
+        self.assertTrue(all(line.startswith('profile;') for line in lines))
+        self.assertTrue(all(line.rsplit(' ', 1)[1].isdigit()
+                            for line in lines))
+        self.assertTrue(any(';posts/views.py:' in line for line in lines))
+
+    def test_download_for_staff_only(self):
+        self.client.get(self.url, HTTP_X_PROFILE=profiling.make_token())
+        profile_id = profiling.entries()[0]['id']
+        url = reverse('profile_download', args=[profile_id, 'prof'])
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.author.is_staff = True
+        self.author.save()
+        self.client.force_login(self.author)
+        response = self.client.get(reverse('profiles'))
+        self.assertEqual(response.json()['profiles'][0]['id'], profile_id)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(b''.join(response.streaming_content))
+        response = self.client.get(reverse(
+            'profile_download', args=['..', 'prof']))
+        self.assertEqual(response.status_code, 404)
+
+
+class ConcurrentReadViewsTests(TransactionTestCase):
+    def setUp(self):
+        self.author = make_user(username='dyson')
+        reader = make_user(username='reader')
+        Follow.objects.create(user=reader, author=self.author)
+        for i in range(12):
+            make_post(text='post {}'.format(i), author=self.author)
+
+    @override_settings(CONCURRENT_QUERIES=True)
+    def test_profile_runs_counters_concurrently(self):
+        response = self.client.get(
+            reverse('profile', kwargs={'username': 'dyson'}), {'page': 2})
+        self.assertEqual(response.context['count_posts'], 12)
+        self.assertEqual(response.context['count_follower'], 1)
+        self.assertEqual(response.context['count_following'], 0)
+        self.assertEqual(len(response.context['posts']), 2)
+        response = self.client.get(
+            reverse('profile', kwargs={'username': 'dyson'}), {'page': 9})
+        self.assertEqual(response.context['posts'].number, 2)
+
+    @override_settings(FILE_UPLOAD_MAX_MEMORY_SIZE=4)
+    def test_asgi_bridge_runs_wsgi_application(self):
+        def wsgi_app(environ, start_response):
+            start_response('200 OK', [('Content-Type', 'text/plain')])
+            return [environ['PATH_INFO'].encode(), b'|',
+                    environ['wsgi.input'].read()]
+
+        # Тело больше FILE_UPLOAD_MAX_MEMORY_SIZE читается из файла
+        messages = [{'type': 'http.request', 'body': b'bo',
+                     'more_body': True},
+                    {'type': 'http.request', 'body': b'dy and more'}]
+        sent = []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {'type': 'http', 'method': 'POST', 'path': '/ping/',
+                 'headers': [(b'content-type', b'text/plain')]}
+        asyncio.run(WsgiBridge(wsgi_app, max_workers=1)(scope, receive, send))
+        self.assertEqual(sent[0]['status'], 200)
+        self.assertEqual(b''.join(m.get('body', b'') for m in sent[1:]),
+                         b'/ping/|body and more')
+
+
+class LiveUpdatesTests(TransactionTestCase):
+    def setUp(self):
+        self.author = make_user(username='dyson')
+        self.group = make_group(title='Лето', slug='summer')
+
+    def test_new_post_published_after_commit(self):
+        last_id = hub.last_id
+        post = make_post(text='live', author=self.author, group=self.group)
+        self.assertEqual([item[3] for item in hub.since('index', last_id)],
+                         [{'id': post.pk}])
+        self.assertEqual(
+            len(hub.since('group:{}'.format(self.group.pk), last_id)), 1)
+
+    def test_comment_streamed_to_post_channel(self):
+        post = make_post(text='live', author=self.author)
+        self.client.force_login(self.author)
+        url = reverse('live_post', kwargs={'username': 'dyson',
+                                           'post_id': post.pk})
+        last_id = hub.last_id
+        self.client.post(reverse('add_comment', kwargs={
+            'username': 'dyson', 'post_id': post.pk}), {'text': 'привет'})
+        with override_settings(LIVE_POLL_TIMEOUT=0.1,
+                               LIVE_WSGI_STREAMS=True):
+            response = self.client.get(url, HTTP_LAST_EVENT_ID=last_id)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        body = b''.join(response.streaming_content).decode()
+        self.assertIn('event: comment', body)
+        self.assertIn('привет', body)
+
+    def test_wsgi_stream_off_by_default(self):
+        response = self.client.get(reverse('live_index'))
+        self.assertEqual(response.status_code, 204)
+
+    def test_comment_rendered_only_when_sent(self):
+        post = make_post(text='live', author=self.author)
+        last_id = hub.last_id
+        with mock.patch('posts.signals.render_to_string',
+                        return_value='html') as render:
+            Comment.objects.create(post=post, author=self.author, text='ок')
+            self.assertFalse(render.called)
+            item, = hub.since('post:{}'.format(post.pk), last_id)
+            self.assertIn(b'"html"', format_event(item))
+            format_event(item)
+        render.assert_called_once()
+
+    def test_asgi_unknown_group_is_404(self):
+        sent = []
+
+        async def receive():
+            return {'type': 'http.request', 'body': b''}
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {'type': 'http', 'method': 'GET',
+                 'path': '/group/missing/live/', 'headers': []}
+        asyncio.run(WsgiBridge(wsgi_application, max_workers=1)(
+            scope, receive, send))
+        self.assertEqual(sent[0]['status'], 404)
+
+    def test_asgi_serves_live_stream(self):
+        last_id = hub.last_id
+        make_post(text='live', author=self.author)
+        sent = []
+
+        async def receive():
+            await asyncio.sleep(0.2)
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {'type': 'http', 'method': 'GET', 'path': '/live/',
+                 'query_string': 'last={}'.format(last_id).encode()}
+        asyncio.run(WsgiBridge(None, max_workers=1)(scope, receive, send))
+        self.assertEqual(sent[0]['status'], 200)
+        self.assertIn(b'event: post', sent[1]['body'])
+
+    def test_asgi_event_published_during_replay_sent_once(self):
+        last_id = hub.last_id
+        since = hub.since
+        sent = []
+
+        def publish_then_replay(channel, after):
+            # Событие уходит и в очередь подписчика, и в историю
+            hub.publish('index', 'post', {'id': 1})
+            return since(channel, after)
+
+        async def receive():
+            await asyncio.sleep(0.2)
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {'type': 'http', 'method': 'GET', 'path': '/live/',
+                 'query_string': 'last={}'.format(last_id).encode()}
+        with mock.patch.object(hub, 'since', publish_then_replay):
+            asyncio.run(WsgiBridge(None, max_workers=1)(scope, receive,
+                                                        send))
+        body = b''.join(message.get('body', b'') for message in sent[1:])
+        self.assertEqual(body.count(b'event: post'), 1)
+
+
+class FlatPageCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.page = FlatPage.objects.create(url='/terms/', title='Правила',
+                                            content='Будьте вежливы')
+        self.page.sites.add(Site.objects.get_current())
+
+    def test_anonymous_page_served_from_cache(self):
+        response = self.client.get(reverse('terms'))
+        self.assertContains(response, 'Будьте вежливы')
+        self.assertIn('public', response['Cache-Control'])
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('terms'))
+        self.assertContains(response, 'Будьте вежливы')
+        response = self.client.get(reverse('terms'),
+                                   HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_save_invalidates_cache(self):
+        self.client.get(reverse('terms'))
+        self.page.content = 'Новые правила'
+        self.page.save()
+        self.assertContains(self.client.get(reverse('terms')), 'Новые правила')
+
+    def test_logged_in_user_sees_own_nav(self):
+        self.client.get(reverse('terms'))
+        make_user(username='dyson', password='12345')
+        self.client.login(username='dyson', password='12345')
+        response = self.client.get(reverse('terms'))
+        self.assertContains(response, 'Пользователь: dyson')
+        self.assertIn('private', response['Cache-Control'])
+
+
+class WarmCachesTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        author = make_user(username='dyson')
+        self.group = make_group(title='Лето', slug='summer')
+        make_post(text='post', author=author, group=self.group)
+
+    def test_command_renders_pages_and_fills_caches(self):
+        out = io.StringIO()
+        call_command('warm_caches', top=5, workers=2, stdout=out)
+        self.assertIn('Прогрето 4 за', out.getvalue())
+        self.assertIn('ошибок: 0', out.getvalue())
+        self.assertIsNotNone(cache.get('group:page1:{}'.format(self.group.pk)))
+
+
+class PostEditTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = make_user(username='dyson')
+        self.client.force_login(self.user)
+        self.group = make_group(title='Лето', slug='summer')
+        self.post = make_post(text='текст', author=self.user, group=self.group)
+        self.url = reverse('post_edit', kwargs={'username': 'dyson',
+                                                'post_id': self.post.pk})
+
+    def test_edit_form_shows_current_post(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.context['form'].initial['text'], 'текст')
+        self.assertContains(response, 'name="version" value="1"')
+
+    def test_unchanged_post_not_written(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(self.url, {
+                'text': 'текст', 'group': self.group.pk, 'version': 1})
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse([query for query in queries
+                          if query['sql'].startswith('UPDATE')])
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.version, 1)
+
+    def test_only_changed_fields_saved(self):
+        self.client.post(self.url, {'text': 'новый', 'group': self.group.pk,
+                                    'version': 1})
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.text, self.post.version), ('новый', 2))
+
+    def test_stale_version_rejected(self):
+        Post.objects.filter(pk=self.post.pk).update(text='чужая правка',
+                                                    version=2)
+        response = self.client.post(self.url, {'text': 'моя правка',
+                                               'version': 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'моя правка')
+        self.assertContains(response, 'name="version" value="2"')
+        self.assertTrue(response.context['form'].non_field_errors())
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.text, 'чужая правка')
+
+
+class ArchiveTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = make_user(username='dyson')
+        self.reader = make_user(username='reader')
+        self.group = make_group(title='Лето', slug='summer')
+        self.old = make_post(text='старый пост', author=self.author,
+                             group=self.group)
+        self.new = make_post(text='новый пост', author=self.author)
+        Post.objects.filter(pk=self.old.pk).update(
+            pub_date=timezone.now() - timedelta(days=1000))
+        for post in (self.old, self.new):
+            self.client.force_login(self.reader)
+            self.client.post(reverse('add_comment', kwargs={
+                'username': 'dyson', 'post_id': post.pk}), {'text': 'ок'})
+
+    def test_old_posts_moved_to_archive(self):
+        out = io.StringIO()
+        call_command('archive_posts', days=365, stdout=out)
+        self.assertIn('Перенесено в архив постов: 1', out.getvalue())
+        self.assertEqual(list(Post.objects.all()), [self.new])
+        self.assertEqual(Comment.objects.count(), 1)
+        archived = ArchivedPost.objects.get(pk=self.old.pk)
+        self.assertEqual(archived.comments.count(), 1)
+        self.assertEqual(archived.comment_count, 1)
+        response = self.client.get(reverse('post', kwargs={
+            'username': 'dyson', 'post_id': self.old.pk}))
+        self.assertContains(response, 'старый пост')
+        self.assertContains(response, 'пост в архиве')
+        self.assertEqual(response.context['post'].group, self.group)
+        self.assertEqual([item.author for item in response.context['items']],
+                         [self.reader])
+        self.assertContains(response, 'name="comment_{}"'.format(
+            archived.comments.get().pk))
+
+    def test_user_purged_in_batches(self):
+        archive_posts(timezone.now() - timedelta(days=365))
+        Follow.objects.create(user=self.reader, author=self.author)
+        purge_user(self.reader.pk, batch_size=1)
+        self.assertFalse(User.objects.filter(username='reader').exists())
+        self.assertFalse(Comment.objects.exists())
+        self.assertFalse(ArchivedComment.objects.exists())
+        self.assertFalse(Follow.objects.exists())
+        self.new.refresh_from_db()
+        self.assertEqual(self.new.comment_count, 0)
+        purge_user(self.author.pk, batch_size=1)
+        self.assertFalse(Post.objects.exists())
+        self.assertFalse(ArchivedPost.objects.exists())
+
+
+@override_settings(POSTS_PER_PAGE=2)
+class TagTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = make_user(username='dyson')
+        make_user(username='reader')
+        self.client.force_login(self.user)
+
+    def test_tags_and_mentions_indexed_on_save(self):
+        self.client.post(reverse('new_post'), {
+            'text': 'Привет, @reader и @nobody! #Лето <b>#лето</b>'})
+        post = Post.objects.get()
+        self.assertEqual(list(post.post_tags.values_list('tag__name',
+                                                         flat=True)),
+                         ['лето'])
+        self.assertEqual(list(post.mentions.values_list('user__username',
+                                                        flat=True)),
+                         ['reader'])
+        self.assertIn('<a href="/reader/">@reader</a>', post.text_html)
+        self.assertIn('@nobody', post.text_html)
+        self.assertNotIn('<b>', post.text_html)
+        response = self.client.get(reverse('index'))
+        self.assertContains(response, '<a href="/tag/%D0%BB%D0%B5%D1%82%D0'
+                                      '%BE/">#Лето</a>', html=False)
+
+    def test_edit_reindexes_tags(self):
+        self.client.post(reverse('new_post'), {'text': '#один'})
+        post = Post.objects.get()
+        self.client.post(reverse('post_edit', kwargs={
+            'username': 'dyson', 'post_id': post.pk}), {'text': '#два'})
+        self.assertEqual(list(post.post_tags.values_list('tag__name',
+                                                         flat=True)),
+                         ['два'])
+
+    def test_text_html_rendered_outside_forms(self):
+        post = make_post(text='оригинал @reader', author=self.user)
+        self.assertIn('<a href="/reader/">@reader</a>', post.text_html)
+        post.text = 'правка'
+        post.save()
+        self.assertEqual(Post.objects.get(pk=post.pk).text_html, 'правка')
+        self.assertNotContains(self.client.get(reverse('index')), 'оригинал')
+
+    def test_mentions_looked_up_once_per_save(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(reverse('new_post'), {'text': 'для @reader'})
+        self.assertEqual(sum('"auth_user"."username" IN' in query['sql']
+                             for query in queries), 1)
+
+    def test_tag_feed_uses_keyset_pages(self):
+        for i in range(5):
+            self.client.post(reverse('new_post'),
+                             {'text': 'пост {} #лето'.format(i)})
+        url = reverse('tag', kwargs={'name': 'лето'})
+        texts = []
+        while url:
+            response = self.client.get(url)
+            texts += [post.text for post in response.context['posts']]
+            cursor = response.context['next_cursor']
+            url = cursor and reverse('tag', kwargs={'name': 'лето'}) + \
+                '?after=' + cursor
+        self.assertEqual(texts, ['пост {} #лето'.format(i)
+                                 for i in reversed(range(5))])
+
+
+@override_settings(TASKS_ALWAYS_EAGER=True)
+class NotificationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = make_user(username='dyson', email='dyson@example.com')
+        self.post = make_post(text='пост', author=self.author)
+        self.readers = [make_user(username='reader{}'.format(i))
+                        for i in range(3)]
+
+    def comment(self, user):
+        self.client.force_login(user)
+        self.client.post(reverse('add_comment', kwargs={
+            'username': 'dyson', 'post_id': self.post.pk}), {'text': 'ок'})
+
+    def test_comments_coalesced_into_one_notification(self):
+        for reader in self.readers:
+            self.comment(reader)
+        self.comment(self.author)
+        item = Notification.objects.get()
+        self.assertEqual((item.user, item.kind, item.count),
+                         (self.author, Notification.COMMENT, 3))
+        self.assertEqual(describe(item),
+                         'Новых комментариев к вашему посту: 3')
+
+    def test_follow_and_mention_notify(self):
+        self.client.force_login(self.readers[0])
+        self.client.get(reverse('profile_follow',
+                                kwargs={'username': 'dyson'}))
+        self.client.get(reverse('profile_follow',
+                                kwargs={'username': 'dyson'}))
+        self.client.post(reverse('new_post'), {'text': 'привет, @dyson'})
+        self.assertEqual(
+            sorted(self.author.notifications.values_list('kind', 'count')),
+            [(Notification.FOLLOW, 1), (Notification.MENTION, 1)])
+
+    def test_unread_count_cached_and_reset_by_inbox(self):
+        self.comment(self.readers[0])
+        self.client.force_login(self.author)
+        self.client.get(reverse('index'))
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('index'))
+        self.assertContains(response, 'Уведомления (1)')
+        response = self.client.get(reverse('notifications'))
+        self.assertContains(response, 'reader0 прокомментировал ваш пост')
+        response = self.client.get(reverse('index'))
+        self.assertNotContains(response, 'Уведомления (1)')
+
+    @override_settings(
+        NOTIFICATION_EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+    def test_digest_sent_once(self):
+        self.comment(self.readers[0])
+        out = io.StringIO()
+        call_command('send_digests', stdout=out)
+        call_command('send_digests', stdout=out)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['dyson@example.com'])
+
+    def test_inbox_marks_only_shown_page_read(self):
+        for reader in range(settings.POSTS_PER_PAGE + 2):
+            Notification.objects.create(
+                user=self.author, kind=Notification.FOLLOW,
+                actor=make_user(username='fan{}'.format(reader)))
+        self.client.force_login(self.author)
+        self.client.get(reverse('notifications'))
+        self.assertEqual(self.author.notifications.filter(read=False).count(),
+                         2)
+        response = self.client.get(reverse('index'))
+        self.assertContains(response, 'Уведомления (2)')
+
+
+@override_settings(TASKS_ALWAYS_EAGER=True)
+class NotificationFlushTests(TransactionTestCase):
+    def test_concurrent_flushes_coalesce(self):
+        author = make_user(username='dyson')
+        post = make_post(text='пост', author=author)
+        readers = [make_user(username='reader{}'.format(i))
+                   for i in range(4)]
+        start = threading.Barrier(len(readers))
+
+        def comment(reader):
+            try:
+                start.wait()
+                notify(author.pk, Notification.COMMENT, reader.pk, post.pk)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=comment, args=(reader,))
+                   for reader in readers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(
+            list(Notification.objects.values_list('kind', 'count')),
+            [(Notification.COMMENT, len(readers))])
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), TASKS_ALWAYS_EAGER=True)
+class SiteTransferTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = make_user(username='dyson')
+        reader = make_user(username='reader')
+        group = make_group(title='Лето', slug='summer')
+        self.client.force_login(self.author)
+        self.client.post(reverse('new_post'), {
+            'text': '#лето @reader', 'group': group.pk,
+            'image': PostProjectTests._create_test_image_file(None)})
+        post = Post.objects.get()
+        Comment.objects.create(post=post, author=reader, text='ок')
+        Follow.objects.create(user=reader, author=self.author)
+        self.directory = tempfile.mkdtemp()
+
+    def test_export_and_import_round_trip(self):
+        call_command('export_site', self.directory, batch_size=1,
+                     stdout=io.StringIO())
+        exported = Post.objects.get()
+        image = exported.image.name
+        User.objects.all().delete()
+        Group.objects.all().delete()
+        Tag.objects.all().delete()
+        default_storage.delete(image)
+        call_command('import_site', self.directory, batch_size=1,
+                     stdout=io.StringIO())
+        post = Post.objects.get()
+        self.assertEqual((post.author.username, post.group.slug, post.text),
+                         ('dyson', 'summer', '#лето @reader'))
+        self.assertEqual(post.pub_date, exported.pub_date)
+        self.assertEqual(post.comments.get().author.username, 'reader')
+        self.assertEqual(post.post_tags.get().tag.name, 'лето')
+        self.assertTrue(Follow.objects.filter(author__username='dyson')
+                        .exists())
+        self.assertTrue(default_storage.exists(post.image.name))
+
+    def test_import_shifts_ids_next_to_existing_rows(self):
+        call_command('export_site', self.directory, stdout=io.StringIO())
+        User.objects.filter(username='reader').update(username='old_reader')
+        User.objects.filter(username='dyson').update(username='old_dyson')
+        Group.objects.update(slug='old')
+        Tag.objects.update(name='старое')
+        call_command('import_site', self.directory, stdout=io.StringIO())
+        self.assertEqual(Post.objects.count(), 2)
+        post = Post.objects.get(author__username='dyson')
+        self.assertEqual(post.comments.get().author.username, 'reader')
+
+    def test_failed_import_removes_saved_images(self):
+        call_command('export_site', self.directory, stdout=io.StringIO())
+        image = Post.objects.get().image.name
+        default_storage.delete(image)
+        # Пользователи с теми же именами остались, вставка строк падает
+        with self.assertRaises(IntegrityError):
+            call_command('import_site', self.directory, stdout=io.StringIO())
+        self.assertFalse(default_storage.exists(image))
+        self.assertEqual(Post.objects.count(), 1)
+
+    def test_corrupted_file_rejected(self):
+        call_command('export_site', self.directory, stdout=io.StringIO())
+        with open(os.path.join(self.directory, 'posts.post.ndjson.gz'),
+                  'ab') as f:
+            f.write(b'x')
+        with self.assertRaisesMessage(CommandError, 'повреждён'):
+            call_command('import_site', self.directory, stdout=io.StringIO())
@@ -0,0 +1,275 @@
+"""
+Перенос всех данных сайта (manage.py export_site / import_site).
+
+Каждая таблица пишется в свой файл <модель>.ndjson.gz: первая строка
+содержит имена колонок, остальные строки — массивы значений. Файлы
+читаются и пишутся потоком порциями по TRANSFER_BATCH_SIZE строк,
+поэтому память не зависит от размера базы. Картинки постов копируются
+в media/ с контрольными суммами sha256 в media.ndjson.gz. Все таблицы
+читаются в одной транзакции, чтобы выгрузка была согласованным снимком.
+
+При загрузке первичные ключи сдвигаются на максимальный ключ таблицы в
+целевой базе, а внешние ключи — на сдвиг той таблицы, на которую
+ссылаются, так что словарь соответствия id не нужен. Имена
+пользователей, slug групп и имена тегов в целевой базе не должны
+совпадать с загружаемыми.
+"""
+
+import datetime
+import gzip
+import hashlib
+import json
+import os
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.management.color import no_style
+from django.db import connection, connections, router, transaction
+from django.db.models import Max
+
+from .groupstats import recount
+from .models import (ArchivedComment, ArchivedPost, Comment, Follow, Group,
+                     Mention, Notification, Post, PostTag, Tag)
+from .rows import insert_rows
+
+FORMAT_VERSION = 1
+MEDIA_FILE = 'media.ndjson.gz'
+MANIFEST_FILE = 'manifest.json'
+HASH_CHUNK = 1024 * 1024
+
+User = get_user_model()
+
+# Модели в порядке загрузки и ссылки их колонок на другие модели
+MODELS = (
+    (User, {}),
+    (Group, {}),
+    (Post, {'author_id': User, 'group_id': Group}),
+    (Comment, {'post_id': Post, 'author_id': User}),
+    (Follow, {'user_id': User, 'author_id': User}),
+    (Tag, {}),
+    (PostTag, {'post_id': Post, 'tag_id': Tag}),
+    (Mention, {'post_id': Post, 'user_id': User}),
+    (Notification, {'user_id': User, 'post_id': Post, 'actor_id': User}),
+    (ArchivedPost, {'author_id': User, 'group_id': Group}),
+    (ArchivedComment, {'post_id': ArchivedPost, 'author_id': User}),
+)
+IMAGE_MODELS = (Post, ArchivedPost)
+
+
+def file_name(model):
+    return '{}.ndjson.gz'.format(model._meta.label_lower)
+
+
+def columns(model):
+    return [field.attname for field in model._meta.concrete_fields]
+
+
+def encode(value):
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    raise TypeError(type(value))
+
+
+def sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def write_rows(path, header, rows):
+    count = 0
+    with gzip.open(path, 'wt', encoding='utf-8') as f:
+        f.write(json.dumps(header, ensure_ascii=False) + '\n')
+        for row in rows:
+            f.write(json.dumps(row, ensure_ascii=False, default=encode) + '\n')
+            count += 1
+    return count
+
+
+def read_rows(path):
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        header = json.loads(f.readline())
+        yield header
+        for line in f:
+            yield json.loads(line)
+
+
+def export_media(directory, batch_size):
+    """Файлы картинок и их контрольные суммы"""
+
+    def files():
+        for model in IMAGE_MODELS:
+            names = (model.objects.exclude(image='').exclude(image=None)
+                     .order_by('pk').values_list('image', flat=True)
+                     .iterator(chunk_size=batch_size))
+            for name in names:
+                target = os.path.join(directory, 'media', name)
+                if os.path.exists(target) or not default_storage.exists(name):
+                    continue
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                with default_storage.open(name) as source, \
+                        open(target, 'wb') as f:
+                    for chunk in source.chunks():
+                        f.write(chunk)
+                yield [name, sha256(target), os.path.getsize(target)]
+
+    return write_rows(os.path.join(directory, MEDIA_FILE),
+                      ['name', 'sha256', 'size'], files())
+
+
+@contextmanager
+def snapshot():
+    """Транзакции чтения во всех базах, где лежат выгружаемые модели.
+
+    SQLite держит снимок с первого чтения до конца транзакции, PostgreSQL
+    — только на уровне REPEATABLE READ.
+    """
+
+    with ExitStack() as stack:
+        for alias in sorted({router.db_for_read(model)
+                             for model, _ in MODELS}):
+            stack.enter_context(transaction.atomic(using=alias))
+            if connections[alias].vendor == 'postgresql':
+                with connections[alias].cursor() as cursor:
+                    cursor.execute('SET TRANSACTION ISOLATION LEVEL '
+                                   'REPEATABLE READ')
+        yield
+
+
+def export_site(directory, batch_size=None):
+    """Выгрузка всех таблиц и картинок в каталог directory"""
+
+    batch_size = batch_size or settings.TRANSFER_BATCH_SIZE
+    os.makedirs(directory, exist_ok=True)
+    manifest = {'version': FORMAT_VERSION, 'models': {}}
+    with snapshot():
+        for model, _ in MODELS:
+            names = columns(model)
+            rows = (model.objects.order_by('pk').values_list(*names)
+                    .iterator(chunk_size=batch_size))
+            path = os.path.join(directory, file_name(model))
+            manifest['models'][model._meta.label_lower] = {
+                'file': file_name(model),
+                'rows': write_rows(path, names, rows),
+                'sha256': sha256(path),
+            }
+        media_path = os.path.join(directory, MEDIA_FILE)
+        manifest['media'] = {
+            'file': MEDIA_FILE,
+            'count': export_media(directory, batch_size),
+            'sha256': sha256(media_path),
+        }
+    with open(os.path.join(directory, MANIFEST_FILE), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+class TransferError(Exception):
+    pass
+
+
+def check_file(directory, entry):
+    path = os.path.join(directory, entry['file'])
+    if sha256(path) != entry['sha256']:
+        raise TransferError('Файл {} повреждён'.format(entry['file']))
+    return path
+
+
+def import_media(directory, path, saved):
+    """Картинки выгрузки; имена сохранённых файлов добавляются в saved"""
+
+    rows = read_rows(path)
+    next(rows)
+    count = 0
+    for name, digest, size in rows:
+        source = os.path.join(directory, 'media', name)
+        if not os.path.exists(source) or sha256(source) != digest:
+            raise TransferError('Картинка {} повреждена'.format(name))
+        if default_storage.exists(name):
+            with default_storage.open(name) as existing:
+                current = hashlib.sha256()
+                for chunk in existing.chunks():
+                    current.update(chunk)
+            if current.hexdigest() != digest:
+                raise TransferError('Картинка {} уже есть и отличается'
+                                  .format(name))
+            continue
+        with open(source, 'rb') as f:
+            stored = default_storage.save(name, File(f))
+        saved.append(stored)
+        if stored != name:
+            raise TransferError('Картинка {} сохранена как {}'
+                              .format(name, stored))
+        count += 1
+    return count
+
+
+def import_rows(model, references, path, offsets, batch_size):
+    rows = read_rows(path)
+    names = next(rows)
+    fields = {field.attname: field for field in model._meta.concrete_fields}
+    shift = {name: offsets[target] for name, target in references.items()}
+    shift[model._meta.pk.attname] = offsets[model]
+    count = 0
+    batch = []
+    for row in rows:
+        values = {}
+        for name, value in zip(names, row):
+            if value is not None:
+                if name in shift:
+                    value += shift[name]
+                else:
+                    value = fields[name].to_python(value)
+            values[name] = value
+        batch.append(model(**values))
+        if len(batch) >= batch_size:
+            insert_rows(model, batch)
+            count += len(batch)
+            batch = []
+    insert_rows(model, batch)
+    return count + len(batch)
+
+
+def import_site(directory, batch_size=None):
+    """Загрузка выгрузки export_site; возвращает число строк по моделям"""
+
+    batch_size = batch_size or settings.TRANSFER_BATCH_SIZE
+    with open(os.path.join(directory, MANIFEST_FILE)) as f:
+        manifest = json.load(f)
+    if manifest.get('version') != FORMAT_VERSION:
+        raise TransferError('Неизвестная версия выгрузки')
+    paths = {model: check_file(
+        directory, manifest['models'][model._meta.label_lower])
+        for model, _ in MODELS}
+    media_path = check_file(directory, manifest['media'])
+    offsets = {
+        model: model.objects.aggregate(last=Max('pk'))['last'] or 0
+        for model, _ in MODELS
+    }
+    counts = {}
+    saved = []
+    try:
+        with transaction.atomic():
+            counts['media'] = import_media(directory, media_path, saved)
+            for model, references in MODELS:
+                counts[model._meta.label_lower] = import_rows(
+                    model, references, paths[model], offsets, batch_size)
+            sql = connection.ops.sequence_reset_sql(
+                no_style(), [model for model, _ in MODELS])
+            with connection.cursor() as cursor:
+                for statement in sql:
+                    cursor.execute(statement)
+    except Exception:
+        # Хранилище не откатывается вместе с базой
+        for name in saved:
+            default_storage.delete(name)
+        raise
+    # Счётчики групп не выгружаются, а собираются заново
+    recount(Group.objects.filter(pk__gt=offsets[Group])
+            .values_list('pk', flat=True))
+    return counts
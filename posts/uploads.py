@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+
+
+class LimitedTemporaryFileUploadHandler(TemporaryFileUploadHandler):
+    """Потоковая запись загрузки на диск с ограничением размера.
+
+    Данные сверх POST_IMAGE_MAX_UPLOAD_SIZE не записываются, а файл
+    помечается атрибутом too_large, чтобы форма вернула понятную ошибку.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > settings.POST_IMAGE_MAX_UPLOAD_SIZE:
+            return None
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        upload = super().file_complete(file_size)
+        upload.too_large = self.received > settings.POST_IMAGE_MAX_UPLOAD_SIZE
+        return upload
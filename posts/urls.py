@@ -4,11 +4,22 @@ from . import views
 
 urlpatterns = [
     path("", views.index, name="index"),
+    path("live/", views.live_events, name="live_index"),
+    path("groups/", views.group_list, name="group_list"),
+    path("groups/search/", views.group_search, name="group_search"),
     path("group/<slug:slug>/", views.group_posts, name="group"),
+    path("group/<slug:slug>/live/", views.live_events, name="live_group"),
+    path("tag/<str:name>/", views.tag_posts, name="tag"),
     path("new/", views.new_post, name="new_post"),
     path("follow/", views.follow_index, name="follow_index"),
+    path("notifications/", views.notifications, name="notifications"),
     path('<str:username>/', views.profile, name='profile'),
     path('<str:username>/<int:post_id>/', views.post_view, name='post'),
+    path(
+        '<str:username>/<int:post_id>/live/',
+        views.live_events,
+        name='live_post'
+        ),
     path(
         '<str:username>/<int:post_id>/edit/',
         views.post_edit,
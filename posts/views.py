@@ -1,48 +1,142 @@
 from django.shortcuts import render, get_object_or_404, redirect
-from django.core.paginator import Paginator
+from django.db import transaction
+from django.db.models import F, Q
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.contrib.auth.decorators import login_required
 
-from .models import Post, Group, User, Follow
+from yatube.ratelimit import rate_limit
+from yatube.streaming import lazy_context, stream_render
+
+from . import shards
+from .archive import get_archived_comments, get_archived_post_or_404
+from .cache import (group_first_page_paginator, groups, posts as post_cache,
+                    refresh_group_first_page, users)
+from .concurrency import evaluated, run_concurrently
+from .models import (Post, Comment, User, Follow, Tag, Notification,
+                     GroupStats)
+from .notifications import describe, mark_read, notify
 from .forms import PostForm, CommentForm
+from .images import generate_image_variants
+from .live import channel_for, parse_last_id, stream_events
+from .paginators import format_cursor, paginate, parse_cursor
+from .parse import index_post
+from .tasks import enqueue
+
+
+def render_feed(request, template_name, feed, context=None,
+                names=('page', 'paginator')):
+    """Лента потоком, если включён STREAMING_FEEDS, иначе обычный render.
+
+    feed() выполняет запросы ленты и возвращает значения names. При
+    потоковом рендере они ленивые: запросы идут, когда шаблон дойдёт до
+    блока content, то есть уже после отправки шапки страницы.
+    """
+
+    context = dict(context or {})
+    if settings.STREAMING_FEEDS:
+        context.update(lazy_context(feed, names))
+        return stream_render(request, template_name, context)
+    context.update(feed())
+    return render(request, template_name, context)
 
 
 def index(request):
     """Старотовая страница"""
 
-    post_list = Post.objects.all()
-    paginator = Paginator(post_list, 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
-    return render(
-        request,
-        'index.html',
-        {'page': page, 'paginator': paginator}
-    )
+    def feed():
+        post_list = shards.feed(Post.objects.select_related('author', 'group'))
+        paginator, page, _ = paginate(request, post_list)
+        return {'page': page, 'paginator': paginator}
+
+    return render_feed(request, 'index.html', feed)
 
 
 def group_posts(request, slug):
     """Сраница группы"""
 
-    group = get_object_or_404(Group, slug=slug)
-    post_list = group.posts.all()
-    paginator = Paginator(post_list, 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
-    return render(
-        request,
-        'group.html',
-        {'page': page, 'paginator': paginator, 'group': group}
-    )
+    group = groups.get_or_404(slug=slug)
+
+    def feed():
+        page_number = request.GET.get('page')
+        if page_number in (None, '1'):
+            paginator = group_first_page_paginator(group)
+            page = paginator.get_page(page_number)
+        else:
+            post_list = shards.feed(Post.objects.filter(group=group)
+                                    .select_related('author', 'group'))
+            paginator, page, _ = paginate(request, post_list)
+        return {'page': page, 'paginator': paginator}
+
+    return render_feed(request, 'group.html', feed, {'group': group})
+
+
+def group_stats(query):
+    """Счётчики групп с названием, содержащим query, активные выше"""
+
+    stats = GroupStats.objects.select_related('group').order_by(
+        F('last_post_at').desc(nulls_last=True), '-post_count', 'group_id')
+    if query:
+        stats = stats.filter(group__title__icontains=query)
+    return stats
+
+
+def group_list(request):
+    """Каталог групп"""
+
+    query = request.GET.get('q', '').strip()
+    paginator, page, _ = paginate(request, group_stats(query))
+    return render(request, 'groups.html',
+                  {'page': page, 'paginator': paginator, 'query': query})
+
+
+def group_search(request):
+    """Поиск групп для выбора группы в форме поста"""
+
+    query = request.GET.get('q', '').strip()
+    stats = group_stats(query)[:settings.GROUP_SEARCH_LIMIT]
+    return JsonResponse({'results': [
+        {'id': item.group_id, 'title': item.group.title,
+         'slug': item.group.slug, 'post_count': item.post_count}
+        for item in stats
+    ]})
+
+
+def tag_posts(request, name):
+    """Лента постов с тегом, страницы по ключу (дата, id) последнего поста"""
+
+    tag = get_object_or_404(Tag, name=name.lower())
+    post_tags = (tag.post_tags.select_related('post__author', 'post__group')
+                 .order_by('-pub_date', '-post_id'))
+    cursor = parse_cursor(request.GET.get('after'))
+    if cursor is not None:
+        pub_date, post_id = cursor
+        post_tags = post_tags.filter(
+            Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, post_id__lt=post_id)
+        )
+    items = list(post_tags[:settings.POSTS_PER_PAGE + 1])
+    posts = [item.post for item in items[:settings.POSTS_PER_PAGE]]
+    next_cursor = None
+    if len(items) > settings.POSTS_PER_PAGE:
+        next_cursor = format_cursor(posts[-1].pub_date, posts[-1].pk)
+    return render(request, 'tag.html', {'tag': tag, 'posts': posts,
+                                        'next_cursor': next_cursor})
 
 
 @login_required
+@rate_limit('new_post')
 def new_post(request):
     """Создание нового поста"""
 
     form = PostForm(request.POST or None, files=request.FILES or None)
     if form.is_valid():
         form.instance.author = request.user
-        form.save()
+        with transaction.atomic(using=shards.shard_for(request.user.pk)):
+            post = form.save()
+            mentioned = index_post(post)
+        notify_mentions(post, mentioned)
+        if post.image:
+            enqueue(generate_image_variants, post.pk, post._state.db)
         return redirect('index')
     return render(request, "new_post.html", {"form": form})
 
@@ -50,33 +144,50 @@ def new_post(request):
 def profile(request, username):
     """Страница профиля"""
 
-    author = get_object_or_404(User, username=username)
-    user_posts = author.posts.all()
-    count_posts = author.posts.count()
-    paginator = Paginator(user_posts, 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
-    count_following = author.follower.count()
-    count_follower = author.following.count()
-    return render(request, "posts/profile.html", {'posts': page,
-                                            'count_posts': count_posts,
-                                            'paginator': paginator,
-                                            'author': author,
-                                            'count_follower': count_follower,
-                                            'count_following': count_following
-                                                  })
+    author = users.get_or_404(username=username)
+
+    def feed():
+        user_posts = author.posts.select_related('author', 'group')
+        paginator, page, (count_following, count_follower) = paginate(
+            request, user_posts, author.follower.count, author.following.count
+        )
+        return {'posts': page,
+                'count_posts': paginator.count,
+                'paginator': paginator,
+                'count_follower': count_follower,
+                'count_following': count_following}
+
+    return render_feed(request, "posts/profile.html", feed,
+                       {'author': author},
+                       ('posts', 'count_posts', 'paginator',
+                        'count_follower', 'count_following'))
 
 
 def post_view(request, username, post_id):
     """Страница просмотра отдельного поста"""
 
-    user_post = get_object_or_404(Post, author__username=username, pk=post_id)
-    author = get_object_or_404(User, username=username)
-    count_posts = author.posts.count()
-    items = user_post.comments.all()
+    author = users.get_or_404(username=username)
+    if shards.enabled():
+        user_post = author.posts.filter(pk=post_id).first()
+    else:
+        user_post = post_cache.get(pk=post_id)
+    if user_post is None or user_post.author_id != author.pk:
+        user_post = get_archived_post_or_404(author, post_id)
+        comments = get_archived_comments(user_post)
+    else:
+        user_post.author = author
+        if user_post.group_id:
+            user_post.group = groups.get(pk=user_post.group_id)
+        comments = (Comment.objects.using(shards.shard_for(author.pk))
+                    .filter(post_id=post_id).select_related('author'))
+    (count_posts, count_following, count_follower,
+     items) = run_concurrently(
+        author.posts.count,
+        author.follower.count,
+        author.following.count,
+        lambda: evaluated(comments),
+    )
     form = CommentForm()
-    count_following = author.follower.count()
-    count_follower = author.following.count()
     return render(request, "posts/post.html", {'post': user_post,
                                          'count_posts': count_posts,
                                          'post_id': post_id,
@@ -93,33 +204,72 @@ def post_view(request, username, post_id):
 def post_edit(request, username, post_id):
     """Страница редактирования поста"""
 
-    post = get_object_or_404(Post, author__username=username, pk=post_id)
+    author = users.get_or_404(username=username)
+    post = get_object_or_404(author.posts, pk=post_id)
     if request.user != post.author:
         return redirect('post', username=username, post_id=post_id)
-    form = PostForm(request.POST or None, files=request.FILES or None, instance=post)
+    if request.method != 'POST':
+        form = PostForm(instance=post)
+        return render(request, "new_post.html", {"form": form, 'edit': True, 'post': post})
+    form = PostForm(request.POST, files=request.FILES or None, instance=post)
     if form.is_valid():
-        form.save()
-        return redirect('post', username=username, post_id=post_id)
-    post = Post.objects.filter(pk=post_id).get()
-    form = PostForm({'text': post})
+        if not form.has_changed():
+            return redirect('post', username=username, post_id=post_id)
+        if save_post_changes(form, request.POST.get('version')):
+            if 'group' in form.changed_data and form.initial.get('group'):
+                refresh_group_first_page(form.initial['group'])
+            if 'image' in form.changed_data and post.image:
+                enqueue(generate_image_variants, post.pk, post._state.db)
+            return redirect('post', username=username, post_id=post_id)
+        form.add_error(None, 'Пост изменили, пока вы его редактировали. '
+                             'Проверьте текст и сохраните ещё раз.')
+        post.version = Post.objects.using(post._state.db).values_list(
+            'version', flat=True).get(pk=post.pk)
     return render(request, "new_post.html", {"form": form, 'edit': True, 'post': post})
 
 
+def save_post_changes(form, version):
+    """Запись только изменённых полей, если пост не правили с version"""
+
+    fields = list(form.changed_data)
+    if 'image' in fields:
+        fields += ['image_width', 'image_height']
+    if 'text' in fields:
+        fields.append('text_html')
+    post = form.instance
+    with transaction.atomic(using=post._state.db):
+        current = Post.objects.using(post._state.db).filter(pk=post.pk)
+        if version is not None:
+            if not version.isdigit():
+                return False
+            current = current.filter(version=version)
+        if not current.update(version=F('version') + 1):
+            return False
+        form.save(commit=False).save(update_fields=fields)
+        if 'text' in fields:
+            notify_mentions(post, index_post(post))
+    return True
+
+
 @login_required()
+@rate_limit('comment')
 def add_comment(request, username, post_id):
     """Добавление комментария"""
 
-    post = get_object_or_404(Post, author__username=username, pk=post_id)
     author = get_object_or_404(User, username=username)
+    post = get_object_or_404(author.posts, pk=post_id)
     form = CommentForm(request.POST or None)
     count_posts = author.posts.count()
-    items = post.comments.all()
+    items = post.comments.select_related('author')
     count_following = author.follower.count()
     count_follower = author.following.count()
     if form.is_valid():
         form.instance.author = request.user
         form.instance.post = post
-        form.save()
+        # Счётчики поста и группы обновляет сигнал comment_created
+        with transaction.atomic(using=post._state.db):
+            form.save()
+        notify(post.author_id, Notification.COMMENT, request.user.pk, post.pk)
         return redirect('post', username=username, post_id=post_id)
     return render(request, "posts/post.html", {'post': post,
                                          'username': username,
@@ -138,32 +288,84 @@ def add_comment(request, username, post_id):
 def follow_index(request):
     """Страница постов из подписок"""
 
-    follower_post = Post.objects.filter(author__following__user=request.user)
-    paginator = Paginator(follower_post, 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
-    return render(request, 'posts/follow.html', {'page': page, 'paginator': paginator})
+    def feed():
+        if shards.enabled():
+            # JOIN с подписками из default в шарде невозможен
+            follower_post = shards.feed(
+                Post.objects.select_related('author', 'group'),
+                request.user.follower.values_list('author_id', flat=True))
+        else:
+            follower_post = (Post.objects
+                             .filter(author__following__user=request.user)
+                             .select_related('author', 'group'))
+        paginator, page, _ = paginate(request, follower_post)
+        return {'page': page, 'paginator': paginator}
+
+    return render_feed(request, 'posts/follow.html', feed)
 
 
 @login_required()
+@rate_limit('follow', methods=None)
 def profile_follow(request, username):
     """Функция создания подписки на пользователя"""
 
-    following = get_object_or_404(User, username=username)
+    following = users.get_or_404(username=username)
     if following != request.user:
-        Follow.objects.get_or_create(user=request.user, author=following)
+        _, created = Follow.objects.get_or_create(user=request.user,
+                                                  author=following)
+        if created:
+            notify(following.pk, Notification.FOLLOW, request.user.pk)
     return redirect('profile', username=username)
 
 
 @login_required()
 def profile_unfollow(request, username):
     """Функция отписки от пользователя"""
-    following = get_object_or_404(User, username=username)
+    following = users.get_or_404(username=username)
     if following != request.user:
         Follow.objects.filter(user=request.user, author=following).delete()
     return redirect('profile', username=username)
 
 
+def notify_mentions(post, user_ids):
+    for user_id in user_ids:
+        notify(user_id, Notification.MENTION, post.author_id, post.pk)
+
+
+@login_required()
+def notifications(request):
+    """Уведомления пользователя; показанные становятся прочитанными"""
+
+    items = request.user.notifications.select_related('actor')
+    if not shards.enabled():
+        items = items.select_related('post__author')
+    paginator, page, _ = paginate(request, items)
+    if shards.enabled():
+        shards.attach_posts(page)
+    for item in page:
+        item.text = describe(item)
+    mark_read(request.user.pk, [item.pk for item in page])
+    return render(request, 'posts/notifications.html',
+                  {'page': page, 'paginator': paginator})
+
+
+def live_events(request, **kwargs):
+    """Поток новых постов ленты или комментариев поста (SSE)"""
+
+    channel = channel_for(request.resolver_match.url_name, kwargs)
+    if not settings.LIVE_WSGI_STREAMS:
+        return HttpResponse(status=204)
+    last_id = parse_last_id(request.META.get('HTTP_LAST_EVENT_ID')
+                            or request.GET.get('last'))
+    response = StreamingHttpResponse(
+        stream_events(channel, last_id, settings.LIVE_POLL_TIMEOUT),
+        content_type='text/event-stream',
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
 def page_not_found(request, exception):
     return render(
         request,
@@ -0,0 +1,134 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from django.conf import settings
+from django.core.handlers.base import BaseHandler
+from django.db import close_old_connections
+from django.db.models import Count
+from django.test import RequestFactory
+from django.urls import reverse
+
+from . import shards
+from .images import generate_image_variants
+from .models import GroupStats, Post, User
+
+logger = logging.getLogger(__name__)
+
+
+def _first(querysets, top):
+    """Первые top строк из нескольких баз; строки начинаются с ключа"""
+
+    rows = [row for queryset in querysets for row in queryset[:top]]
+    return sorted(rows, reverse=True)[:top]
+
+
+def warm_urls(top):
+    """Лента, популярные группы, профили и посты"""
+
+    urls = [reverse('index')]
+    groups = (GroupStats.objects.order_by('-post_count')
+              .values_list('group__slug', flat=True)[:top])
+    urls += [reverse('group', kwargs={'slug': slug}) for slug in groups]
+    # Все посты автора лежат в одной базе, счётчики из разных баз
+    # не складываются
+    authors = _first([
+        Post.objects.using(alias).order_by().values('author_id')
+        .annotate(count=Count('pk')).order_by('-count')
+        .values_list('count', 'author_id')
+        for alias in shards.post_databases()
+    ], top)
+    names = User.objects.in_bulk([author_id for _, author_id in authors])
+    urls += [reverse('profile', kwargs={'username': names[author_id]})
+             for _, author_id in authors if author_id in names]
+    posts = _first([
+        Post.objects.using(alias)
+        .order_by('-comment_count', '-pub_date')
+        .values_list('comment_count', 'pub_date', 'author__username', 'pk')
+        for alias in shards.post_databases()
+    ], top)
+    urls += [reverse('post', kwargs={'username': username, 'post_id': pk})
+             for _, _, username, pk in posts]
+    return urls
+
+
+def warm_thumbnails(top):
+    """Посты с картинками, которые первыми попадут на страницы.
+
+    Возвращает [(id поста, база)].
+    """
+
+    recent, popular = [], []
+    for alias in shards.post_databases():
+        posts = Post.objects.using(alias).exclude(image='')
+        recent += [(pub_date, pk, alias) for pub_date, pk in posts.values_list(
+            'pub_date', 'pk')[:settings.POSTS_PER_PAGE]]
+        popular += [(count, pub_date, pk, alias)
+                    for count, pub_date, pk in posts.order_by(
+                        '-comment_count', '-pub_date').values_list(
+                        'comment_count', 'pub_date', 'pk')[:top]]
+    recent = sorted(recent, reverse=True)[:settings.POSTS_PER_PAGE]
+    popular = sorted(popular, reverse=True)[:top]
+    return list(dict.fromkeys([row[-2:] for row in recent]
+                              + [row[-2:] for row in popular]))
+
+
+def _timed(func, arg):
+    close_old_connections()
+    started = time.perf_counter()
+    try:
+        result = func(arg)
+    except Exception as error:
+        logger.exception('Прогрев %s завершился ошибкой', arg)
+        result = error
+    finally:
+        close_old_connections()
+    return arg, result, time.perf_counter() - started
+
+
+def _render(handler, url):
+    # Обработчик запросов без test.Client: тот на время запроса
+    # отключает close_old_connections от сигналов, а прогрев идёт в
+    # потоках рабочего процесса рядом с настоящими запросами
+    request = RequestFactory(SERVER_NAME=settings.WARM_CACHES_HOST).get(url)
+    response = handler.get_response(request)
+    response.close()
+    return response.status_code
+
+
+def warm_caches(top=None, workers=None, thumbnails=True):
+    """Прогрев кешей страниц и миниатюр.
+
+    Кеш LocMemCache у каждого процесса свой, поэтому страницы
+    прогреваются в том процессе, где вызвана функция. Миниатюры и
+    хранилище sorl общие для всех процессов.
+    Возвращает [(url или id поста, статус или ошибка, секунды)] и общее
+    время.
+    """
+
+    top = top or settings.WARM_CACHES_TOP
+    started = time.perf_counter()
+    handler = BaseHandler()
+    handler.load_middleware()
+    jobs = [(partial(_render, handler), url) for url in warm_urls(top)]
+    if thumbnails:
+        jobs += [(partial(generate_image_variants, using=alias), pk)
+                 for pk, alias in warm_thumbnails(top)]
+    with ThreadPoolExecutor(
+        max_workers=workers or settings.WARM_CACHES_WORKERS,
+        thread_name_prefix='yatube-warmup',
+    ) as executor:
+        report = list(executor.map(lambda job: _timed(*job), jobs))
+    return report, time.perf_counter() - started
+
+
+def warm_in_background():
+    """Прогрев после запуска сервера, не задерживающий старт"""
+
+    def run():
+        report, took = warm_caches()
+        logger.info('Кеши прогреты: %d задач за %.2f с', len(report), took)
+
+    threading.Thread(target=run, name='yatube-warmup', daemon=True).start()
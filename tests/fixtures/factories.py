@@ -0,0 +1,46 @@
+"""
+Фабрики тестовых объектов. Обязательные поля заполняются уникальными
+значениями, остальное можно передать именованными аргументами.
+"""
+
+import itertools
+
+_sequence = itertools.count(1)
+
+
+def make_user(**kwargs):
+    from django.contrib.auth import get_user_model
+
+    kwargs.setdefault('username', 'user{}'.format(next(_sequence)))
+    return get_user_model().objects.create_user(**kwargs)
+
+
+def make_group(**kwargs):
+    from posts.models import Group
+
+    number = next(_sequence)
+    kwargs.setdefault('title', 'Группа {}'.format(number))
+    kwargs.setdefault('slug', 'group-{}'.format(number))
+    return Group.objects.create(**kwargs)
+
+
+def make_post(**kwargs):
+    from posts.models import Post
+
+    if 'author' not in kwargs:
+        kwargs['author'] = make_user()
+    kwargs.setdefault('text', 'Пост {}'.format(next(_sequence)))
+    return Post.objects.create(**kwargs)
+
+
+def make_posts(count, **kwargs):
+    """Много постов одним запросом"""
+
+    from posts.models import Post
+
+    if 'author' not in kwargs:
+        kwargs['author'] = make_user()
+    return Post.objects.bulk_create(
+        Post(text='Пост {}'.format(next(_sequence)), **kwargs)
+        for _ in range(count)
+    )
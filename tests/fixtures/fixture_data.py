@@ -1,22 +1,21 @@
 import pytest
 import tempfile
 
+from .factories import make_group, make_post
+
 
 @pytest.fixture
 def post(user):
-    from posts.models import Post
     image = tempfile.NamedTemporaryFile(suffix=".jpg").name
-    return Post.objects.create(text='Тестовый пост 1', author=user, image=image)
+    return make_post(text='Тестовый пост 1', author=user, image=image)
 
 
 @pytest.fixture
 def group():
-    from posts.models import Group
-    return Group.objects.create(title='Тестовая группа 1', slug='test-link', description='Тестовое описание группы')
+    return make_group(title='Тестовая группа 1', slug='test-link', description='Тестовое описание группы')
 
 
 @pytest.fixture
 def post_with_group(user, group):
-    from posts.models import Post
     image = tempfile.NamedTemporaryFile(suffix=".jpg").name
-    return Post.objects.create(text='Тестовый пост 2', author=user, group=group, image=image)
+    return make_post(text='Тестовый пост 2', author=user, group=group, image=image)
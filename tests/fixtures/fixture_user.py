@@ -1,9 +1,11 @@
 import pytest
 
+from .factories import make_user
+
 
 @pytest.fixture
-def user(django_user_model):
-    return django_user_model.objects.create_user(username='TestUser', password='1234567')
+def user():
+    return make_user(username='TestUser', password='1234567')
 
 
 @pytest.fixture
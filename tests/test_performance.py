@@ -0,0 +1,178 @@
+"""
+Регрессии производительности страниц.
+
+Для каждого имени URL из posts/urls.py и users/urls.py на одном и том
+же наборе данных меряются число запросов к базе, время ответа и пик
+выделенной памяти. Результат сравнивается с tests/perf_baseline.json
+с допусками из того же файла. Число запросов проверяется всегда, время
+и память зависят от загрузки машины (например, pytest -n 4) и
+проверяются только с PERF_CHECK_TIMING=1 в отдельном прогоне:
+
+    PERF_CHECK_TIMING=1 pytest tests/test_performance.py -p no:xdist
+
+Обновить базовую линию:
+
+    PERF_UPDATE_BASELINE=1 pytest tests/test_performance.py -p no:xdist
+"""
+
+import json
+import os
+import time
+import tracemalloc
+
+import pytest
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+
+from .fixtures.factories import make_group, make_post, make_user
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'perf_baseline.json')
+UPDATE_BASELINE = os.environ.get('PERF_UPDATE_BASELINE') == '1'
+CHECK_TIMING = os.environ.get('PERF_CHECK_TIMING') == '1'
+TIMING_RUNS = 5
+
+# Имя URL -> функция, возвращающая kwargs для reverse по набору данных
+PAGES = {
+    'index': lambda data: {},
+    'live_index': lambda data: {},
+    'group_list': lambda data: {},
+    'group_search': lambda data: {},
+    'group': lambda data: {'slug': data['group'].slug},
+    'live_group': lambda data: {'slug': data['group'].slug},
+    'tag': lambda data: {'name': 'лето'},
+    'new_post': lambda data: {},
+    'follow_index': lambda data: {},
+    'notifications': lambda data: {},
+    'profile': lambda data: {'username': data['author'].username},
+    'post': lambda data: {'username': data['author'].username,
+                          'post_id': data['post'].pk},
+    'live_post': lambda data: {'username': data['author'].username,
+                               'post_id': data['post'].pk},
+    'post_edit': lambda data: {'username': data['author'].username,
+                               'post_id': data['post'].pk},
+    'add_comment': lambda data: {'username': data['author'].username,
+                                 'post_id': data['post'].pk},
+    'profile_follow': lambda data: {'username': data['author'].username},
+    'profile_unfollow': lambda data: {'username': data['author'].username},
+    'signup': lambda data: {},
+    'login': lambda data: {},
+}
+
+
+def load_baseline():
+    if not os.path.exists(BASELINE_PATH):
+        return {'tolerances': {}, 'pages': {}}
+    with open(BASELINE_PATH, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_baseline(name, result):
+    baseline = load_baseline()
+    baseline['pages'][name] = result
+    with open(BASELINE_PATH, 'w', encoding='utf-8') as f:
+        json.dump(baseline, f, indent=2, sort_keys=True, ensure_ascii=False)
+        f.write('\n')
+
+
+def seed():
+    """Один и тот же набор данных для каждого замера"""
+
+    author = make_user(username='perf_author')
+    reader = make_user(username='perf_reader', email='reader@example.com')
+    group = make_group(slug='perf-group')
+    posts = [make_post(author=author, group=group if i % 2 else None,
+                       text='пост {} #лето @perf_reader'.format(i))
+             for i in range(30)]
+    from posts.models import Comment, Follow
+    Comment.objects.bulk_create(
+        Comment(post=posts[-1], author=reader, text='комментарий {}'.format(i))
+        for i in range(20)
+    )
+    Follow.objects.create(user=reader, author=author)
+    return {'author': author, 'reader': reader, 'group': group,
+            'post': posts[-1]}
+
+
+def consume(response):
+    if response.streaming:
+        return b''.join(response.streaming_content)
+    return response.content
+
+
+def measure(client, url):
+    """Запросы, время (лучшее из TIMING_RUNS) и пик памяти в КБ"""
+
+    client.get(url)
+    with CaptureQueriesContext(connection) as queries:
+        consume(client.get(url))
+    # Журнал запросов очищается следующим запросом, считаем сразу
+    query_count = len(queries)
+    timings = []
+    for _ in range(TIMING_RUNS):
+        started = time.perf_counter()
+        response = client.get(url)
+        consume(response)
+        timings.append(time.perf_counter() - started)
+    tracemalloc.start()
+    try:
+        response = client.get(url)
+        consume(response)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        'queries': query_count,
+        'time_ms': round(min(timings) * 1000, 2),
+        'memory_kb': round(peak / 1024, 1),
+    }
+
+
+def regressions(result, expected, tolerances, timing=CHECK_TIMING):
+    problems = []
+    allowed = expected['queries'] + tolerances.get('queries', 0)
+    if result['queries'] > allowed:
+        problems.append('запросов {} вместо {}'.format(
+            result['queries'], expected['queries']))
+    if not timing:
+        return problems
+    allowed = (expected['time_ms'] * tolerances.get('time_ratio', 3)
+               + tolerances.get('time_slack_ms', 20))
+    if result['time_ms'] > allowed:
+        problems.append('время {} мс вместо {} мс'.format(
+            result['time_ms'], expected['time_ms']))
+    allowed = (expected['memory_kb'] * tolerances.get('memory_ratio', 1.5)
+               + tolerances.get('memory_slack_kb', 256))
+    if result['memory_kb'] > allowed:
+        problems.append('память {} КБ вместо {} КБ'.format(
+            result['memory_kb'], expected['memory_kb']))
+    return problems
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('name', sorted(PAGES))
+def test_page_performance(name, client, settings):
+    settings.LIVE_POLL_TIMEOUT = 0
+    settings.LIVE_WSGI_STREAMS = True
+    settings.RATE_LIMITS = {scope: (10 ** 6, 60)
+                            for scope in settings.RATE_LIMITS}
+    cache.clear()
+    data = seed()
+    client.force_login(data['author'] if name in ('post_edit', 'new_post')
+                       else data['reader'])
+    url = reverse(name, kwargs=PAGES[name](data))
+    result = measure(client, url)
+    if UPDATE_BASELINE:
+        save_baseline(name, result)
+        return
+    baseline = load_baseline()
+    expected = baseline['pages'].get(name)
+    assert expected is not None, (
+        'Нет базовой линии для {}; запустите с PERF_UPDATE_BASELINE=1'
+        .format(name))
+    problems = regressions(result, expected, baseline['tolerances'])
+    match = resolve(url)
+    view = '{}.{}'.format(match.func.__module__,
+                          getattr(match.func, '__name__', match.func))
+    assert not problems, '{} ({}): {}'.format(name, view, ', '.join(problems))
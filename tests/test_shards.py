@@ -0,0 +1,195 @@
+"""
+Шардирование постов по автору (posts/shards.py) на двух временных
+файлах SQLite.
+"""
+
+from datetime import timedelta
+
+import pytest
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.urls import reverse
+from django.utils import timezone
+
+from posts import shards, warmup
+from posts.models import Comment, Follow, Notification, Post, User
+
+from .fixtures.factories import make_group, make_user
+
+SHARDS = 2
+
+
+@pytest.fixture
+def shard_aliases(settings, tmp_path):
+    names = []
+    for number in range(SHARDS):
+        alias = 'shard{}'.format(number)
+        names.append(str(tmp_path / '{}.sqlite3'.format(alias)))
+        connections.databases[alias] = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': names[-1],
+        }
+        connections.ensure_defaults(alias)
+        connections.prepare_test_settings(alias)
+    settings.SHARD_DATABASES = names
+    cache.clear()
+    call_command('init_shards', verbosity=0)
+    yield shards.aliases()
+    for number in range(SHARDS):
+        alias = 'shard{}'.format(number)
+        connections[alias].close()
+        del connections.databases[alias]
+        if hasattr(connections._connections, alias):
+            delattr(connections._connections, alias)
+    shards._shard_for.cache_clear()
+    cache.clear()
+
+
+def authors_in_every_shard(aliases):
+    """Авторы, которых хеш разложил по всем шардам"""
+
+    authors = {}
+    while len(authors) < len(aliases):
+        author = make_user()
+        authors.setdefault(shards.shard_for(author.pk), author)
+    return [authors[alias] for alias in aliases]
+
+
+def save_post(author, minutes_ago, **kwargs):
+    post = Post(author=author, text='Пост {}'.format(minutes_ago), **kwargs)
+    post.save()
+    post.pub_date = timezone.now() - timedelta(minutes=minutes_ago)
+    Post.objects.using(post._state.db).filter(pk=post.pk).update(
+        pub_date=post.pub_date)
+    return post
+
+
+@pytest.mark.django_db(transaction=True)
+class TestShards:
+
+    def test_posts_stored_in_author_shard(self, shard_aliases):
+        for author in authors_in_every_shard(shard_aliases):
+            post = save_post(author, 0)
+            alias = shards.shard_for(author.pk)
+            assert post._state.db == alias
+            assert Post.objects.using(alias).filter(pk=post.pk).exists()
+            assert not (Post.objects.using(DEFAULT_DB_ALIAS)
+                        .filter(pk=post.pk).exists())
+
+    def test_shards_have_own_id_ranges(self, shard_aliases):
+        first, second = authors_in_every_shard(shard_aliases)
+        assert save_post(first, 0).pk >> shards.ID_BITS == 1
+        assert save_post(second, 0).pk >> shards.ID_BITS == 2
+
+    def test_users_and_groups_replicated(self, shard_aliases):
+        user = make_user()
+        group = make_group()
+        user.first_name = 'Имя'
+        user.save()
+        for alias in shard_aliases:
+            replica = User.objects.using(alias).get(pk=user.pk)
+            assert replica.first_name == 'Имя'
+            assert (type(group).objects.using(alias)
+                    .filter(slug=group.slug).exists())
+        user.delete()
+        for alias in shard_aliases:
+            assert not User.objects.using(alias).filter(pk=user.pk).exists()
+
+    def test_merged_feed_sorted_across_shards(self, shard_aliases, client,
+                                              settings):
+        settings.POSTS_PER_PAGE = 3
+        first, second = authors_in_every_shard(shard_aliases)
+        group = make_group()
+        posts = [save_post((first, second)[minutes % 2], minutes, group=group)
+                 for minutes in range(8)]
+        feed = shards.feed(Post.objects.all())
+        assert feed.count() == 8
+        assert [post.pk for post in feed[0:8]] == [post.pk for post in posts]
+        assert [post.pk for post in feed[3:6]] == [post.pk
+                                                   for post in posts[3:6]]
+        for url in (reverse('index'),
+                    reverse('group', kwargs={'slug': group.slug})):
+            response = client.get(url, {'page': 2})
+            assert response.context['paginator'].count == 8
+            assert ([post.pk for post in response.context['page']]
+                    == [post.pk for post in posts[3:6]])
+
+    def test_follow_feed_reads_followed_authors(self, shard_aliases, client):
+        first, second = authors_in_every_shard(shard_aliases)
+        reader = make_user()
+        Follow.objects.create(user=reader, author=second)
+        save_post(first, 1)
+        followed = save_post(second, 2)
+        client.force_login(reader)
+        response = client.get(reverse('follow_index'))
+        assert [post.pk for post in response.context['page']] == [followed.pk]
+        client.force_login(make_user())
+        response = client.get(reverse('follow_index'))
+        assert response.context['paginator'].count == 0
+
+    def test_post_page_and_comment(self, shard_aliases, client):
+        author = make_user()
+        post = save_post(author, 0)
+        client.force_login(make_user())
+        url = reverse('add_comment', kwargs={'username': author.username,
+                                             'post_id': post.pk})
+        assert client.post(url, {'text': 'Комментарий'}).status_code == 302
+        alias = shards.shard_for(author.pk)
+        assert Comment.objects.using(alias).filter(post_id=post.pk).exists()
+        assert Post.objects.using(alias).get(pk=post.pk).comment_count == 1
+        response = client.get(reverse('post', kwargs={
+            'username': author.username, 'post_id': post.pk}))
+        assert response.status_code == 200
+        assert response.context['post'].comment_count == 1
+
+    def test_rebalance_moves_posts_from_default(self, shard_aliases):
+        author = make_user()
+        commenter = make_user()
+        # Посты, созданные в default до шардирования
+        post = Post.objects.using(DEFAULT_DB_ALIAS).create(
+            author=author, text='Старый пост')
+        Comment.objects.using(DEFAULT_DB_ALIAS).create(
+            post=post, author=commenter, text='Ответ')
+        call_command('rebalance_shards', verbosity=0)
+        alias = shards.shard_for(author.pk)
+        assert not Post.objects.using(DEFAULT_DB_ALIAS).exists()
+        moved = Post.objects.using(alias).get(pk=post.pk)
+        assert moved.pub_date == post.pub_date
+        assert Comment.objects.using(alias).filter(post=moved).count() == 1
+        assert shards.misplaced_authors(DEFAULT_DB_ALIAS) == []
+
+    def test_unhinted_queries_need_using(self, shard_aliases):
+        author = make_user()
+        with pytest.raises(shards.ShardError):
+            Post.objects.create(author=author, text='Пост')
+        with pytest.raises(shards.ShardError):
+            Post.objects.count()
+        post = save_post(author, 0)
+        assert list(author.posts.all()) == [post]
+
+    def test_post_delete_removes_notifications(self, shard_aliases):
+        author = make_user()
+        post = save_post(author, 0)
+        Notification.objects.create(user=author, actor=make_user(),
+                                    kind=Notification.COMMENT, post_id=post.pk)
+        post.delete()
+        assert not Notification.objects.exists()
+
+    def test_admin_hides_sharded_models(self, shard_aliases, admin_client):
+        response = admin_client.get(reverse('admin:index'))
+        assert 'posts/post/' not in response.content.decode()
+        assert admin_client.get(
+            reverse('admin:posts_post_changelist')).status_code == 403
+        assert admin_client.get(
+            reverse('admin:posts_group_changelist')).status_code == 200
+
+    def test_warmup_reads_every_shard(self, shard_aliases):
+        first, second = authors_in_every_shard(shard_aliases)
+        posts = [save_post(first, 1), save_post(second, 2)]
+        urls = warmup.warm_urls(5)
+        for post in posts:
+            assert reverse('profile', kwargs={
+                'username': post.author.username}) in urls
+            assert reverse('post', kwargs={
+                'username': post.author.username, 'post_id': post.pk}) in urls
@@ -1,3 +1,26 @@
 from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.contrib.auth.admin import UserAdmin
 
-# Register your models here.
+from posts.archive import schedule_user_purge
+
+User = get_user_model()
+
+
+class PurgingUserAdmin(UserAdmin):
+    """Удаление пользователя фоновой задачей порциями, а не каскадом"""
+
+    def get_deleted_objects(self, objs, request):
+        # Полный список связанных объектов у активного автора огромен
+        return [str(obj) for obj in objs], {}, set(), []
+
+    def delete_model(self, request, obj):
+        schedule_user_purge(obj)
+
+    def delete_queryset(self, request, queryset):
+        for user in queryset:
+            schedule_user_purge(user)
+
+
+admin.site.unregister(User)
+admin.site.register(User, PurgingUserAdmin)
@@ -0,0 +1,63 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+
+from yatube.objectcache import ObjectCache
+
+
+class SessionUserCache(ObjectCache):
+    """Пользователи сессий без хеша пароля в кеше.
+
+    Вместо пароля хранятся хеш сессии (get_session_auth_hash) и признак
+    has_usable_password: их достаточно для проверки сессии и шаблонов
+    админки. Сам пароль остаётся отложенным полем и читается из базы,
+    только если к нему обращаются.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(get_user_model(), 'pk', exclude=('password',),
+                         **kwargs)
+        # Кортежи длиннее, чем у posts.cache.users с теми же полями
+        self.prefix += ':session'
+
+    def fetch(self, name, value):
+        user = self.model._default_manager.filter(**{name: value}).first()
+        if user is None:
+            return None
+        return (tuple(getattr(user, field) for field in self.fields)
+                + (user.get_session_auth_hash(), user.has_usable_password()))
+
+    def build(self, values):
+        user = super().build(values[:-2])
+        cached = dict(zip(('get_session_auth_hash', 'has_usable_password'),
+                          values[-2:]))
+
+        def from_cache(name):
+            def method():
+                # После set_password значение считается уже от нового пароля
+                if 'password' in user.get_deferred_fields():
+                    return cached[name]
+                return getattr(type(user), name)(user)
+            return method
+
+        for name in cached:
+            setattr(user, name, from_cache(name))
+        return user
+
+
+# Без кеша процесса: смена пароля должна сразу завершать сессии. Общий
+# для процессов кеш нужен и здесь (yatube/objectcache.py)
+users_by_pk = SessionUserCache(local=False,
+                               timeout=settings.USER_CACHE_TIMEOUT)
+
+
+class CachedModelBackend(ModelBackend):
+    """ModelBackend, который берёт пользователя сессии из кеша.
+
+    Запись сбрасывается при любом сохранении пользователя, в том числе
+    при смене пароля, поэтому проверка хеша сессии остаётся честной.
+    """
+
+    def get_user(self, user_id):
+        user = users_by_pk.get(pk=user_id)
+        return user if user and self.user_can_authenticate(user) else None
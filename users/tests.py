@@ -1,3 +1,173 @@
-from django.test import TestCase
+import os
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import PBKDF2PasswordHasher, make_password
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from tests.fixtures.factories import make_user
+from yatube.ratelimit import CacheBackend, SQLiteBackend, fired
+
+from .backends import users_by_pk
+
+User = get_user_model()
+
+
+class CachedSessionUserTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = make_user(username='dyson', password='old-password')
+
+    def test_user_loaded_from_cache(self):
+        self.client.force_login(self.user)
+        self.client.get(reverse('index'))
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('index'))
+        self.assertContains(response, 'Пользователь: dyson')
+
+    @override_settings(
+        SESSION_ENGINE='django.contrib.sessions.backends.signed_cookies')
+    def test_signed_cookie_session(self):
+        self.client.force_login(self.user)
+        self.client.get(reverse('index'))
+        with self.assertNumQueries(2):
+            self.client.get(reverse('index'))
+
+    def test_password_change_logs_out_other_sessions(self):
+        self.client.force_login(self.user)
+        self.client.get(reverse('index'))
+        self.user.set_password('new-password')
+        self.user.save()
+        response = self.client.get(reverse('new_post'))
+        self.assertRedirects(response,
+                             '/auth/login/?next=' + reverse('new_post'))
+
+    def test_password_hash_not_cached(self):
+        self.client.force_login(self.user)
+        self.client.get(reverse('index'))
+        cached = cache.get(users_by_pk.key('pk', self.user.pk))
+        self.assertIsNotNone(cached)
+        self.assertNotIn(self.user.password, cached)
+
+    def test_password_change_keeps_own_session(self):
+        self.client.force_login(self.user)
+        self.client.get(reverse('index'))
+        response = self.client.post(reverse('password_change'), {
+            'old_password': 'old-password',
+            'new_password1': 'Ahg7-new-password',
+            'new_password2': 'Ahg7-new-password',
+        })
+        self.assertEqual(response.status_code, 302)
+        response = self.client.get(reverse('new_post'))
+        self.assertEqual(response.status_code, 200)
+
+
+class PasswordHashingTests(TestCase):
+    @override_settings(
+        PASSWORD_HASHERS=['users.hashers.TunedPBKDF2PasswordHasher'],
+        PASSWORD_PBKDF2_ITERATIONS=1000)
+    def test_iterations_come_from_settings(self):
+        user = make_user(username='dyson', password='pass')
+        self.assertTrue(user.password.startswith('pbkdf2_sha256$1000$'))
+        self.assertTrue(user.check_password('pass'))
+
+    @override_settings(PASSWORD_PBKDF2_ITERATIONS=1000)
+    def test_other_iterations_verified_and_upgraded(self):
+        user = make_user(username='dyson')
+        user.password = make_password(
+            'pass', hasher=PBKDF2PasswordHasher())
+        user.save()
+        self.assertTrue(user.check_password('pass'))
+        self.assertTrue(user.password.startswith('pbkdf2_sha256$1000$'))
+
+    def test_common_password_rejected(self):
+        response = self.client.post(reverse('signup'), {
+            'username': 'dyson',
+            'password1': 'password123',
+            'password2': 'password123',
+        })
+        self.assertFormError(response, 'form', 'password2',
+                             'Введённый пароль слишком широко распространён.')
+
+
+# Период длиннее теста, чтобы корзина не успела наполниться
+LIMITS = {scope: (2, 10 ** 9)
+          for scope in ('signup', 'login', 'new_post', 'comment', 'follow')}
+
+
+@override_settings(RATE_LIMITS=LIMITS)
+class RateLimitTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_login_attempts_limited(self):
+        url = reverse('login')
+        for _ in range(2):
+            response = self.client.post(url, {'username': 'dyson',
+                                              'password': 'wrong'})
+            self.assertEqual(response.status_code, 200)
+        response = self.client.post(url, {'username': 'dyson',
+                                          'password': 'wrong'})
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response['Retry-After']), 0)
+        self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertEqual(fired()['login'], 1)
+        admin = User.objects.create_superuser('admin', 'a@a.ru', 'pass')
+        self.client.force_login(admin)
+        self.assertEqual(self.client.get(reverse('rate_limits')).json()[
+            'login'], 1)
+
+    def test_signup_attempts_limited(self):
+        url = reverse('signup')
+        for _ in range(2):
+            self.client.post(url, {'username': 'dyson'})
+        self.assertEqual(self.client.post(url, {}).status_code, 429)
+
+    def test_buckets_refill(self):
+        backends = [CacheBackend(), SQLiteBackend(':memory:')]
+        for backend in backends:
+            with mock.patch('yatube.ratelimit.now_ms', return_value=0):
+                self.assertEqual(backend.consume('bucket', 500, 1000), 0)
+                self.assertEqual(backend.consume('bucket', 500, 1000), 0)
+                self.assertEqual(backend.consume('bucket', 500, 1000), 500)
+                # Отклонённый запрос не отодвигает следующий
+                self.assertEqual(backend.consume('bucket', 500, 1000), 500)
+            with mock.patch('yatube.ratelimit.now_ms', return_value=500):
+                self.assertEqual(backend.consume('bucket', 500, 1000), 0)
+                self.assertEqual(backend.consume('bucket', 500, 1000), 500)
+            with mock.patch('yatube.ratelimit.now_ms', return_value=10000):
+                self.assertEqual(backend.consume('bucket', 500, 1000), 0)
+                self.assertEqual(backend.consume('bucket', 500, 1000), 0)
+
+    def test_cache_bucket_outlives_first_request(self):
+        # Запросы точно с разрешённой частотой держат корзину пустой
+        backend = CacheBackend()
+        for moment, allowed in ((0, True), (0, True), (5, True), (10, True),
+                                (11.5, False)):
+            with mock.patch('time.time', return_value=1000 + moment):
+                self.assertEqual(
+                    backend.consume('bucket', 5000, 10000) == 0, allowed)
+
+    def test_sqlite_prunes_full_buckets(self):
+        backend = SQLiteBackend(':memory:', prune_every=3)
+        with mock.patch('yatube.ratelimit.now_ms', return_value=0):
+            backend.consume('first', 500, 1000)
+            backend.consume('second', 500, 1000)
+        with mock.patch('yatube.ratelimit.now_ms', return_value=10000):
+            backend.consume('third', 500, 1000)
+        self.assertEqual(
+            backend.connection.execute('SELECT key FROM buckets').fetchall(),
+            [('third',)])
+
+    @override_settings(RATE_LIMIT_BACKEND='sqlite')
+    def test_sqlite_backend(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with override_settings(RATE_LIMIT_SQLITE_PATH=os.path.join(
+                    directory, 'ratelimit.sqlite3')):
+                url = reverse('signup')
+                for _ in range(2):
+                    self.client.post(url, {'username': 'dyson'})
+                self.assertEqual(self.client.post(url, {}).status_code, 429)
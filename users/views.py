@@ -1,9 +1,18 @@
+from django.contrib.auth import views as auth_views
 from django.views.generic import CreateView
 from django.urls import reverse_lazy
+from django.utils.decorators import method_decorator
+
+from yatube.ratelimit import rate_limit
+
 from .forms import CreationForm
 
 
+@method_decorator(rate_limit('signup'), name='dispatch')
 class SignUp(CreateView):
     form_class = CreationForm
     success_url = reverse_lazy("login")
     template_name = "users/signup.html"
+
+
+login = rate_limit('login')(auth_views.LoginView.as_view())
@@ -0,0 +1,145 @@
+"""
+ASGI config for yatube project.
+
+Django 2.2 не умеет обслуживать ASGI сам, поэтому HTTP-запросы
+выполняются WSGI-приложением в пуле потоков, а цикл событий остаётся
+свободным для медленных клиентов и долгих соединений. Тело ответа
+передаётся клиенту по частям по мере готовности, а потоки живых
+обновлений (posts.live) обслуживаются прямо в цикле событий.
+
+    uvicorn yatube.asgi:application
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+
+from django.conf import settings  # noqa: E402
+
+from yatube.wsgi import application as wsgi_application  # noqa: E402
+
+from posts.live import channel_from_path, sse_application  # noqa: E402
+
+
+def build_environ(scope, body):
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', ''),
+        'PATH_INFO': scope['path'],
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'REMOTE_ADDR': client[0],
+        'SERVER_PROTOCOL': 'HTTP/{}'.format(scope.get('http_version', '1.1')),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name == 'CONTENT_TYPE' or name == 'CONTENT_LENGTH':
+            key = name
+        else:
+            key = 'HTTP_' + name
+        if key in environ:
+            value = environ[key] + ',' + value
+        environ[key] = value
+    return environ
+
+
+class WsgiBridge:
+    def __init__(self, application, max_workers=None):
+        self.application = application
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers or settings.ASGI_THREADS,
+            thread_name_prefix='yatube-asgi',
+        )
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+        if scope['type'] != 'http':
+            raise ValueError('Неподдерживаемый тип соединения: {}'.format(
+                scope['type']))
+        loop = asyncio.get_running_loop()
+        if scope['method'] == 'GET' and scope['path'].endswith('/live/'):
+            # Поток SSE обслуживается в цикле событий без потока на клиента
+            channel = await loop.run_in_executor(
+                self.executor, channel_from_path, scope['path']
+            )
+            if channel is not None:
+                return await sse_application(scope, receive, send, channel)
+        # Большое тело уходит на диск, как загрузки файлов в Django
+        body = tempfile.SpooledTemporaryFile(
+            max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE)
+        try:
+            more_body = True
+            while more_body:
+                message = await receive()
+                if message['type'] == 'http.disconnect':
+                    return
+                body.write(message.get('body', b''))
+                more_body = message.get('more_body', False)
+            body.seek(0)
+            environ = build_environ(scope, body)
+            await loop.run_in_executor(
+                self.executor, self.run_wsgi, loop, environ, send
+            )
+        finally:
+            body.close()
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def run_wsgi(self, loop, environ, send):
+        """Выполнение WSGI-приложения в потоке пула"""
+
+        def send_sync(message):
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            response['status'] = int(status.split(' ', 1)[0])
+            response['headers'] = [
+                (name.lower().encode('latin-1'), value.encode('latin-1'))
+                for name, value in headers
+            ]
+
+        result = self.application(environ, start_response)
+        try:
+            started = False
+            for chunk in result:
+                if not chunk:
+                    continue
+                if not started:
+                    send_sync(dict(response, type='http.response.start'))
+                    started = True
+                send_sync({'type': 'http.response.body', 'body': chunk,
+                           'more_body': True})
+            if not started:
+                send_sync(dict(response, type='http.response.start'))
+            send_sync({'type': 'http.response.body', 'body': b''})
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+
+
+application = WsgiBridge(wsgi_application)
@@ -0,0 +1,104 @@
+"""
+WSGI-обёртка, которая отдаёт собранную статику из STATIC_ROOT.
+
+Файлы с хешем в имени отдаются с заголовком immutable, заранее сжатые
+копии .br/.gz выбираются по Accept-Encoding, а тело ответа передаётся
+через wsgi.file_wrapper, чтобы сервер мог использовать sendfile.
+"""
+
+import mimetypes
+import os
+import re
+from email.utils import formatdate
+from wsgiref.util import FileWrapper
+
+from django.conf import settings
+
+HASHED_NAME_RE = re.compile(r'\.[0-9a-f]{12}\.\w+$')
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+BLOCK_SIZE = 64 * 1024
+
+
+class StaticAsset:
+    def __init__(self, path, url):
+        self.path = path
+        stat = os.stat(path)
+        self.size = stat.st_size
+        self.last_modified = formatdate(stat.st_mtime, usegmt=True)
+        self.etag = '"{:x}-{:x}"'.format(int(stat.st_mtime), stat.st_size)
+        content_type, _ = mimetypes.guess_type(path)
+        self.content_type = content_type or 'application/octet-stream'
+        if HASHED_NAME_RE.search(url):
+            self.cache_control = (
+                'public, max-age={}, immutable'.format(
+                    settings.STATIC_ASSETS_MAX_AGE)
+            )
+        else:
+            self.cache_control = 'public, max-age=60'
+        self.encoded = {}
+        for encoding, suffix in ENCODINGS:
+            if os.path.isfile(path + suffix):
+                self.encoded[encoding] = (path + suffix,
+                                          os.path.getsize(path + suffix))
+
+    def select(self, accept_encoding):
+        accepted = {part.split(';')[0].strip()
+                    for part in accept_encoding.split(',')}
+        for encoding, variant in self.encoded.items():
+            if encoding in accepted:
+                return encoding, variant
+        return None, (self.path, self.size)
+
+
+class StaticAssetsApp:
+    def __init__(self, application, root=None, prefix=None):
+        self.application = application
+        self.root = os.path.realpath(root or settings.STATIC_ROOT)
+        self.prefix = prefix or settings.STATIC_URL
+        self.assets = {}
+
+    def find(self, url):
+        if url in self.assets:
+            return self.assets[url]
+        path = os.path.realpath(
+            os.path.join(self.root, url[len(self.prefix):])
+        )
+        asset = None
+        if path.startswith(self.root + os.sep) and os.path.isfile(path):
+            asset = StaticAsset(path, url)
+        # Неизменяемые файлы кешируем навсегда, прочие проверяем заново
+        if asset is not None and HASHED_NAME_RE.search(url):
+            self.assets[url] = asset
+        return asset
+
+    def __call__(self, environ, start_response):
+        url = environ.get('PATH_INFO', '')
+        method = environ.get('REQUEST_METHOD')
+        if not url.startswith(self.prefix) or method not in ('GET', 'HEAD'):
+            return self.application(environ, start_response)
+        asset = self.find(url)
+        if asset is None:
+            return self.application(environ, start_response)
+
+        headers = [
+            ('Cache-Control', asset.cache_control),
+            ('ETag', asset.etag),
+            ('Last-Modified', asset.last_modified),
+            ('Vary', 'Accept-Encoding'),
+        ]
+        if environ.get('HTTP_IF_NONE_MATCH') == asset.etag:
+            start_response('304 Not Modified', headers)
+            return []
+
+        encoding, (path, size) = asset.select(
+            environ.get('HTTP_ACCEPT_ENCODING', '')
+        )
+        headers.append(('Content-Type', asset.content_type))
+        headers.append(('Content-Length', str(size)))
+        if encoding:
+            headers.append(('Content-Encoding', encoding))
+        start_response('200 OK', headers)
+        if method == 'HEAD':
+            return []
+        file_wrapper = environ.get('wsgi.file_wrapper', FileWrapper)
+        return file_wrapper(open(path, 'rb'), BLOCK_SIZE)
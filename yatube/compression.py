@@ -0,0 +1,125 @@
+"""
+Сжатие ответов gzip или brotli по заголовку Accept-Encoding.
+
+Маленькие ответы, уже сжатые типы (картинки, архивы) и поток живых
+обновлений не сжимаются. Потоковые ответы сжимаются по частям: каждая
+часть сбрасывается клиенту сразу, чтобы не задерживать начало страницы.
+"""
+
+import gzip
+import re
+import zlib
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+STRONG_ETAG_RE = re.compile(r'^"')
+
+
+def accepted_encodings(header):
+    """Кодировки из Accept-Encoding с их весами q"""
+
+    weights = {}
+    for item in header.split(','):
+        name, *params = item.strip().split(';')
+        weight = 1.0
+        for param in params:
+            key, _, value = param.strip().partition('=')
+            if key == 'q':
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        if name:
+            weights[name.strip().lower()] = weight
+    return weights
+
+
+def choose_encoding(header):
+    weights = accepted_encodings(header)
+    candidates = ['br', 'gzip'] if brotli is not None else ['gzip']
+    best, best_weight = None, 0.0
+    for name in candidates:
+        weight = weights.get(name, weights.get('*', 0.0))
+        if weight > best_weight:
+            best, best_weight = name, weight
+    return best
+
+
+def compress(content, encoding):
+    if encoding == 'br':
+        return brotli.compress(content,
+                               quality=settings.COMPRESSION_BROTLI_QUALITY)
+    return gzip.compress(content, compresslevel=settings.COMPRESSION_GZIP_LEVEL,
+                         mtime=0)
+
+
+def compress_stream(chunks, encoding):
+    if encoding == 'br':
+        compressor = brotli.Compressor(
+            quality=settings.COMPRESSION_BROTLI_QUALITY)
+        process, flush = compressor.process, compressor.flush
+        finish = compressor.finish
+    else:
+        # wbits=31: заголовок и контрольная сумма формата gzip
+        compressor = zlib.compressobj(settings.COMPRESSION_GZIP_LEVEL,
+                                      zlib.DEFLATED, 31)
+        process, finish = compressor.compress, compressor.flush
+
+        def flush():
+            return compressor.flush(zlib.Z_SYNC_FLUSH)
+    for chunk in chunks:
+        if chunk:
+            yield process(chunk) + flush()
+    yield finish()
+
+
+def is_compressible(response):
+    if response.has_header('Content-Encoding'):
+        return False
+    if 'no-transform' in response.get('Cache-Control', ''):
+        return False
+    content_type = response.get('Content-Type', '').split(';')[0]
+    if content_type.strip().lower().startswith(
+            tuple(settings.COMPRESSION_EXCLUDE_TYPES)):
+        return False
+    if response.streaming:
+        return True
+    return len(response.content) >= settings.COMPRESSION_MIN_SIZE
+
+
+class CompressionMiddleware:
+    def __init__(self, get_response):
+        if not settings.COMPRESSION_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if not is_compressible(response):
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = choose_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding is None:
+            return response
+        if response.streaming:
+            response.streaming_content = compress_stream(
+                response.streaming_content, encoding)
+            del response['Content-Length']
+        else:
+            compressed = compress(response.content, encoding)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response['Content-Length'] = str(len(compressed))
+        if response.has_header('ETag'):
+            # Сжатое тело отличается побайтно, но не по смыслу
+            response['ETag'] = STRONG_ETAG_RE.sub('W/"', response['ETag'])
+        response['Content-Encoding'] = encoding
+        return response
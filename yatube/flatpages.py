@@ -0,0 +1,70 @@
+"""
+Статические страницы (django.contrib.flatpages) из кеша.
+
+Содержимое меняется редко, поэтому страница берётся из кеша, а не из
+базы, и для анонимов кешируется целиком вместе с HTML. Навигация
+зависит от пользователя, поэтому вошедшим страница рендерится заново из
+закешированного объекта. Любое изменение FlatPage меняет версию ключей
+(обработчики подключает PostsConfig.ready).
+"""
+
+import hashlib
+import time
+
+from django.conf import settings
+from django.contrib.flatpages.models import FlatPage
+from django.contrib.flatpages.views import render_flatpage
+from django.contrib.sites.shortcuts import get_current_site
+from django.core.cache import cache
+from django.http import Http404, HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+
+VERSION_KEY = 'flatpages:version'
+PAGE_KEY = 'flatpages:{}:{}:{}'
+HTML_KEY = 'flatpages:html:{}:{}:{}'
+
+
+def get_version():
+    return cache.get_or_set(VERSION_KEY, time.time(), None)
+
+
+def get_flatpage(url, site_id, version):
+    key = PAGE_KEY.format(version, site_id, url)
+    page = cache.get(key)
+    if page is None:
+        page = FlatPage.objects.filter(url=url, sites=site_id).first()
+        if page is None:
+            raise Http404('Страница не найдена')
+        cache.set(key, page, settings.FLATPAGE_CACHE_TIMEOUT)
+    return page
+
+
+def cached_flatpage(request, url):
+    """Статическая страница из кеша с заголовками для HTTP-кеширования"""
+
+    site_id = get_current_site(request).id
+    version = get_version()
+    anonymous = not request.user.is_authenticated
+    html_key = HTML_KEY.format(version, site_id, url)
+    content = cache.get(html_key) if anonymous else None
+    if content is None:
+        page = get_flatpage(url, site_id, version)
+        response = render_flatpage(request, page)
+        if (not anonymous or page.registration_required
+                or response.status_code != 200):
+            patch_cache_control(response, private=True)
+            return response
+        content = response.content
+        cache.set(html_key, content, settings.FLATPAGE_CACHE_TIMEOUT)
+    etag = '"{}"'.format(hashlib.md5(content).hexdigest())
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(content)
+    response['ETag'] = etag
+    patch_cache_control(response, public=True,
+                        max_age=settings.FLATPAGE_MAX_AGE)
+    return response
+
+
+def invalidate_flatpages(sender, **kwargs):
+    cache.set(VERSION_KEY, time.time(), None)
@@ -0,0 +1,184 @@
+"""
+Кеш объектов моделей по естественным ключам (slug, username, pk).
+
+Объект хранится как кортеж значений полей: в общем кеше Django и в
+небольшом кеше процесса (L1) с коротким сроком жизни. При чтении из
+кортежа собирается новый экземпляр без запроса к базе. Сохранение и
+удаление объекта сбрасывают его ключи, в том числе старые значения
+ключей, если они изменились.
+
+Общий кеш — CACHES['default']. С LocMemCache из настроек по умолчанию
+он свой у каждого процесса, и сброс виден только процессу, сохранившему
+объект; нескольким процессам нужен общий бэкенд (memcached, redis).
+Поля из exclude в кеш не попадают и дочитываются из базы при обращении.
+"""
+
+import hashlib
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.http import Http404, JsonResponse
+
+_registry = []
+
+
+class ObjectCache:
+    def __init__(self, model, *keys, timeout=None, local=True, exclude=()):
+        self.model = model
+        self.keys = keys
+        self.timeout = timeout
+        self.local = local
+        self.fields = [field.attname for field in model._meta.concrete_fields
+                       if field.attname not in exclude]
+        # Ключи зависят от набора полей, чтобы после миграции не читать
+        # кортежи старого формата
+        schema = hashlib.md5(' '.join(self.fields).encode()).hexdigest()[:8]
+        self.prefix = 'obj:{}:{}'.format(model._meta.label_lower, schema)
+        self.name = '{}({})'.format(model._meta.label_lower, ', '.join(keys))
+        self.stats = Counter()
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+        uid = 'objectcache:' + self.name
+        pre_save.connect(self._remember_keys, sender=model,
+                         dispatch_uid=uid, weak=False)
+        post_save.connect(self._changed, sender=model,
+                          dispatch_uid=uid, weak=False)
+        post_delete.connect(self._changed, sender=model,
+                            dispatch_uid=uid, weak=False)
+        _registry.append(self)
+
+    def key(self, name, value):
+        return '{}:{}:{}'.format(self.prefix, name, value)
+
+    def _attname(self, name):
+        return self.model._meta.pk.attname if name == 'pk' else name
+
+    def _local_get(self, key):
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._local[key]
+                return None
+            self._local.move_to_end(key)
+            return entry[1]
+
+    def _local_set(self, key, values):
+        with self._lock:
+            self._local[key] = (
+                time.monotonic() + settings.OBJECT_CACHE_LOCAL_TIMEOUT, values)
+            self._local.move_to_end(key)
+            while len(self._local) > settings.OBJECT_CACHE_LOCAL_SIZE:
+                self._local.popitem(last=False)
+
+    def get(self, **lookup):
+        """Объект по одному из ключей кеша или None"""
+
+        (name, value), = lookup.items()
+        key = self.key(name, value)
+        values = self._local_get(key) if self.local else None
+        if values is not None:
+            self.stats['local_hits'] += 1
+        else:
+            values = cache.get(key)
+            if values is not None:
+                self.stats['hits'] += 1
+            else:
+                self.stats['misses'] += 1
+                values = self.fetch(name, value)
+                if values is None:
+                    return None
+                cache.set_many({self.key(other, values[
+                    self.fields.index(self._attname(other))]): values
+                    for other in self.keys},
+                    self.timeout or settings.OBJECT_CACHE_TIMEOUT)
+            if self.local:
+                self._local_set(key, values)
+        return self.build(values)
+
+    def fetch(self, name, value):
+        """Кортеж для кеша из базы или None"""
+
+        return (self.model._default_manager.filter(**{name: value})
+                .values_list(*self.fields).first())
+
+    def build(self, values):
+        return self.model.from_db('default', self.fields, values)
+
+    def get_or_404(self, **lookup):
+        obj = self.get(**lookup)
+        if obj is None:
+            raise Http404('{} не найден'.format(
+                self.model._meta.verbose_name))
+        return obj
+
+    def forget(self, name, *values):
+        keys = [self.key(name, value) for value in values]
+        if self.local:
+            with self._lock:
+                for key in keys:
+                    self._local.pop(key, None)
+        cache.delete_many(keys)
+
+    def invalidate(self, instance, stored=None):
+        self.stats['invalidations'] += 1
+        stale = self._stale_keys(instance, stored)
+        self._forget_all(stale)
+        return stale
+
+    def _stale_keys(self, instance, stored):
+        stale = []
+        for name in self.keys:
+            attname = self._attname(name)
+            values = {getattr(instance, attname)}
+            if stored:
+                values.add(stored.get(attname))
+            stale.append((name, [value for value in values
+                                 if value is not None]))
+        return stale
+
+    def _forget_all(self, stale):
+        for name, values in stale:
+            self.forget(name, *values)
+
+    def _remember_keys(self, sender, instance, update_fields=None,
+                       **kwargs):
+        attnames = [self._attname(name) for name in self.keys
+                    if name != 'pk']
+        if update_fields is not None:
+            attnames = [name for name in attnames if name in update_fields]
+        stored = None
+        if instance.pk is not None and attnames:
+            stored = (self.model._default_manager.filter(pk=instance.pk)
+                      .values(*attnames).first())
+        # Модель может быть в нескольких кешах, у каждого свои старые ключи
+        instance.__dict__.setdefault('_objectcache_stored', {})[
+            self.name] = stored
+
+    def _changed(self, sender, instance, using, **kwargs):
+        stored = instance.__dict__.pop('_objectcache_stored', {})
+        stale = self.invalidate(instance, stored.pop(self.name, None))
+        # Пока транзакция не зафиксирована, параллельный промах может
+        # вернуть в кеш старую строку, поэтому ключи сбрасываются ещё раз
+        # после фиксации
+        transaction.on_commit(lambda: self._forget_all(stale), using=using)
+        if stored:
+            instance._objectcache_stored = stored
+
+
+def stats():
+    """Попадания и промахи всех кешей объектов в этом процессе"""
+
+    return {item.name: dict(item.stats) for item in _registry}
+
+
+@staff_member_required
+def stats_view(request):
+    return JsonResponse(stats(), json_dumps_params={'ensure_ascii': False})
@@ -0,0 +1,282 @@
+"""
+Профилирование отдельных запросов в рабочем окружении.
+
+Если включён PROFILING, middleware профилирует запрос с заголовком
+X-Profile, подписанным SECRET_KEY (manage.py profiles --token), и
+случайные запросы с вероятностью PROFILING_SAMPLE_RATE. Для запроса
+сохраняются статистика cProfile (.prof, открывается pstats и snakeviz),
+снимок tracemalloc (.memory, tracemalloc.Snapshot.load) и свёрнутые
+стеки для flamegraph (.folded) вместе с именем представления в
+PROFILING_DIR. Номер профиля приходит в заголовке ответа X-Profile-Id.
+
+В процессе профилируется не больше одного запроса за раз: tracemalloc
+общий для процесса. Содержимое потоковых ответов формируется после
+выхода из middleware и в профиль не попадает. Выключенное
+профилирование не ставит middleware в цепочку.
+
+    python manage.py profiles --view post --collapsed post.folded
+    flamegraph.pl post.folded > post.svg
+"""
+
+import cProfile
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core import signing
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import FileResponse, Http404, JsonResponse
+
+HEADER = 'HTTP_X_PROFILE'
+SALT = 'yatube.profiling'
+TOKEN_VALUE = 'profile'
+PROFILE_ID = re.compile(r'^[\w.-]+$')
+KINDS = {'prof': '.prof', 'memory': '.memory', 'folded': '.folded'}
+
+_lock = threading.Lock()
+
+
+def make_token():
+    """Значение заголовка X-Profile, действует PROFILING_TOKEN_MAX_AGE"""
+
+    return signing.TimestampSigner(salt=SALT).sign(TOKEN_VALUE)
+
+
+def valid_token(value):
+    try:
+        return signing.TimestampSigner(salt=SALT).unsign(
+            value, max_age=settings.PROFILING_TOKEN_MAX_AGE) == TOKEN_VALUE
+    except signing.BadSignature:
+        return False
+
+
+def wanted(request):
+    value = request.META.get(HEADER)
+    if value is not None:
+        return valid_token(value)
+    rate = settings.PROFILING_SAMPLE_RATE
+    return bool(rate) and random.random() < rate
+
+
+def path_for(profile_id, suffix):
+    return os.path.join(settings.PROFILING_DIR, profile_id + suffix)
+
+
+def top_allocations(snapshot, limit):
+    return [{'place': '{}:{}'.format(stat.traceback[0].filename,
+                                     stat.traceback[0].lineno),
+             'size': stat.size, 'count': stat.count}
+            for stat in snapshot.statistics('lineno')[:limit]]
+
+
+def save(request, response, profiler, stacks, snapshot, peak, duration):
+    match = request.resolver_match
+    view = match.view_name if match else None
+    profile_id = '{}-{}-{}'.format(
+        time.strftime('%Y%m%d-%H%M%S'),
+        re.sub(r'[^\w.-]', '_', view or 'unknown'), uuid.uuid4().hex[:8])
+    os.makedirs(settings.PROFILING_DIR, exist_ok=True)
+    profiler.dump_stats(path_for(profile_id, KINDS['prof']))
+    with open(path_for(profile_id, KINDS['folded']), 'w') as f:
+        f.writelines('{} {}\n'.format(stack, weight)
+                     for stack, weight in sorted(stacks.items()))
+    meta = {
+        'id': profile_id,
+        'time': time.time(),
+        'view': view,
+        'function': match._func_path if match else None,
+        'method': request.method,
+        'path': request.path,
+        'status': response.status_code,
+        'duration': duration,
+        'memory_peak': peak,
+        'memory_top': None,
+    }
+    if snapshot is not None:
+        snapshot.dump(path_for(profile_id, KINDS['memory']))
+        meta['memory_top'] = top_allocations(snapshot, 10)
+    with open(path_for(profile_id, '.json'), 'w') as f:
+        json.dump(meta, f, ensure_ascii=False)
+    prune()
+    return profile_id
+
+
+def entries(view=None):
+    """Описания сохранённых профилей, новые первыми"""
+
+    try:
+        names = os.listdir(settings.PROFILING_DIR)
+    except FileNotFoundError:
+        return []
+    found = []
+    for name in names:
+        if not name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(settings.PROFILING_DIR, name)) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if view is None or meta['view'] == view:
+            found.append(meta)
+    return sorted(found, key=lambda meta: meta['time'], reverse=True)
+
+
+def remove(profile_id):
+    for suffix in ('.json',) + tuple(KINDS.values()):
+        try:
+            os.remove(path_for(profile_id, suffix))
+        except FileNotFoundError:
+            pass
+
+
+def prune():
+    for meta in entries()[settings.PROFILING_MAX_PROFILES:]:
+        remove(meta['id'])
+
+
+def clear():
+    for meta in entries():
+        remove(meta['id'])
+
+
+def frame_name(code):
+    filename = code.co_filename
+    if filename.startswith(settings.BASE_DIR):
+        filename = os.path.relpath(filename, settings.BASE_DIR)
+    elif 'site-packages' + os.sep in filename:
+        filename = filename.split('site-packages' + os.sep, 1)[1]
+    return re.sub(r'[;\s]', '_', '{}:{}:{}'.format(
+        filename, code.co_firstlineno, code.co_name))
+
+
+class StackSampler(threading.Thread):
+    """Стеки потока запроса раз в PROFILING_STACK_INTERVAL секунд.
+
+    cProfile хранит только пары вызывающий — вызываемый, а цепочка
+    middleware Django вызывает одну и ту же функцию рекурсивно, поэтому
+    стеки для flamegraph снимаются отдельно. Вес стека — время между
+    снимками в микросекундах.
+    """
+
+    def __init__(self, thread_id, stop_code):
+        super().__init__(name='yatube-profiling', daemon=True)
+        self.thread_id = thread_id
+        self.stop_code = stop_code
+        self.stacks = {}
+        self.finished = threading.Event()
+
+    def run(self):
+        last = time.perf_counter()
+        while not self.finished.wait(settings.PROFILING_STACK_INTERVAL):
+            frame = sys._current_frames().get(self.thread_id)
+            now = time.perf_counter()
+            stack = []
+            while frame is not None and frame.f_code is not self.stop_code:
+                stack.append(frame_name(frame.f_code))
+                frame = frame.f_back
+            if frame is not None and stack:
+                key = ';'.join(reversed(stack))
+                self.stacks[key] = (self.stacks.get(key, 0)
+                                    + int((now - last) * 1e6))
+            last = now
+
+    def stop(self):
+        self.finished.set()
+        self.join()
+        return self.stacks
+
+
+def read_stacks(path):
+    with open(path) as f:
+        for line in f:
+            stack, weight = line.rsplit(' ', 1)
+            yield stack, int(weight)
+
+
+def aggregate_stacks(metas):
+    """Свёрнутые стеки нескольких профилей, корень — имя представления"""
+
+    weights = {}
+    for meta in metas:
+        path = path_for(meta['id'], KINDS['folded'])
+        if not os.path.exists(path):
+            continue
+        for stack, weight in read_stacks(path):
+            stack = '{};{}'.format(meta['view'] or 'unknown', stack)
+            weights[stack] = weights.get(stack, 0) + weight
+    return ''.join('{} {}\n'.format(stack, weight)
+                   for stack, weight in sorted(weights.items()))
+
+
+class ProfilingMiddleware:
+    def __init__(self, get_response):
+        if not settings.PROFILING:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not wanted(request) or not _lock.acquire(blocking=False):
+            return self.get_response(request)
+        try:
+            return self.profile(request)
+        finally:
+            _lock.release()
+
+    def profile(self, request):
+        memory = settings.PROFILING_MEMORY and not tracemalloc.is_tracing()
+        if memory:
+            tracemalloc.start(settings.PROFILING_MEMORY_FRAMES)
+        profiler = cProfile.Profile()
+        sampler = StackSampler(threading.get_ident(),
+                               ProfilingMiddleware.profile.__code__)
+        start = time.perf_counter()
+        try:
+            sampler.start()
+            profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+                stacks = sampler.stop()
+            duration = (time.perf_counter() - start) * 1000
+            snapshot = peak = None
+            if memory:
+                snapshot = tracemalloc.take_snapshot().filter_traces([
+                    tracemalloc.Filter(False, tracemalloc.__file__),
+                    tracemalloc.Filter(False, __file__),
+                ])
+                peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            if memory:
+                tracemalloc.stop()
+        response['X-Profile-Id'] = save(request, response, profiler, stacks,
+                                        snapshot, peak, duration)
+        return response
+
+
+@staff_member_required
+def list_view(request):
+    return JsonResponse({'profiles': entries(request.GET.get('view'))},
+                        json_dumps_params={'ensure_ascii': False})
+
+
+@staff_member_required
+def download_view(request, profile_id, kind):
+    if not PROFILE_ID.match(profile_id):
+        raise Http404
+    if kind not in KINDS:
+        raise Http404
+    path = path_for(profile_id, KINDS[kind])
+    if not os.path.exists(path):
+        raise Http404
+    return FileResponse(open(path, 'rb'), as_attachment=True,
+                        filename=profile_id + KINDS[kind])
@@ -0,0 +1,170 @@
+"""
+Ограничение частоты запросов на запись: корзина токенов на пользователя
+(для анонимов — на IP-адрес).
+
+Корзина хранится одним числом — моментом, когда она снова станет
+полной (алгоритм GCRA). Каждый запрос сдвигает этот момент на
+period / limit; запрос отклоняется, если момент ушёл дальше, чем на
+period, вперёд. Проверка разрешённого запроса стоит incr и touch в
+общем кеше или одного UPSERT в SQLite. Полная корзина ничем не
+отличается от отсутствующей, поэтому ключ в кеше живёт, пока момент не
+наступит, а строки SQLite с прошедшим моментом периодически удаляются.
+"""
+
+import itertools
+
+import logging
+import math
+import sqlite3
+import threading
+import time
+from functools import lru_cache, wraps
+
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.cache import cache
+from django.http import HttpResponse, JsonResponse
+
+logger = logging.getLogger(__name__)
+
+BUCKET_KEY = 'ratelimit:{}:{}'
+FIRED_KEY = 'ratelimit:fired:{}'
+
+
+def now_ms():
+    return int(time.time() * 1000)
+
+
+class CacheBackend:
+    """Корзины в общем кеше Django, атомарность даёт incr"""
+
+    def consume(self, key, interval, period):
+        """0, если запрос разрешён, иначе сколько мс ждать"""
+
+        now = now_ms()
+        try:
+            tat = cache.incr(key, interval)
+        except ValueError:
+            if cache.add(key, now + interval, period // 1000 + 1):
+                return 0
+            tat = cache.incr(key, interval)
+        if tat - interval < now:
+            # Корзина успела наполниться, отсчёт начинается заново
+            cache.set(key, now + interval, period // 1000 + 1)
+            return 0
+        if tat - now <= period:
+            # incr не продлевает срок ключа: без touch он истёк бы через
+            # period после первого запроса и корзина опустела бы раньше
+            cache.touch(key, (tat - now) // 1000 + 1)
+            return 0
+        # Отклонённый запрос токен не тратит
+        cache.set(key, tat - interval, period // 1000 + 1)
+        return tat - period - now
+
+
+class SQLiteBackend:
+    """Корзины в отдельном файле SQLite, общем для процессов одной машины"""
+
+    def __init__(self, path, prune_every=1000):
+        self.path = path
+        self.local = threading.local()
+        self.prune_every = prune_every
+        self.calls = itertools.count(1)
+
+    @property
+    def connection(self):
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5,
+                                         isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('CREATE TABLE IF NOT EXISTS buckets '
+                               '(key TEXT PRIMARY KEY, tat INTEGER NOT NULL)')
+            self.local.connection = connection
+        return connection
+
+    def consume(self, key, interval, period):
+        now = now_ms()
+        if next(self.calls) % self.prune_every == 0:
+            self.prune(now)
+        row = self.connection.execute(
+            'INSERT INTO buckets (key, tat) VALUES (:key, :now + :interval) '
+            'ON CONFLICT (key) DO UPDATE '
+            'SET tat = max(tat, :now) + :interval '
+            'WHERE max(tat, :now) + :interval - :now <= :period '
+            'RETURNING tat',
+            {'key': key, 'now': now, 'interval': interval, 'period': period},
+        ).fetchone()
+        if row is not None:
+            return 0
+        tat, = self.connection.execute(
+            'SELECT tat FROM buckets WHERE key = ?', (key,)).fetchone()
+        return tat + interval - period - now
+
+    def prune(self, now):
+        """Удаление полных корзин, иначе таблица растёт с каждым клиентом"""
+
+        self.connection.execute('DELETE FROM buckets WHERE tat < ?', (now,))
+
+
+@lru_cache()
+def get_backend(name, path):
+    if name == 'sqlite':
+        return SQLiteBackend(path)
+    return CacheBackend()
+
+
+def client_key(request):
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return 'user:{}'.format(user.pk)
+    return 'ip:{}'.format(request.META.get('REMOTE_ADDR', ''))
+
+
+def check(scope, request):
+    """0, если запрос укладывается в лимит scope, иначе секунды до повтора"""
+
+    limit, period = settings.RATE_LIMITS[scope]
+    backend = get_backend(settings.RATE_LIMIT_BACKEND,
+                          settings.RATE_LIMIT_SQLITE_PATH)
+    wait = backend.consume(BUCKET_KEY.format(scope, client_key(request)),
+                           period * 1000 // limit, period * 1000)
+    if not wait:
+        return 0
+    if not cache.add(FIRED_KEY.format(scope), 1, None):
+        cache.incr(FIRED_KEY.format(scope))
+    logger.info('Лимит %s сработал для %s', scope, client_key(request))
+    return max(1, math.ceil(wait / 1000))
+
+
+def fired():
+    """Сколько раз срабатывал каждый лимит (по всем процессам)"""
+
+    counts = cache.get_many([FIRED_KEY.format(scope)
+                             for scope in settings.RATE_LIMITS])
+    return {scope: counts.get(FIRED_KEY.format(scope), 0)
+            for scope in settings.RATE_LIMITS}
+
+
+@staff_member_required
+def fired_view(request):
+    return JsonResponse(fired())
+
+
+def rate_limit(scope, methods=('POST',)):
+    """Ответ 429 на запросы к представлению сверх лимита scope"""
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if methods is None or request.method in methods:
+                retry_after = check(scope, request)
+                if retry_after:
+                    response = HttpResponse(
+                        'Слишком много запросов, попробуйте позже.',
+                        status=429)
+                    response['Retry-After'] = retry_after
+                    return response
+            return view(request, *args, **kwargs)
+        return wrapper
+    return decorator
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
 import os
+import tempfile
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -52,6 +53,9 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'yatube.profiling.ProfilingMiddleware',
+    'yatube.compression.CompressionMiddleware',
+    'yatube.slowqueries.SlowQueryMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -75,6 +79,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'posts.context_processors.notifications',
             ],
         },
     },
@@ -93,6 +98,33 @@ DATABASES = {
     }
 }
 
+# Архив старых постов (posts/archive.py). Если задан ARCHIVE_DATABASE,
+# архивные таблицы живут в отдельном файле SQLite:
+#     python manage.py migrate --database archive
+ARCHIVE_DATABASE = None
+if ARCHIVE_DATABASE:
+    DATABASES['archive'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ARCHIVE_DATABASE,
+    }
+# Шардирование постов по автору (posts/shards.py). Каждый файл из
+# SHARD_DATABASES становится базой 'shard0', 'shard1', ...:
+#     python manage.py init_shards
+#     python manage.py rebalance_shards
+SHARD_DATABASES = []
+for number, name in enumerate(SHARD_DATABASES):
+    DATABASES['shard{}'.format(number)] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': name,
+    }
+SHARD_BATCH_SIZE = 1000
+DATABASE_ROUTERS = ['posts.routers.ArchiveRouter', 'posts.routers.ShardRouter']
+ARCHIVE_AFTER_DAYS = 2 * 365
+ARCHIVE_BATCH_SIZE = 500
+
+# Строк за одно чтение и одну вставку в export_site / import_site
+TRANSFER_BATCH_SIZE = 2000
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -112,6 +144,36 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Хеширование паролей: 'pbkdf2' с PASSWORD_PBKDF2_ITERATIONS итераций
+# или 'argon2' (нужен пакет argon2-cffi). Остальные хешеры нужны, чтобы
+# проверять уже сохранённые пароли; при входе они пересчитываются.
+# Хеши pbkdf2_sha256 с любым числом итераций проверяет TunedPBKDF2.
+PASSWORD_HASHING = 'pbkdf2'
+PASSWORD_PBKDF2_ITERATIONS = 150000
+PASSWORD_HASHERS = [
+    'users.hashers.TunedPBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+]
+if PASSWORD_HASHING == 'argon2':
+    PASSWORD_HASHERS.insert(
+        0, 'django.contrib.auth.hashers.Argon2PasswordHasher')
+
+# Ограничение частоты запросов на запись (yatube/ratelimit.py):
+# (число запросов, период в секундах). Лимит считается на пользователя,
+# для анонимов — на IP-адрес. Хранилище: 'cache' (общий кеш) или
+# 'sqlite' (файл RATE_LIMIT_SQLITE_PATH, общий для процессов машины)
+RATE_LIMITS = {
+    'signup': (5, 60 * 60),
+    'login': (10, 60),
+    'new_post': (10, 60),
+    'comment': (20, 60),
+    'follow': (30, 60),
+}
+RATE_LIMIT_BACKEND = 'cache'
+RATE_LIMIT_SQLITE_PATH = os.path.join(BASE_DIR, 'ratelimit.sqlite3')
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/2.2/topics/i18n/
@@ -134,15 +196,46 @@ STATIC_URL = '/static/'
 
 STATIC_ROOT = os.path.join(BASE_DIR, "static")
 
+# collectstatic добавляет хеш в имена и создаёт сжатые копии .gz/.br,
+# в продакшене их отдаёт yatube.assets.StaticAssetsApp из wsgi.py
+STATICFILES_STORAGE = 'yatube.storage.CompressedManifestStaticFilesStorage'
+STATIC_ASSETS_MAX_AGE = 365 * 24 * 60 * 60
+
 MEDIA_URL = '/media/'
 
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Загрузка изображений: файл пишется на диск частями, а не в память
+FILE_UPLOAD_HANDLERS = [
+    'posts.uploads.LimitedTemporaryFileUploadHandler',
+]
+POST_IMAGE_MAX_UPLOAD_SIZE = 10 * 1024 * 1024
+POST_IMAGE_MAX_PIXELS = 40 * 1000 * 1000
+POST_IMAGE_MAX_SIZE = (1920, 1920)
+POST_IMAGE_QUALITY = 85
+
+# Фоновые задачи (posts.tasks); в режиме EAGER выполняются сразу
+TASKS_ALWAYS_EAGER = False
+TASK_WORKERS = 2
+
 # Login
 LOGIN_URL = "/auth/login/"
 LOGIN_REDIRECT_URL = "index"
 # LOGOUT_REDIRECT_URL = "index"
 
+# Хранение сессий: 'cached_db' (кеш с записью в базу) или
+# 'signed_cookies' (сессия целиком в подписанной cookie, без базы)
+SESSION_MODE = 'cached_db'
+SESSION_ENGINE = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
+}[SESSION_MODE]
+
+# Пользователь текущей сессии берётся из кеша (users/backends.py)
+AUTHENTICATION_BACKENDS = ['users.backends.CachedModelBackend']
+USER_CACHE_TIMEOUT = 60 * 60
+
 EMAIL_BACKEND = 'django.core.mail.backends.yatube'
 
 #  подключаем движок filebased.EmailBackend
@@ -150,15 +243,110 @@ EMAIL_BACKEND = "django.core.mail.backends.filebased.EmailBackend"
 # указываем директорию, в которую будут складываться файлы писем
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, "sent_emails")
 
+# Письма с уведомлениями (manage.py send_digests) уходят пачками через
+# одно SMTP-соединение. Для разработки подойдёт локальная заглушка:
+#     python -m smtpd -n -c DebuggingServer localhost:1025
+NOTIFICATION_EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+NOTIFICATION_DIGEST_BATCH_SIZE = 100
+EMAIL_HOST = 'localhost'
+EMAIL_PORT = 1025
+
 # Идентификатор текущего сайта
 SITE_ID = 1
 
+# Журнал медленных запросов (yatube/slowqueries.py): запросы дольше
+# порога с вероятностью SLOW_QUERY_SAMPLE_RATE записываются вместе с
+# планом в кольцевой буфер на SLOW_QUERY_BUFFER_SIZE записей
+SLOW_QUERY_LOG = False
+SLOW_QUERY_THRESHOLD_MS = 100
+SLOW_QUERY_SAMPLE_RATE = 0.1
+SLOW_QUERY_BUFFER_SIZE = 500
+SLOW_QUERY_PATH = os.path.join(tempfile.gettempdir(),
+                               'yatube-slowqueries.sqlite3')
+
+# Профилирование запросов (yatube/profiling.py): запросы с подписанным
+# заголовком X-Profile (manage.py profiles --token) и случайные с
+# вероятностью PROFILING_SAMPLE_RATE профилируются cProfile и, если
+# включён PROFILING_MEMORY, tracemalloc. В PROFILING_DIR хранятся
+# последние PROFILING_MAX_PROFILES профилей
+PROFILING = False
+PROFILING_SAMPLE_RATE = 0
+PROFILING_TOKEN_MAX_AGE = 60 * 60
+PROFILING_MEMORY = True
+PROFILING_MEMORY_FRAMES = 10
+PROFILING_STACK_INTERVAL = 0.001
+PROFILING_MAX_PROFILES = 100
+PROFILING_DIR = os.path.join(tempfile.gettempdir(), 'yatube-profiles')
+
 CACHES = {
     'default': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
     }
 }
 
+POSTS_PER_PAGE = 10
+# Сколько групп возвращает поиск в форме поста
+GROUP_SEARCH_LIMIT = 20
+
+# Сжатие ответов (yatube/compression.py): brotli, если установлен пакет
+# brotli, иначе gzip
+COMPRESSION_ENABLED = True
+COMPRESSION_MIN_SIZE = 512
+COMPRESSION_GZIP_LEVEL = 6
+COMPRESSION_BROTLI_QUALITY = 5
+COMPRESSION_EXCLUDE_TYPES = (
+    'image/', 'video/', 'audio/', 'font/woff', 'application/zip',
+    'application/gzip', 'application/x-gzip', 'text/event-stream',
+)
+# Ленты отдаются потоком (yatube/streaming.py): шапка страницы уходит
+# браузеру до запросов ленты. Ошибка при рендере обрывает ответ на
+# середине вместо страницы 500, поэтому по умолчанию выключено
+STREAMING_FEEDS = False
+
+# Независимые запросы страниц чтения выполняются в пуле потоков.
+# Для тестов на TestCase выключено: транзакция теста не видна
+# соединениям других потоков
+CONCURRENT_QUERIES = False
+CONCURRENT_QUERY_WORKERS = 8
+
+# Потоки, в которых yatube/asgi.py выполняет Django
+ASGI_THREADS = 32
+
+# Прогрев кешей (manage.py warm_caches). WARM_CACHES_ON_STARTUP
+# запускает прогрев в фоне при загрузке yatube/wsgi.py
+WARM_CACHES_ON_STARTUP = False
+WARM_CACHES_TOP = 20
+WARM_CACHES_WORKERS = 4
+WARM_CACHES_HOST = 'localhost'
+
+# Статические страницы: кеш объектов и HTML (yatube/flatpages.py)
+# и время хранения в кеше браузера и прокси
+FLATPAGE_CACHE_TIMEOUT = 60 * 60 * 24 * 7
+FLATPAGE_MAX_AGE = 60 * 60
+
+# Живые обновления (posts.live): под ASGI поток SSE бессрочный и не
+# занимает поток. Под WSGI поток держит рабочий поток до LIVE_POLL_TIMEOUT,
+# поэтому включается только LIVE_WSGI_STREAMS, иначе ответ 204 и
+# EventSource не переподключается
+LIVE_WSGI_STREAMS = False
+LIVE_HISTORY = 1000
+LIVE_HEARTBEAT = 15
+LIVE_POLL_TIMEOUT = 25
+LIVE_RETRY_MS = 2000
+
+# Пользователи, группы и посты по естественным ключам (yatube/objectcache.py):
+# кеш процесса поверх кеша 'default', сбрасывается сигналами при сохранении.
+# LocMemCache у каждого процесса свой: для нескольких процессов 'default'
+# должен быть общим (memcached, redis)
+OBJECT_CACHE_TIMEOUT = 24 * 60 * 60
+OBJECT_CACHE_LOCAL_TIMEOUT = 60
+OBJECT_CACHE_LOCAL_SIZE = 1000
+# Первая страница группы, пересобирается при новом посте в группе
+GROUP_PAGE_CACHE_TIMEOUT = 10 * 60
+
+# Списки админки для таблиц больше этого размера показывают оценку числа строк
+ADMIN_EXACT_COUNT_LIMIT = 10000
+
 INTERNAL_IPS = [
     "127.0.0.1",
 ]
@@ -0,0 +1,29 @@
+"""
+Настройки для тестов: база в памяти, быстрый хешер паролей, письма и
+загруженные файлы в памяти, фоновые задачи сразу в потоке теста.
+
+    pytest -n auto
+    python manage.py test posts users --settings=yatube.settings_test
+"""
+
+from .settings import *  # noqa: F401,F403
+
+DEBUG = False
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ':memory:',
+    }
+}
+
+# MD5 не годится для настоящих паролей, но в тестах экономит секунды
+PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+EMAIL_BACKEND = 'django.core.mail.backends.locmem.EmailBackend'
+NOTIFICATION_EMAIL_BACKEND = EMAIL_BACKEND
+
+DEFAULT_FILE_STORAGE = 'yatube.storage.InMemoryStorage'
+
+TASKS_ALWAYS_EAGER = True
+WARM_CACHES_ON_STARTUP = False
@@ -0,0 +1,201 @@
+"""
+Журнал медленных запросов к базе.
+
+Middleware оборачивает выполнение SQL (connection.execute_wrapper).
+Запросы дольше SLOW_QUERY_THRESHOLD_MS с вероятностью
+SLOW_QUERY_SAMPLE_RATE попадают в кольцевой буфер в файле SQLite
+SLOW_QUERY_PATH, общем для процессов машины: SQL, типы параметров, план
+запроса, представление, строка кода и строка шаблона, откуда запрос
+пришёл. Остальные запросы ничего не хранят, поэтому в отличие от
+журнала DEBUG память не растёт. Запросы из пула потоков
+(CONCURRENT_QUERIES) и потоковых ответов (STREAMING_FEEDS) в журнал
+не попадают: они выполняются вне обёртки.
+
+    python manage.py slow_queries --top 20
+"""
+
+import json
+import os
+import random
+import sqlite3
+import sys
+import threading
+import time
+from contextlib import ExitStack
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.base import Node
+
+# Сколько вызовов из кода проекта сохранять, от ближайшего к запросу;
+# подряд идущие вызовы из одного файла считаются одним
+STACK_DEPTH = 4
+
+_local = threading.local()
+
+
+class RingBuffer:
+    """Последние записи в файле SQLite.
+
+    Номер записи выдаёт AUTOINCREMENT, записи старше size удаляются
+    тем же соединением после вставки, поэтому процессы не теряют и не
+    перезаписывают чужие записи.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+
+    @property
+    def connection(self):
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5,
+                                         isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('CREATE TABLE IF NOT EXISTS entries '
+                               '(id INTEGER PRIMARY KEY AUTOINCREMENT, '
+                               'entry TEXT NOT NULL)')
+            self.local.connection = connection
+        return connection
+
+    def append(self, entry, size):
+        number = self.connection.execute(
+            'INSERT INTO entries (entry) VALUES (?)',
+            (json.dumps(entry, ensure_ascii=False),)).lastrowid
+        self.connection.execute('DELETE FROM entries WHERE id <= ?',
+                                (number - size,))
+
+    def all(self):
+        return [json.loads(entry) for entry, in self.connection.execute(
+            'SELECT entry FROM entries ORDER BY id')]
+
+    def clear(self):
+        self.connection.execute('DELETE FROM entries')
+
+
+@lru_cache()
+def get_buffer(path):
+    return RingBuffer(path)
+
+
+def ring():
+    return get_buffer(settings.SLOW_QUERY_PATH)
+
+
+def params_shape(params, many):
+    """Типы параметров без значений: в них могут быть личные данные"""
+
+    if many:
+        params = list(params)
+        return '{} × {}'.format(len(params),
+                                params_shape(params[0], False) if params
+                                else '()')
+    if params is None:
+        return '()'
+    if isinstance(params, dict):
+        return '{' + ', '.join('{}: {}'.format(key, type(value).__name__)
+                               for key, value in params.items()) + '}'
+    return '(' + ', '.join(type(value).__name__ for value in params) + ')'
+
+
+def explain(connection, sql, params):
+    if not sql.lstrip()[:6].upper() == 'SELECT':
+        return None
+    prefix = ('EXPLAIN QUERY PLAN ' if connection.vendor == 'sqlite'
+              else 'EXPLAIN ')
+    _local.explaining = True
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(prefix + sql, params)
+            return '\n'.join(' '.join(str(column) for column in row)
+                             for row in cursor.fetchall())
+    except Exception as error:
+        return 'EXPLAIN не выполнен: {}'.format(error)
+    finally:
+        _local.explaining = False
+
+
+def origin():
+    """Строки кода проекта и строка шаблона, которые вызвали запрос"""
+
+    code, template, previous = [], None, None
+    frame = sys._getframe(2)
+    while frame is not None and (len(code) < STACK_DEPTH or template is None):
+        path = frame.f_code.co_filename
+        if template is None:
+            node = frame.f_locals.get('self')
+            if (isinstance(node, Node) and getattr(node, 'token', None)
+                    and getattr(node, 'origin', None)):
+                template = '{}:{}'.format(
+                    node.origin.template_name or node.origin.name,
+                    node.token.lineno)
+        if (len(code) < STACK_DEPTH and path.startswith(settings.BASE_DIR)
+                and 'site-packages' not in path and path != __file__
+                and path != previous):
+            code.append('{}:{} in {}'.format(
+                os.path.relpath(path, settings.BASE_DIR), frame.f_lineno,
+                frame.f_code.co_name))
+        previous = path
+        frame = frame.f_back
+    return ' ← '.join(code) or None, template
+
+
+def record(entry):
+    ring().append(entry, settings.SLOW_QUERY_BUFFER_SIZE)
+
+
+def entries():
+    return ring().all()
+
+
+def clear():
+    ring().clear()
+
+
+class QueryRecorder:
+    def __init__(self, request):
+        self.request = request
+
+    def __call__(self, execute, sql, params, many, context):
+        if getattr(_local, 'explaining', False):
+            return execute(sql, params, many, context)
+        start = time.perf_counter()
+        result = execute(sql, params, many, context)
+        duration = (time.perf_counter() - start) * 1000
+        if (duration >= settings.SLOW_QUERY_THRESHOLD_MS
+                and random.random() < settings.SLOW_QUERY_SAMPLE_RATE):
+            self.capture(sql, params, many, context['connection'], duration)
+        return result
+
+    def capture(self, sql, params, many, connection, duration):
+        code, template = origin()
+        match = self.request.resolver_match
+        record({
+            'time': time.time(),
+            'duration': duration,
+            'sql': sql,
+            'params': params_shape(params, many),
+            'plan': None if many else explain(connection, sql, params),
+            'database': connection.alias,
+            'view': match.view_name if match else None,
+            'path': self.request.path,
+            'code': code,
+            'template': template,
+        })
+
+
+class SlowQueryMiddleware:
+    def __init__(self, get_response):
+        if not settings.SLOW_QUERY_LOG:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = QueryRecorder(request)
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            return self.get_response(request)
@@ -0,0 +1,101 @@
+import gzip
+import os
+from urllib.parse import urljoin
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+from django.core.files.storage import Storage
+from django.utils import timezone
+from django.utils.deconstruct import deconstructible
+from django.utils.encoding import filepath_to_uri
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.svg', '.map', '.txt', '.json')
+MIN_COMPRESS_SIZE = 256
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Статика с хешем в имени и заранее сжатыми копиями .gz и .br"""
+
+    def stored_name(self, name):
+        # До первого collectstatic манифеста нет, отдаём исходные имена
+        if not self.hashed_files:
+            return name
+        return super().stored_name(name)
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        for name in set(self.hashed_files.values()):
+            if name.endswith(COMPRESSIBLE_EXTENSIONS):
+                self.compress(name)
+
+    def compress(self, name):
+        path = self.path(name)
+        with open(path, 'rb') as source:
+            content = source.read()
+        if len(content) < MIN_COMPRESS_SIZE:
+            return
+        variants = [('.gz', gzip.compress(content, compresslevel=9, mtime=0))]
+        if brotli is not None:
+            variants.append(('.br', brotli.compress(content)))
+        for suffix, compressed in variants:
+            if len(compressed) < len(content):
+                with open(path + suffix, 'wb') as target:
+                    target.write(compressed)
+            elif os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+
+@deconstructible
+class InMemoryStorage(Storage):
+    """Хранилище файлов в памяти процесса для тестов (settings_test.py)"""
+
+    def __init__(self, base_url=None):
+        self.base_url = base_url
+        self.files = {}
+
+    def _open(self, name, mode='rb'):
+        if name not in self.files:
+            raise FileNotFoundError(name)
+        return ContentFile(self.files[name], name=name)
+
+    def _save(self, name, content):
+        content.seek(0)
+        data = content.read()
+        self.files[name] = data.encode() if isinstance(data, str) else data
+        return name
+
+    def delete(self, name):
+        self.files.pop(name, None)
+
+    def exists(self, name):
+        return name in self.files
+
+    def listdir(self, path):
+        prefix = path.rstrip('/') + '/' if path else ''
+        directories, files = set(), []
+        for name in self.files:
+            if name.startswith(prefix):
+                head, _, tail = name[len(prefix):].partition('/')
+                if tail:
+                    directories.add(head)
+                else:
+                    files.append(head)
+        return sorted(directories), sorted(files)
+
+    def size(self, name):
+        return len(self.files[name])
+
+    def url(self, name):
+        return urljoin(self.base_url or settings.MEDIA_URL,
+                       filepath_to_uri(name))
+
+    def get_modified_time(self, name):
+        return timezone.now()
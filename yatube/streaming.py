@@ -0,0 +1,95 @@
+"""
+Потоковый рендер шаблонов.
+
+Шаблон отдаётся по частям: всё до очередного блока ({% block %})
+уходит клиенту до того, как блок начнёт рендериться. Так шапка
+base.html со стилями и навигацией доходит до браузера раньше, чем
+выполнятся ленивые запросы ленты внутри блока content (lazy_context).
+"""
+
+from functools import lru_cache
+
+from django.http import StreamingHttpResponse
+from django.middleware.csrf import get_token
+from django.template.context import make_context
+from django.template.loader import get_template
+from django.template.loader_tags import (BLOCK_CONTEXT_KEY, BlockContext,
+                                         BlockNode, ExtendsNode)
+from django.template.base import TextNode
+from django.utils.cache import patch_vary_headers
+from django.utils.functional import SimpleLazyObject
+
+
+def lazy_context(build, names):
+    """Значения names из словаря build(), вычисляемые при первом обращении.
+
+    build() вызывается один раз, когда шаблон впервые прочтёт любое из
+    значений.
+    """
+
+    build = lru_cache(maxsize=None)(build)
+    return {name: SimpleLazyObject(lambda name=name: build()[name])
+            for name in names}
+
+
+def extend(node, context):
+    """Подготовка блоков наследника, как в ExtendsNode.render"""
+
+    parent = node.get_parent(context)
+    if BLOCK_CONTEXT_KEY not in context.render_context:
+        context.render_context[BLOCK_CONTEXT_KEY] = BlockContext()
+    block_context = context.render_context[BLOCK_CONTEXT_KEY]
+    block_context.add_blocks(node.blocks)
+    for parent_node in parent.nodelist:
+        if not isinstance(parent_node, TextNode):
+            if not isinstance(parent_node, ExtendsNode):
+                block_context.add_blocks({
+                    block.name: block for block in
+                    parent.nodelist.get_nodes_by_type(BlockNode)
+                })
+            break
+    return parent
+
+
+def iter_nodes(template, context):
+    buffer = []
+    for node in template.nodelist:
+        if isinstance(node, ExtendsNode):
+            parent = extend(node, context)
+            with context.render_context.push_state(parent,
+                                                   isolated_context=False):
+                yield from iter_nodes(parent, context)
+            return
+        if isinstance(node, BlockNode) and buffer:
+            yield ''.join(buffer)
+            buffer = []
+        buffer.append(node.render_annotated(context))
+    if buffer:
+        yield ''.join(buffer)
+
+
+def iter_template(template, context, request):
+    context = make_context(context, request,
+                           autoescape=template.backend.engine.autoescape)
+    compiled = template.template
+    with context.render_context.push_state(compiled):
+        with context.bind_template(compiled):
+            context.template_name = compiled.name
+            yield from iter_nodes(compiled, context)
+
+
+def stream_render(request, template_name, context=None):
+    """Аналог django.shortcuts.render с потоковым телом ответа"""
+
+    # Шаблон ищется сразу, чтобы ошибка попала в обычный ответ 500
+    template = get_template(template_name)
+    # Тело рендерится уже после middleware, поэтому то, что шаблон возьмёт
+    # из запроса, читается заранее: пользователь из сессии (SessionMiddleware
+    # добавит Vary: Cookie) и CSRF-токен (CsrfViewMiddleware поставит куку)
+    if hasattr(request, 'user'):
+        request.user.is_authenticated
+    get_token(request)
+    response = StreamingHttpResponse(
+        iter_template(template, context or {}, request))
+    patch_vary_headers(response, ('Cookie',))
+    return response
@@ -1,22 +1,31 @@
 from django.contrib import admin
 from django.urls import include, path
-from django.contrib.flatpages import views
 from django.conf import settings
 from django.conf.urls.static import static
 
+from .flatpages import cached_flatpage
+from .objectcache import stats_view
+from .profiling import download_view, list_view
+from .ratelimit import fired_view
+
 handler404 = "posts.views.page_not_found"  # noqa
 handler500 = "posts.views.server_error"  # noqa
 
 
 urlpatterns = [
+    path('admin/cache-stats/', stats_view, name='cache_stats'),
+    path('admin/rate-limits/', fired_view, name='rate_limits'),
+    path('admin/profiles/', list_view, name='profiles'),
+    path('admin/profiles/<str:profile_id>/<str:kind>/', download_view,
+         name='profile_download'),
     path('admin/', admin.site.urls),
-    path('about-author/', views.flatpage, {'url': '/about-author/'}, name='author'),
-    path('about-spec/', views.flatpage, {'url': '/about-spec/'}, name='spec'),
+    path('about-author/', cached_flatpage, {'url': '/about-author/'}, name='author'),
+    path('about-spec/', cached_flatpage, {'url': '/about-spec/'}, name='spec'),
     path('auth/', include("users.urls")),
     path("auth/", include("django.contrib.auth.urls")),
     path('about/', include('django.contrib.flatpages.urls')),
-    path('about-us/', views.flatpage, {'url': '/about-us/'}, name='about'),
-    path('terms/', views.flatpage, {'url': '/terms/'}, name='terms'),
+    path('about-us/', cached_flatpage, {'url': '/about-us/'}, name='about'),
+    path('terms/', cached_flatpage, {'url': '/terms/'}, name='terms'),
     path("", include("posts.urls")),
     ]
 
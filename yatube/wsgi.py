@@ -9,8 +9,17 @@ https://docs.djangoproject.com/en/2.2/howto/deployment/wsgi/
 
 import os
 
+from django.conf import settings
 from django.core.wsgi import get_wsgi_application
 
+from yatube.assets import StaticAssetsApp
+
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
 
-application = get_wsgi_application()
+application = StaticAssetsApp(get_wsgi_application())
+
+if settings.WARM_CACHES_ON_STARTUP:
+    # Модели импортируются только после django.setup()
+    from posts.warmup import warm_in_background
+
+    warm_in_background()